@@ -0,0 +1,120 @@
+""" Compare the thread pool and the asyncio executors when syncing
+many repositories with a high number of jobs.
+
+Network latency is simulated by making the remote's upload-pack
+sleep before answering, so that `git fetch` mostly waits, like it
+does when talking to a real server.
+
+Usage:
+
+    $ python benchmarks/executor.py --repos 256 --jobs 16 64 128
+
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import cli_ui as ui
+
+from tsrc.executor import process_items
+from tsrc.repo import Remote, Repo
+from tsrc.syncer import Syncer
+
+
+def git(working_path: Path, *cmd: str) -> None:
+    subprocess.run(["git", *cmd], cwd=working_path, check=True, capture_output=True)
+
+
+def create_workspace(top_path: Path, count: int, latency: float) -> List[Repo]:
+    remote_path = top_path / "remote.git"
+    remote_path.mkdir()
+    git(remote_path, "init", "--bare", "--initial-branch", "master")
+    seed_path = top_path / "seed"
+    seed_path.mkdir()
+    git(seed_path, "init", "--initial-branch", "master")
+    git(seed_path, "commit", "--allow-empty", "-m", "initial commit")
+    git(seed_path, "push", str(remote_path), "master")
+
+    workspace_path = top_path / "workspace"
+    workspace_path.mkdir()
+    res = []
+    for i in range(count):
+        dest = f"repo{i}"
+        git(workspace_path, "clone", str(remote_path), dest)
+        git(
+            workspace_path / dest,
+            "config",
+            "remote.origin.uploadpack",
+            f"sleep {latency}; git-upload-pack",
+        )
+        remote = Remote(name="origin", url=str(remote_path))
+        res.append(Repo(dest=dest, remotes=[remote], branch="master"))
+    return res
+
+
+class ThreadCounter:
+    """Sample the number of threads of the current process"""
+
+    def __init__(self) -> None:
+        self.peak = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+
+    def __enter__(self) -> "ThreadCounter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self._done.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._done.wait(0.01):
+            # Do not count the main thread and ourselves
+            self.peak = max(self.peak, threading.active_count() - 2)
+
+
+def measure(
+    workspace_path: Path, repos: List[Repo], executor: str, num_jobs: int
+) -> Tuple[float, int]:
+    os.environ["TSRC_EXECUTOR"] = executor
+    syncer = Syncer(workspace_path)
+    start = time.perf_counter()
+    with ThreadCounter() as counter:
+        outcomes = process_items(repos, syncer, num_jobs=num_jobs)
+    assert not outcomes.errors, outcomes.errors
+    return time.perf_counter() - start, counter.peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repos", type=int, default=128)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="simulated latency, in seconds"
+    )
+    args = parser.parse_args()
+
+    ui.setup(quiet=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        repos = create_workspace(Path(tmp), args.repos, args.latency)
+        workspace_path = Path(tmp) / "workspace"
+        for num_jobs in args.jobs:
+            for executor in ["thread", "asyncio"]:
+                duration, peak_threads = measure(
+                    workspace_path, repos, executor, num_jobs
+                )
+                print(
+                    f"-j {num_jobs:<4} {executor:>8}: {duration:7.3f}s,",
+                    f"{peak_threads:4} threads at most",
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+""" Compare the cost of collecting the status of many repositories
+using a single `git status --porcelain=v2` call per repository
+against the previous implementation, which ran one git command
+per piece of information.
+
+Usage:
+
+    $ python benchmarks/git_status.py --repos 200
+
+"""
+
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, List, Tuple
+
+from tsrc.git import (
+    GitCommandError,
+    GitError,
+    GitStatus,
+    get_current_branch,
+    get_sha1,
+    run_git_captured,
+)
+
+
+class CountingPopen(subprocess.Popen):
+    count = 0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        CountingPopen.count += 1
+        super().__init__(*args, **kwargs)
+
+
+def git(working_path: Path, *cmd: str) -> None:
+    subprocess.run(["git", *cmd], cwd=working_path, check=True, capture_output=True)
+
+
+def create_repos(top_path: Path, count: int) -> List[Path]:
+    remote_path = top_path / "remote.git"
+    remote_path.mkdir()
+    git(remote_path, "init", "--bare", "--initial-branch", "master")
+    res = []
+    for i in range(count):
+        repo_path = top_path / f"repo{i}"
+        repo_path.mkdir()
+        git(repo_path, "init", "--initial-branch", "master")
+        git(repo_path, "remote", "add", "origin", str(remote_path))
+        (repo_path / "README").write_text("readme")
+        git(repo_path, "add", ".")
+        git(repo_path, "commit", "-m", "initial commit")
+        git(repo_path, "push", "--force", "-u", "origin", "master")
+        git(repo_path, "tag", f"v{i}")
+        # Make some repos dirty
+        if i % 3 == 0:
+            (repo_path / "README").write_text("changed")
+        if i % 5 == 0:
+            (repo_path / "new.txt").write_text("new")
+        res.append(repo_path)
+    return res
+
+
+def legacy_update(status: GitStatus) -> None:
+    """How GitStatus.update() used to gather information,
+    with one git command per piece of information
+    """
+    working_path = status.working_path
+    try:
+        status.sha1_full = get_sha1(working_path, short=False)
+    except GitCommandError:
+        status.empty = True
+        return
+    status.sha1 = status.sha1_full[:7]
+    try:
+        status.branch = get_current_branch(working_path)
+    except GitError:
+        pass
+    status.update_tag()
+    legacy_update_remote_status(status)
+    legacy_update_worktree_status(status)
+
+
+def legacy_update_remote_status(status: GitStatus) -> None:
+    working_path = status.working_path
+    rc, ahead_rev = run_git_captured(
+        working_path, "rev-list", "@{upstream}..HEAD", check=False
+    )
+    if rc == 0:
+        status.ahead = len(ahead_rev.splitlines())
+    rc, behind_rev = run_git_captured(
+        working_path, "rev-list", "HEAD..@{upstream}", check=False
+    )
+    if rc == 0:
+        status.behind = len(behind_rev.splitlines())
+
+
+def legacy_update_worktree_status(status: GitStatus) -> None:
+    _, out = run_git_captured(status.working_path, "status", "--porcelain")
+    for line in out.splitlines():
+        if line.startswith("??"):
+            status.untracked += 1
+            status.dirty = True
+        if line.startswith(" M"):
+            status.staged += 1
+            status.dirty = True
+        if line.startswith(" .M"):
+            status.not_staged += 1
+            status.dirty = True
+        if line.startswith("A "):
+            status.added += 1
+            status.dirty = True
+
+
+def porcelain_update(status: GitStatus) -> None:
+    status.update()
+
+
+def measure(
+    repos: List[Path], update: Callable[[GitStatus], None]
+) -> Tuple[int, float]:
+    CountingPopen.count = 0
+    start = time.perf_counter()
+    for repo_path in repos:
+        update(GitStatus(repo_path))
+    return CountingPopen.count, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repos", type=int, default=100)
+    args = parser.parse_args()
+
+    subprocess.Popen = CountingPopen  # type: ignore[misc]
+    with tempfile.TemporaryDirectory() as tmp:
+        repos = create_repos(Path(tmp), args.repos)
+        for name, update in [
+            ("legacy", legacy_update),
+            ("porcelain v2", porcelain_update),
+        ]:
+            processes, duration = measure(repos, update)
+            print(
+                f"{name:>14}: {processes:6} processes, {duration:7.3f}s",
+                f"({processes / len(repos):.1f} processes per repo)",
+            )
+
+
+if __name__ == "__main__":
+    main()
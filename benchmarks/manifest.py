@@ -0,0 +1,99 @@
+""" Measure how loading a manifest and resolving its groups scale
+with the number of repositories and groups.
+
+The synthetic manifest has `--groups` groups of the same size, each
+including two others (so that includes form a tree), plus a `default`
+group including all of them.
+
+Loading is measured three times: parsing the YAML, then reusing the
+manifest cache (as a new process would), then reusing the in-process memo.
+
+Usage:
+
+    $ python benchmarks/manifest.py --repos 50000 --groups 2000
+
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, TypeVar
+
+import ruamel.yaml
+
+from tsrc.local_manifest import LocalManifest
+from tsrc.manifest import Manifest
+from tsrc.manifest_cache import ManifestCache
+
+T = TypeVar("T")
+
+
+def generate_config(num_repos: int, num_groups: int) -> Dict[str, Any]:
+    repos = [
+        {"dest": f"repo{i}", "url": f"git@example.com:proj/repo{i}.git"}
+        for i in range(num_repos)
+    ]
+    groups: Dict[str, Any] = {}
+    per_group = max(num_repos // num_groups, 1)
+    for i in range(num_groups):
+        chunk = repos[i * per_group : (i + 1) * per_group]
+        includes = [f"group{j}" for j in (2 * i + 1, 2 * i + 2) if j < num_groups]
+        groups[f"group{i}"] = {
+            "repos": [x["dest"] for x in chunk],
+            "includes": includes,
+        }
+    groups["default"] = {"repos": [], "includes": list(groups)}
+    return {"repos": repos, "groups": groups}
+
+
+def measure(name: str, func: Callable[[], T]) -> T:
+    start = time.perf_counter()
+    res = func()
+    print(f"{name:>32}: {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return res
+
+
+def reset_memo() -> None:
+    LocalManifest._parsed.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repos", type=int, default=50_000)
+    parser.add_argument("--groups", type=int, default=2_000)
+    args = parser.parse_args()
+
+    config = generate_config(args.repos, args.groups)
+    with tempfile.TemporaryDirectory() as tmp:
+        clone_path = Path(tmp) / "manifest"
+        clone_path.mkdir()
+        yaml = ruamel.yaml.YAML(typ="safe")
+        yaml.dump(config, clone_path / "manifest.yml")
+        cache = ManifestCache(Path(tmp) / "manifest_cache")
+        local_manifest = LocalManifest(clone_path, cache=cache)
+
+        reset_memo()
+        measure("load (parse)", local_manifest.get_manifest)
+        reset_memo()
+        measure("load (manifest cache)", local_manifest.get_manifest)
+        manifest: Manifest = measure("load (memo)", local_manifest.get_manifest)
+
+    repos = measure("resolve default group", lambda: manifest.get_repos())
+    assert len(repos) == args.repos - args.repos % args.groups
+    measure("resolve default group again", lambda: manifest.get_repos())
+
+    some_groups: List[str] = random.sample(
+        [f"group{i}" for i in range(args.groups)], 10
+    )
+    measure(
+        "resolve 10 groups one by one",
+        lambda: [manifest.get_repos(groups=[x]) for x in some_groups],
+    )
+    dests = [x.dest for x in manifest.get_repos(all_=True)]
+    measure("look up every repo", lambda: [manifest.get_repo(x) for x in dests])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Bare Cache
+
+Bare repositories used to compute the position of the commits pinned
+by the Deep Manifest and the Future Manifest (see tsrc.local_tmp_bare_repos),
+in `<workspace>/.tsrc/bare_cache/<url-hash>.git`.
+
+There is a single repository per URL, whatever the manifest asking for
+it, and it only contains what is needed to compute a position: the
+branch of the repo (fetched as `refs/remotes/<remote>/<branch>`), its
+tag if any, and the pinned commit itself. Nothing is fetched again
+until `bare_cache_ttl` seconds (see the workspace configuration) have
+passed, unless the pinned commit is missing, or the workspace repository
+has seen newer commits of the branch (after a `tsrc sync` for instance).
+
+When the repo is cloned in the workspace, its object store is used as
+an alternate (see gitrepository-layout(5)) when the cached repository is
+created, so that the first fetch mostly updates refs. The borrowed objects
+are then copied with `git repack -a` and the alternate is removed, like
+`git clone --reference --dissociate` does, so that the cached repository
+does not depend on the workspace one, which can lose objects at any time
+(after a `git gc` for instance). Later fetches are incremental.
+
+The cached repository is only created again from scratch when a fetch
+fails because objects are missing: other errors (a network failure for
+instance) are reported as is.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tsrc.errors import Error
+from tsrc.file_lock import file_lock
+from tsrc.git import run_git_captured
+from tsrc.git_refs import GitRefReader
+from tsrc.utils import atomic_write
+
+DEFAULT_TTL = 300
+
+
+class BareCache:
+    def __init__(self, root_path: Path) -> None:
+        self.root_path = root_path
+
+    @classmethod
+    def for_workspace(cls, workspace_path: Path) -> "BareCache":
+        return cls(workspace_path / ".tsrc" / "bare_cache")
+
+    def get_repo_path(self, url: str) -> Path:
+        url_hash = hashlib.sha1(url.encode()).hexdigest()
+        return self.root_path / f"{url_hash}.git"
+
+    def update(
+        self,
+        url: str,
+        remote_name: str,
+        *,
+        branch: Optional[str] = None,
+        tag: Optional[str] = None,
+        sha1: Optional[str] = None,
+        alternate: Optional[Path] = None,
+        ttl: int = DEFAULT_TTL,
+    ) -> Path:
+        """Make sure the cached repository of the given URL contains the
+        branch, the tag and the commit, and return its path.
+
+        Raise Error if the branch or the tag cannot be fetched, or if
+        the commit cannot be found.
+        """
+        repo_path = self.get_repo_path(url)
+        with file_lock(repo_path.with_suffix(".lock")):
+            fetcher = _Fetcher(repo_path, url, remote_name, alternate, ttl)
+            try:
+                fetcher.update(branch=branch, tag=tag, sha1=sha1)
+            except Error:
+                if not fetcher.is_broken():
+                    raise
+                # An object is missing (from an alternate left behind
+                # by an interrupted update for instance), try again
+                # from scratch
+                shutil.rmtree(repo_path, ignore_errors=True)
+                fetcher.update(branch=branch, tag=tag, sha1=sha1)
+        return repo_path
+
+
+def get_alternate_objects(repo_path: Path) -> Optional[str]:
+    """Return the path of the object store of the given (non-bare)
+    repository, if any
+    """
+    try:
+        return str(GitRefReader(repo_path).common_dir / "objects")
+    except Error:
+        return None
+
+
+class _Fetcher:
+    """Fetch in a cached repository, creating it if needed.
+
+    The times of the last fetch of each ref are stored in
+    `tsrc-fetched.json`, inside the repository.
+    """
+
+    def __init__(
+        self,
+        repo_path: Path,
+        url: str,
+        remote_name: str,
+        alternate: Optional[Path],
+        ttl: int,
+    ) -> None:
+        self.repo_path = repo_path
+        self.url = url
+        self.remote_name = remote_name
+        self.alternate = alternate
+        self.ttl = ttl
+
+    @property
+    def times_path(self) -> Path:
+        return self.repo_path / "tsrc-fetched.json"
+
+    def update(
+        self, *, branch: Optional[str], tag: Optional[str], sha1: Optional[str]
+    ) -> None:
+        self.fetch_refs(branch=branch, tag=tag, sha1=sha1)
+        if sha1:
+            self.fetch_commit(sha1)
+        self.dissociate()
+
+    def fetch_refs(
+        self, *, branch: Optional[str], tag: Optional[str], sha1: Optional[str]
+    ) -> None:
+        """Fetch the branch and the tag, unless they were fetched less than
+        `ttl` seconds ago and the commit is already there
+        """
+        self.init()
+        times = self.load_times()
+        if sha1 and not self.has_commit(sha1):
+            times = {}
+        refspecs = []
+        if branch:
+            refspec = f"+refs/heads/{branch}:refs/remotes/{self.remote_name}/{branch}"
+            if self.is_behind_alternate(branch):
+                times.pop(refspec, None)
+            refspecs.append(refspec)
+        if tag:
+            refspecs.append(f"+refs/tags/{tag}:refs/tags/{tag}")
+        now = time.time()
+        refspecs = [x for x in refspecs if now - times.get(x, 0) >= self.ttl]
+        if refspecs:
+            self.run_fetch(refspecs)
+            times.update({x: now for x in refspecs})
+            self.save_times(times)
+
+    def is_behind_alternate(self, branch: str) -> bool:
+        """Whether the workspace repository knows of commits of the branch
+        the cached one does not, in which case it must be fetched again
+        regardless of the TTL
+        """
+        if not self.alternate:
+            return False
+        ref = f"refs/remotes/{self.remote_name}/{branch}"
+        try:
+            known_sha1 = GitRefReader(self.alternate).resolve_ref(ref)
+        except Error:
+            return False
+        if not known_sha1:
+            return False
+        # Note: GitRefReader does not support bare repositories
+        rc, _ = run_git_captured(
+            self.repo_path,
+            "merge-base",
+            "--is-ancestor",
+            known_sha1,
+            ref,
+            check=False,
+        )
+        return rc != 0
+
+    def fetch_commit(self, sha1: str) -> None:
+        if self.has_commit(sha1):
+            return
+        # Note: servers only allow fetching a commit by its sha1
+        # in some conditions, so this is tried last
+        try:
+            self.run_fetch([sha1])
+        except Error:
+            pass
+        if not self.has_commit(sha1):
+            raise Error(f"commit {sha1} not found")
+
+    @property
+    def alternates_path(self) -> Path:
+        return self.repo_path / "objects" / "info" / "alternates"
+
+    def init(self) -> None:
+        if self.repo_path.exists():
+            return
+        tmp_path = self.repo_path.with_suffix(".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        rc, out = run_git_captured(
+            tmp_path.parent, "init", "--bare", "--quiet", str(tmp_path), check=False
+        )
+        if rc != 0:
+            raise Error(f"Could not create {self.repo_path}:\n{out}")
+        # Only used until dissociate() is called, see above
+        alternate = get_alternate_objects(self.alternate) if self.alternate else None
+        if alternate:
+            tmp_alternates_path = tmp_path / "objects" / "info" / "alternates"
+            tmp_alternates_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_alternates_path.write_text(alternate + "\n")
+        os.replace(tmp_path, self.repo_path)
+
+    def dissociate(self) -> None:
+        """Copy the objects borrowed from the alternate, if any, and stop
+        using it
+        """
+        if not self.alternates_path.exists():
+            return
+        rc, out = run_git_captured(
+            self.repo_path, "repack", "-a", "-d", "--quiet", check=False
+        )
+        if rc != 0:
+            raise Error(f"Could not repack {self.repo_path}:\n{out}")
+        self.alternates_path.unlink()
+
+    def is_broken(self) -> bool:
+        """Whether objects are missing from the repository"""
+        if not self.repo_path.exists():
+            return False
+        rc, _ = run_git_captured(
+            self.repo_path,
+            "fsck",
+            "--connectivity-only",
+            "--no-dangling",
+            "--no-progress",
+            check=False,
+        )
+        return rc != 0
+
+    def run_fetch(self, refspecs: List[str]) -> None:
+        rc, out = run_git_captured(
+            self.repo_path,
+            "fetch",
+            "--no-tags",
+            "--no-write-fetch-head",
+            "--recurse-submodules=no",
+            self.url,
+            *refspecs,
+            check=False,
+        )
+        if rc != 0:
+            raise Error(f"Could not fetch {' '.join(refspecs)} from {self.url}:\n{out}")
+
+    def has_commit(self, sha1: str) -> bool:
+        rc, _ = run_git_captured(
+            self.repo_path, "rev-parse", "--verify", f"{sha1}^{{commit}}", check=False
+        )
+        return rc == 0
+
+    def load_times(self) -> Dict[str, float]:
+        try:
+            res: Dict[str, float] = json.loads(self.times_path.read_text())
+            return res
+        except (OSError, ValueError):
+            return {}
+
+    def save_times(self, times: Dict[str, float]) -> None:
+        atomic_write(self.times_path, json.dumps(times))
@@ -56,6 +56,28 @@ def get_num_jobs(args: argparse.Namespace) -> int:
         sys.exit(f"error: argument -j/--jobs: invalid value: {value}")
 
 
+def add_net_jobs_arg(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--net-jobs",
+        dest="net_jobs",
+        help="Number of network operations (like `git fetch`) to run "
+        "simultaneously. When set, -j/--jobs only limits local operations "
+        "(like `git checkout`). "
+        "Defaults to the value of the "
+        "TSRC_PARALLEL_NET_JOBS environment variable",
+    )
+
+
+def get_net_jobs(args: argparse.Namespace) -> Optional[int]:
+    value = args.net_jobs or os.environ.get("TSRC_PARALLEL_NET_JOBS")
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        sys.exit(f"error: argument --net-jobs: invalid value: {value}")
+
+
 def get_workspace(namespace: argparse.Namespace, silent: bool = False) -> Workspace:
     workspace_path = namespace.workspace_path or find_workspace_path()
     if silent is False:
@@ -0,0 +1,96 @@
+""" Entry point for `tsrc cache`. """
+
+import argparse
+
+import cli_ui as ui
+
+from tsrc.cli import add_workspace_arg, get_workspace
+from tsrc.tmp_caches import MIB, get_tmp_caches
+from tsrc.utils import describe_age, describe_size
+
+
+def configure_parser(subparser: argparse._SubParsersAction) -> None:
+    parser = subparser.add_parser(
+        "cache",
+        description="Report and reclaim the disk space used by the temporary repositories kept in .tsrc (used by Deep Manifest and Future Manifest)",  # noqa: E501
+    )
+    cache_parser = parser.add_subparsers(dest="cache_action", required=True)
+
+    info_parser = cache_parser.add_parser(
+        "info", description="Display the size and last use of each cached repository"
+    )
+    add_workspace_arg(info_parser)
+    info_parser.set_defaults(run=run_info)
+
+    gc_parser = cache_parser.add_parser(
+        "gc",
+        description="Remove the least recently used cached repositories until the cache fits in its budget (see tmp_cache_max_size in the workspace configuration)",  # noqa: E501
+    )
+    add_workspace_arg(gc_parser)
+    gc_parser.add_argument(
+        "--max-size",
+        type=int,
+        help="budget to use instead of the configured one, in MiB",
+    )
+    gc_parser.add_argument(
+        "--all",
+        action="store_true",
+        dest="remove_all",
+        help="remove every cached repository",
+    )
+    gc_parser.set_defaults(run=run_gc)
+
+
+def run_info(args: argparse.Namespace) -> None:
+    workspace = get_workspace(args)
+    tmp_caches = get_tmp_caches(workspace)
+    entries = tmp_caches.get_entries()
+    if not entries:
+        ui.info_2("No cached repositories found in", tmp_caches.tsrc_path)
+        return
+    total = sum(x.size for x in entries)
+    if tmp_caches.max_size is None:
+        budget = "no limit"
+    else:
+        budget = f"limit: {describe_size(tmp_caches.max_size)}"
+    ui.info_2(
+        "Cached repositories in",
+        ui.bold,
+        tmp_caches.tsrc_path,
+        ui.reset,
+        f"({len(entries)} repos, {describe_size(total)} in total, {budget})",
+    )
+    name_width = max(len(x.name) for x in entries)
+    # most recently used first
+    for entry in reversed(entries):
+        ui.info(
+            "  ",
+            ui.green,
+            entry.name.ljust(name_width),
+            ui.reset,
+            describe_size(entry.size).rjust(10),
+            ui.lightgray,
+            (
+                "unused (older tsrc)"
+                if entry.is_legacy
+                else f"used {describe_age(entry.last_used)}"
+            ),
+        )
+
+
+def run_gc(args: argparse.Namespace) -> None:
+    workspace = get_workspace(args)
+    tmp_caches = get_tmp_caches(workspace)
+    max_size = None
+    if args.remove_all:
+        max_size = 0
+    elif args.max_size is not None:
+        max_size = args.max_size * MIB
+    removed = tmp_caches.evict(max_size=max_size)
+    if not removed:
+        ui.info_2("Nothing to remove")
+        return
+    for entry in removed:
+        ui.info(ui.red, "*", ui.reset, "Removed", entry.name)
+    size = describe_size(sum(x.size for x in removed))
+    ui.info_1(f"Reclaimed {size} from {len(removed)} cached repo(s)")
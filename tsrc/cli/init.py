@@ -7,13 +7,17 @@ import cli_ui as ui
 
 from tsrc.cli import (
     add_groups_arg,
+    add_net_jobs_arg,
     add_num_jobs_arg,
     add_workspace_arg,
+    get_net_jobs,
     get_num_jobs,
     repos_from_config,
 )
 from tsrc.errors import Error
+from tsrc.file_system import CopyMode
 from tsrc.local_manifest import LocalManifest
+from tsrc.manifest_cache import ManifestCache
 from tsrc.workspace import Workspace
 from tsrc.workspace_config import WorkspaceConfig
 
@@ -33,6 +37,35 @@ def configure_parser(subparser: argparse._SubParsersAction) -> None:
         help="use shallow clones",
         dest="shallow_clones",
     )
+    parser.add_argument(
+        "--filter",
+        help="use partial clones, with the given filter (like 'blob:none')",
+        dest="clone_filter",
+    )
+    parser.add_argument(
+        "--narrow-fetch",
+        action="store_true",
+        help="when syncing, only fetch the branch, tag or sha1 configured in the manifest",  # noqa: E501
+        dest="narrow_fetch",
+    )
+    parser.add_argument(
+        "--mirror-cache",
+        action="store_true",
+        help="clone repositories using mirrors shared by all workspaces, in ~/.cache/tsrc/mirrors",  # noqa: E501
+        dest="use_mirror_cache",
+    )
+    parser.add_argument(
+        "--copy-mode",
+        choices=[x.value for x in CopyMode],
+        default=CopyMode.COPY.value,
+        help="how files are copied: 'reflink' shares the bytes with the source when the file system supports it, 'hardlink' makes the copies hard links to the source (default: copy)",  # noqa: E501
+        dest="copy_mode",
+    )
+    parser.add_argument(
+        "--locked",
+        action="store_true",
+        help="clone every repository at the commit found in manifest.lock.yml (see `tsrc lock`)",  # noqa: E501
+    )
     parser.add_argument(
         "-r",
         "--singular-remote",
@@ -46,12 +79,14 @@ def configure_parser(subparser: argparse._SubParsersAction) -> None:
     )
     add_groups_arg(parser)
     add_num_jobs_arg(parser)
+    add_net_jobs_arg(parser)
     parser.set_defaults(run=run)
 
 
 def run(args: argparse.Namespace) -> None:
     workspace_path = args.workspace_path or Path.cwd()
     num_jobs = get_num_jobs(args)
+    net_jobs = get_net_jobs(args)
 
     cfg_path = workspace_path / ".tsrc" / "config.yml"
 
@@ -61,7 +96,9 @@ def run(args: argparse.Namespace) -> None:
     ui.info_1("Configuring workspace in", ui.bold, workspace_path)
 
     clone_path = workspace_path / ".tsrc/manifest"
-    local_manifest = LocalManifest(clone_path)
+    local_manifest = LocalManifest(
+        clone_path, cache=ManifestCache.for_workspace(workspace_path)
+    )
     local_manifest.init(url=args.manifest_url, branch=args.manifest_branch)
     manifest_branch = local_manifest.current_branch()
 
@@ -72,6 +109,10 @@ def run(args: argparse.Namespace) -> None:
         clone_all_repos=args.clone_all_repos,
         repo_groups=args.groups or [],
         shallow_clones=args.shallow_clones,
+        clone_filter=args.clone_filter,
+        narrow_fetch=args.narrow_fetch,
+        use_mirror_cache=args.use_mirror_cache,
+        copy_mode=args.copy_mode,
         singular_remote=args.singular_remote,
     )
     workspace_config.save_to_file(cfg_path)
@@ -79,8 +120,10 @@ def run(args: argparse.Namespace) -> None:
     workspace = Workspace(workspace_path)
     manifest = workspace.get_manifest()
     workspace.repos = repos_from_config(manifest, workspace_config)
-    workspace.clone_missing(num_jobs=num_jobs)
+    if args.locked:
+        workspace.use_lock()
+    workspace.clone_missing(num_jobs=num_jobs, net_jobs=net_jobs)
     workspace.set_remotes(num_jobs=num_jobs)
-    workspace.perform_filesystem_operations()
+    workspace.perform_filesystem_operations(num_jobs=num_jobs)
     ui.info_2("Workspace initialized")
     ui.info_2("Configuration written in", ui.bold, workspace.cfg_path)
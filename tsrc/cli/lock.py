@@ -0,0 +1,40 @@
+""" Entry point for `tsrc lock`. """
+
+import argparse
+
+import cli_ui as ui
+
+from tsrc.cli import (
+    add_net_jobs_arg,
+    add_num_jobs_arg,
+    add_workspace_arg,
+    get_net_jobs,
+    get_num_jobs,
+    get_workspace,
+)
+
+
+def configure_parser(subparser: argparse._SubParsersAction) -> None:
+    parser = subparser.add_parser(
+        "lock",
+        description="Resolve the branch or tag of every repository of the Manifest to a commit, and write them in manifest.lock.yml, next to manifest.yml. Use `tsrc sync --locked` or `tsrc init --locked` to sync to those commits",  # noqa: E501
+    )
+    add_workspace_arg(parser)
+    parser.add_argument(
+        "-r",
+        "--singular-remote",
+        help="only use this remote to resolve branches and tags",
+    )
+    add_num_jobs_arg(parser)
+    add_net_jobs_arg(parser)
+    parser.set_defaults(run=run)
+
+
+def run(args: argparse.Namespace) -> None:
+    workspace = get_workspace(args)
+    lock_path = workspace.lock(
+        singular_remote=args.singular_remote or "",
+        num_jobs=get_num_jobs(args),
+        net_jobs=get_net_jobs(args),
+    )
+    ui.info_1("Lock file written in", ui.bold, lock_path)
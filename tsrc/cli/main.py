@@ -12,11 +12,17 @@ import colored_traceback
 from tsrc import __version__
 from tsrc.cli import (
     apply_manifest,
+    cache,
     dump_manifest,
     foreach,
     init,
+    lock,
     log,
+    maintenance,
     manifest,
+    mirrors,
+    prefetch,
+    stats,
     status,
     sync,
 )
@@ -94,11 +100,17 @@ def main_impl(args: ArgsList = None) -> None:
 
     for module in (
         apply_manifest,
+        cache,
         dump_manifest,
         foreach,
         init,
+        lock,
         log,
+        maintenance,
         manifest,
+        mirrors,
+        prefetch,
+        stats,
         status,
         sync,
     ):
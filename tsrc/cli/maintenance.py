@@ -0,0 +1,36 @@
+""" Entry point for `tsrc maintenance`. """
+
+import argparse
+
+import cli_ui as ui
+
+from tsrc.cli import (
+    add_num_jobs_arg,
+    add_repos_selection_args,
+    add_workspace_arg,
+    get_num_jobs,
+    get_workspace_with_repos,
+)
+
+
+def configure_parser(subparser: argparse._SubParsersAction) -> None:
+    parser = subparser.add_parser(
+        "maintenance",
+        description="Run `git maintenance` (gc, commit-graph, loose-objects) in the repositories queued by `tsrc sync`, which runs git with automatic garbage collection disabled",  # noqa: E501
+    )
+    add_workspace_arg(parser)
+    add_repos_selection_args(parser)
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        dest="all_repos",
+        help="run maintenance in every selected repository, queued or not",
+    )
+    add_num_jobs_arg(parser)
+    parser.set_defaults(run=run)
+
+
+def run(args: argparse.Namespace) -> None:
+    workspace = get_workspace_with_repos(args)
+    workspace.maintenance(all_repos=args.all_repos, num_jobs=get_num_jobs(args))
+    ui.info_1("Maintenance done")
@@ -21,6 +21,7 @@ from tsrc.status_endpoint import StatusCollector
 
 # from tsrc.status_footer import StatusFooter
 from tsrc.status_header import StatusHeader, StatusHeaderDisplayMode
+from tsrc.tmp_caches import evict_tmp_caches
 from tsrc.utils import erase_last_line
 from tsrc.workspace_repos_summary import WorkspaceReposSummary
 
@@ -172,6 +173,8 @@ def run(args: argparse.Namespace) -> None:
     # there still may be some Deep Manifest or Future manifest leftovers
     wrs.check_for_leftovers()
 
+    evict_tmp_caches(workspace)
+
     # check if we have found all Groups (if any provided)
     # and if not, throw exception ManifestGroupNotFound
     wrs.must_match_all_groups(ignore_if_group_not_found=args.ignore_if_group_not_found)
@@ -0,0 +1,44 @@
+""" Entry point for `tsrc mirrors`. """
+
+import argparse
+
+import cli_ui as ui
+
+from tsrc.mirror_cache import MirrorCache
+from tsrc.utils import describe_age, describe_size
+
+
+def configure_parser(subparser: argparse._SubParsersAction) -> None:
+    parser = subparser.add_parser(
+        "mirrors",
+        description="Display the size of the mirrors shared by all workspaces (see `tsrc init --mirror-cache`)",  # noqa: E501
+    )
+    parser.set_defaults(run=run)
+
+
+def run(args: argparse.Namespace) -> None:
+    mirror_cache = MirrorCache.default()
+    mirrors = mirror_cache.get_mirrors()
+    if not mirrors:
+        ui.info_2("No mirrors found in", mirror_cache.root_path)
+        return
+    total = sum(x.size for x in mirrors)
+    ui.info_2(
+        "Mirrors in",
+        ui.bold,
+        mirror_cache.root_path,
+        ui.reset,
+        f"({len(mirrors)} mirrors, {describe_size(total)} in total)",
+    )
+    by_size = sorted(mirrors, key=lambda x: -x.size)
+    url_width = max(len(x.url) for x in by_size)
+    for mirror in by_size:
+        ui.info(
+            "  ",
+            ui.green,
+            mirror.url.ljust(url_width),
+            ui.reset,
+            describe_size(mirror.size).rjust(10),
+            ui.lightgray,
+            f"updated {describe_age(mirror.updated)}",
+        )
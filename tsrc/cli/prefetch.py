@@ -0,0 +1,51 @@
+""" Entry point for `tsrc prefetch`. """
+
+import argparse
+
+import cli_ui as ui
+
+from tsrc.cli import (
+    add_net_jobs_arg,
+    add_num_jobs_arg,
+    add_repos_selection_args,
+    add_workspace_arg,
+    get_net_jobs,
+    get_num_jobs,
+    get_workspace_with_repos,
+)
+from tsrc.prefetcher import lower_priority
+
+
+def configure_parser(subparser: argparse._SubParsersAction) -> None:
+    parser = subparser.add_parser(
+        "prefetch",
+        description="Fetch the objects of the cloned repositories in the background, without updating any branch, tag or worktree, so that the next sync is faster. Suitable for cron or a systemd timer",  # noqa: E501
+    )
+    add_workspace_arg(parser)
+    add_repos_selection_args(parser)
+    parser.add_argument(
+        "-r",
+        "--singular-remote",
+        help="only prefetch from this remote",
+    )
+    parser.add_argument(
+        "--normal-priority",
+        action="store_false",
+        dest="low_priority",
+        help="do not lower the CPU and I/O priority of tsrc and git",
+    )
+    add_num_jobs_arg(parser)
+    add_net_jobs_arg(parser)
+    parser.set_defaults(run=run)
+
+
+def run(args: argparse.Namespace) -> None:
+    if args.low_priority:
+        lower_priority()
+    workspace = get_workspace_with_repos(args)
+    workspace.prefetch(
+        singular_remote=args.singular_remote or "",
+        num_jobs=get_num_jobs(args),
+        net_jobs=get_net_jobs(args),
+    )
+    ui.info_1("Prefetch done")
@@ -0,0 +1,71 @@
+""" Entry point for `tsrc stats`. """
+
+import argparse
+from typing import Any, Dict
+
+import cli_ui as ui
+
+from tsrc.cli import add_workspace_arg, get_workspace
+from tsrc.durations import DurationStore
+
+
+def configure_parser(subparser: argparse._SubParsersAction) -> None:
+    parser = subparser.add_parser(
+        "stats",
+        description="Display how long each repository took to process, for the last commands run in the Workspace (clone, sync, status, foreach). Longest repositories are processed first by the next commands.",  # noqa: E501
+    )
+    add_workspace_arg(parser)
+    parser.add_argument(
+        "--task",
+        help="only display durations for this task (like 'sync' or 'status')",
+        dest="task_name",
+    )
+    parser.add_argument(
+        "-n",
+        "--limit",
+        type=int,
+        default=10,
+        help="number of repositories to display for each task (default: 10, 0 for all)",  # noqa: E501
+        dest="limit",
+    )
+    parser.set_defaults(run=run)
+
+
+def run(args: argparse.Namespace) -> None:
+    workspace = get_workspace(args)
+    store = DurationStore.for_workspace(workspace.root_path)
+    task_names = sorted(store.data)
+    if args.task_name:
+        task_names = [x for x in task_names if x == args.task_name]
+    if not task_names:
+        ui.info_2("No durations recorded yet")
+        return
+    for task_name in task_names:
+        describe_task(task_name, store.data[task_name], limit=args.limit)
+
+
+def describe_task(
+    task_name: str, records: Dict[str, Dict[str, Any]], *, limit: int
+) -> None:
+    total = sum(x["expected"] for x in records.values())
+    ui.info_2(
+        ui.bold, task_name, ui.reset, f"({len(records)} repos, {total:.1f}s in total)"
+    )
+    by_duration = sorted(records.items(), key=lambda x: -x[1]["expected"])
+    if limit > 0:
+        by_duration = by_duration[:limit]
+    dest_width = max(len(dest) for (dest, _) in by_duration)
+    ui.info(
+        ui.lightgray,
+        "  ",
+        "repo".ljust(dest_width),
+        "  expected      last  runs",
+    )
+    for dest, record in by_duration:
+        ui.info(
+            "  ",
+            ui.green,
+            dest.ljust(dest_width),
+            ui.reset,
+            f"{record['expected']:8.2f}s {record['last']:8.2f}s {record['runs']:5}",
+        )
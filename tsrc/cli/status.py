@@ -4,6 +4,8 @@ import argparse
 from copy import deepcopy
 from typing import Dict, List, Union, cast
 
+import cli_ui as ui
+
 from tsrc.cli import (
     add_num_jobs_arg,
     add_repos_selection_args,
@@ -16,6 +18,7 @@ from tsrc.executor import process_items
 from tsrc.groups import GroupNotFound
 from tsrc.groups_to_find import GroupsToFind
 from tsrc.local_tmp_bare_repos import (
+    get_bare_cache_paths,
     prepare_tmp_bare_dm_repos,
     process_bare_repos,
     ready_tmp_bare_repos,
@@ -30,6 +33,7 @@ from tsrc.status_endpoint import (
     StatusCollectorLocalOnly,
 )
 from tsrc.status_header import StatusHeader, StatusHeaderDisplayMode
+from tsrc.tmp_caches import evict_tmp_caches
 from tsrc.utils import erase_last_line
 
 # from tsrc.status_header import header_manifest_branch
@@ -80,6 +84,12 @@ def configure_parser(subparser: argparse._SubParsersAction) -> None:
         help="use buffered Future Manifest to speed-up execution",
         dest="use_same_future_manifest",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_false",
+        help="do not use statuses cached by previous runs, collect all of them again",
+        dest="use_cache",
+    )
     parser.add_argument(
         "--strict",
         action="store_true",
@@ -155,11 +165,15 @@ def run(args: argparse.Namespace) -> None:
     status_collector: Union[StatusCollector, StatusCollectorLocalOnly]
     if args.local_git_only is True:
         status_collector = StatusCollectorLocalOnly(
-            workspace, ignore_group_item=args.ignore_group_item
+            workspace,
+            ignore_group_item=args.ignore_group_item,
+            use_cache=args.use_cache,
         )
     else:
         status_collector = StatusCollector(
-            workspace, ignore_group_item=args.ignore_group_item
+            workspace,
+            ignore_group_item=args.ignore_group_item,
+            use_cache=args.use_cache,
         )
 
     repos = deepcopy(workspace.repos)
@@ -186,8 +200,18 @@ def run(args: argparse.Namespace) -> None:
         )
 
         num_jobs = get_num_jobs(args)
-        process_items(repos, status_collector, num_jobs=num_jobs)
+        process_items(
+            repos,
+            status_collector,
+            num_jobs=num_jobs,
+            durations=workspace.get_durations("status"),
+        )
         erase_last_line()
+        status_cache = status_collector.status_cache
+        if status_cache:
+            ui.debug(
+                f"status cache: {status_cache.hits} hit(s), {status_cache.misses} miss(es)"
+            )
 
         statuses = status_collector.statuses
 
@@ -206,6 +230,8 @@ def run(args: argparse.Namespace) -> None:
     # there still may be some Deep Manifest or Future manifest leftovers
     wrs.check_for_leftovers()
 
+    evict_tmp_caches(workspace, keep=get_bare_cache_paths(workspace, bare_repos))
+
     # check if we have found all Groups (if any provided)
     # and if not, throw exception ManifestGroupNotFound
     wrs.must_match_all_groups(ignore_if_group_not_found=args.ignore_if_group_not_found)
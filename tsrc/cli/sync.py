@@ -1,18 +1,23 @@
 """ Entry point for `tsrc sync` """
 
 import argparse
-from typing import List, Union
+from contextlib import contextmanager
+from typing import Iterator, List, Union
 
 import cli_ui as ui
 
 from tsrc.cli import (
+    add_net_jobs_arg,
     add_num_jobs_arg,
     add_repos_selection_args,
     add_workspace_arg,
+    get_net_jobs,
     get_num_jobs,
     get_workspace,
     resolve_repos,
 )
+from tsrc.errors import Error
+from tsrc.workspace import Workspace
 
 
 def configure_parser(subparser: argparse._SubParsersAction) -> None:
@@ -74,12 +79,39 @@ def configure_parser(subparser: argparse._SubParsersAction) -> None:
         dest="correct_branch",
         help="prevent going back to the configured branch, if the repo is clean",
     )
+    parser.add_argument(
+        "--always-fetch",
+        action="store_false",
+        dest="skip_up_to_date",
+        help="fetch every repository, instead of skipping the ones that have nothing new according to `git ls-remote`",  # noqa: E501
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="sync every repository, including the ones frozen at a tag or sha1 that did not change in the manifest since the last sync",  # noqa: E501
+    )
+    parser.add_argument(
+        "--locked",
+        action="store_true",
+        help="put every repository at the commit found in manifest.lock.yml (see `tsrc lock`)",  # noqa: E501
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="resume the previous sync if it was interrupted or if some repos failed, even if the manifest changed since then",  # noqa: E501
+    )
+    parser.add_argument(
+        "--maintenance",
+        action="store_true",
+        help="once synchronized, run `git maintenance` in the repositories that need it (see `tsrc maintenance`)",  # noqa: E501
+    )
     parser.add_argument(
         "-r",
         "--singular-remote",
         help="only use this remote when cloning repositories",
     )
     add_num_jobs_arg(parser)
+    add_net_jobs_arg(parser)
     parser.set_defaults(run=run)
 
 
@@ -95,6 +127,7 @@ def run(args: argparse.Namespace) -> None:
     correct_branch = args.correct_branch
     workspace = get_workspace(args)
     num_jobs = get_num_jobs(args)
+    net_jobs = get_net_jobs(args)
     do_switch = args.do_switch
     do_clean = args.do_clean
     do_hard_clean = args.do_hard_clean
@@ -158,14 +191,55 @@ def run(args: argparse.Namespace) -> None:
     if len(workspace.repos) == 0:
         ui.info_1("Nothing to synchronize, skipping")
         return
-    workspace.clone_missing(num_jobs=num_jobs)
-    workspace.set_remotes(num_jobs=num_jobs)
-    workspace.sync(
-        force=force,
-        singular_remote=singular_remote,
-        correct_branch=correct_branch,
-        num_jobs=num_jobs,
-    )
-    workspace.clean(do_clean=do_clean, do_hard_clean=do_hard_clean, num_jobs=num_jobs)
-    workspace.perform_filesystem_operations(ignore_group_item=args.ignore_group_item)
+    with recording_sync(workspace, args):
+        workspace.clone_missing(num_jobs=num_jobs, net_jobs=net_jobs)
+        workspace.set_remotes(num_jobs=num_jobs)
+        workspace.sync(
+            force=force,
+            singular_remote=singular_remote,
+            correct_branch=correct_branch,
+            num_jobs=num_jobs,
+            net_jobs=net_jobs,
+            skip_up_to_date=args.skip_up_to_date,
+        )
+        workspace.clean(
+            do_clean=do_clean, do_hard_clean=do_hard_clean, num_jobs=num_jobs
+        )
+        workspace.perform_filesystem_operations(
+            ignore_group_item=args.ignore_group_item, num_jobs=num_jobs
+        )
     ui.info_1("Workspace synchronized")
+
+
+@contextmanager
+def recording_sync(workspace: Workspace, args: argparse.Namespace) -> Iterator[None]:
+    """Record the progress of the sync, see start_sync() and finish_sync()"""
+    start_sync(workspace, args)
+    try:
+        yield
+    except Error:
+        # Some repos failed, but the sync was not interrupted:
+        # see tsrc.sync_journal
+        workspace.end_journal_with_errors()
+        raise
+    finish_sync(workspace, args)
+
+
+def start_sync(workspace: Workspace, args: argparse.Namespace) -> None:
+    """Find the repos that can be skipped, then start recording
+    the progress of the sync
+    """
+    if args.locked:
+        workspace.use_lock()
+    elif not args.full:
+        workspace.find_unchanged_repos(num_jobs=get_num_jobs(args))
+    workspace.start_journal(resume=args.resume)
+
+
+def finish_sync(workspace: Workspace, args: argparse.Namespace) -> None:
+    """Record the successful sync, then run the maintenance it deferred,
+    if asked to
+    """
+    workspace.finish_journal()
+    if args.maintenance:
+        workspace.maintenance(num_jobs=get_num_jobs(args))
@@ -1,14 +1,31 @@
-import os
-import textwrap
 from pathlib import Path
 from typing import List, Optional
 
 import cli_ui as ui
 
+from tsrc.bare_cache import DEFAULT_TTL, BareCache
 from tsrc.errors import Error
-from tsrc.executor import Outcome, Task
-from tsrc.git import run_git_captured
+from tsrc.executor import Outcome, ResourceClass, Task
+from tsrc.git import fetch_shallow_commit, run_git_captured
+from tsrc.git_remote import get_url_host
+from tsrc.mirror_cache import MirrorCache
 from tsrc.repo import Remote, Repo
+from tsrc.sparse_checkout import get_sparse_checkout_cmds
+from tsrc.sync_journal import DONE, TaskJournal
+
+
+def get_clone_filter(repo: Repo, default: Optional[str]) -> Optional[str]:
+    """Return the filter to use for partial clones of the repo, if any:
+    the one from the manifest, or the one from the workspace configuration.
+    """
+    if repo.clone_filter is not None:
+        return repo.clone_filter or None
+    return default
+
+
+# Stage recorded in the sync journal once `git clone` is done, see
+# tsrc.sync_journal
+CLONED = "cloned"
 
 
 class Cloner(Task[Repo]):
@@ -19,11 +36,17 @@ class Cloner(Task[Repo]):
         workspace_path: Path,
         *,
         shallow: bool = False,
+        clone_filter: Optional[str] = None,
         remote_name: Optional[str] = None,
+        mirror_cache: Optional[MirrorCache] = None,
+        journal: Optional[TaskJournal] = None,
     ) -> None:
         self.workspace_path = workspace_path
         self.shallow = shallow
+        self.clone_filter = clone_filter
         self.remote_name = remote_name
+        self.mirror_cache = mirror_cache
+        self.journal = journal
 
     def describe_process_start(self, item: Repo) -> List[ui.Token]:
         return ["Cloning", item.dest]
@@ -34,16 +57,6 @@ class Cloner(Task[Repo]):
     def describe_item(self, item: Repo) -> str:
         return item.dest
 
-    def check_shallow_with_sha1(self, repo: Repo) -> None:
-        if not repo.sha1:
-            return
-        if self.shallow:
-            message = textwrap.dedent(
-                f"Cannot use --shallow with a fixed sha1 ({repo.sha1})\n"
-                "Consider using a tag instead"
-            )
-            raise Error(message)
-
     def _choose_remote(self, repo: Repo) -> Remote:
         if self.remote_name:
             for remote in repo.remotes:
@@ -56,12 +69,23 @@ class Cloner(Task[Repo]):
 
         return repo.remotes[0]
 
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            remote = self._choose_remote(item)
+        except Error:
+            # will be reported when processing the item
+            return None
+        return get_url_host(remote.url)
+
     def clone_repo(self, repo: Repo) -> str:
-        """Clone a missing repo."""
+        """Clone a missing repo, without checking out any file."""
         # Note:
         # Must use the correct remote(s) and branch when cloning,
         # *and* must reset the repo to the correct state if `tag` or
         # `sha1` were set in the manifest configuration.
+        #
+        # The checkout is done later by checkout(), because it does not
+        # need the network.
         repo_path = self.workspace_path / repo.dest
         parent = repo_path.parent
         name = repo_path.name
@@ -69,7 +93,9 @@ class Cloner(Task[Repo]):
         remote = self._choose_remote(repo)
         remote_name = remote.name
         remote_url = remote.url
-        clone_args = ["clone", "--origin", remote_name, remote_url]
+        if self.shallow and repo.sha1:
+            return self.shallow_clone_at_sha1(repo, remote)
+        clone_args = ["clone", "--no-checkout", "--origin", remote_name, remote_url]
         ref = None
         if repo.tag:
             ref = repo.tag
@@ -77,19 +103,97 @@ class Cloner(Task[Repo]):
             ref = repo.branch
         if ref:
             clone_args.extend(["--branch", ref])
+        if repo.sparse is not None:
+            clone_args.append("--sparse")
+        clone_filter = get_clone_filter(repo, self.clone_filter)
+        if clone_filter:
+            clone_args.append(f"--filter={clone_filter}")
         if self.shallow:
             clone_args.extend(["--depth", "1"])
-        if not repo.ignore_submodules:
-            clone_args.append("--recurse-submodules")
+        else:
+            mirror_path = self.update_mirror(remote_url)
+            if mirror_path:
+                clone_args.extend(
+                    ["--reference-if-able", str(mirror_path), "--dissociate"]
+                )
         clone_args.append(name)
 
-        self.run_git(parent, *clone_args)
+        self.run_git(parent, *clone_args, no_auto_gc=True)
 
         summary = f"{repo.dest} cloned from {remote_url}"
         if ref:
             summary += f" (on {ref})"
         return summary
 
+    def shallow_clone_at_sha1(self, repo: Repo, remote: Remote) -> str:
+        """Make a shallow clone of a repo with a fixed sha1.
+
+        `git clone --depth` only works with branches and tags, so create
+        an empty repo instead, and fetch just what is needed to get the sha1.
+        The branch is then created by reset_repo().
+        """
+        assert repo.sha1
+        repo_path = self.workspace_path / repo.dest
+        repo_path.mkdir(parents=True, exist_ok=True)
+        branch = repo.orig_branch or repo.branch or "master"
+        run_git_captured(repo_path, "init")
+        run_git_captured(repo_path, "symbolic-ref", "HEAD", f"refs/heads/{branch}")
+        run_git_captured(repo_path, "remote", "add", remote.name, remote.url)
+        run_git_captured(repo_path, "config", f"branch.{branch}.remote", remote.name)
+        run_git_captured(
+            repo_path, "config", f"branch.{branch}.merge", f"refs/heads/{branch}"
+        )
+        clone_filter = get_clone_filter(repo, self.clone_filter)
+        if clone_filter:
+            run_git_captured(
+                repo_path, "config", f"remote.{remote.name}.promisor", "true"
+            )
+            run_git_captured(
+                repo_path,
+                "config",
+                f"remote.{remote.name}.partialclonefilter",
+                clone_filter,
+            )
+        try:
+            fetch_shallow_commit(repo_path, remote.name, repo.sha1, branch=branch)
+        except Error as e:
+            raise Error(f"Could not fetch {repo.sha1} from {remote.url}: {e.message}")
+        return f"{repo.dest} cloned from {remote.url} (shallow, at {repo.sha1})"
+
+    def update_mirror(self, url: str) -> Optional[Path]:
+        """Return the path of an up-to-date mirror of the given url,
+        if the mirror cache is used.
+        """
+        if not self.mirror_cache:
+            return None
+        self.info_3("Updating mirror of", url)
+        try:
+            return self.mirror_cache.update(url)
+        except Error as e:
+            # Not fatal: the clone can still be made from the server
+            ui.warning(e.message)
+            return None
+
+    def checkout(self, repo: Repo) -> None:
+        repo_path = self.workspace_path / repo.dest
+        for cmd in get_sparse_checkout_cmds(repo_path, repo):
+            self.run_git(repo_path, *cmd)
+        rc, _ = run_git_captured(
+            repo_path, "rev-parse", "--verify", "--quiet", "HEAD", check=False
+        )
+        if rc != 0:
+            # empty repository, nothing to check out
+            return
+        self.run_git(repo_path, "checkout", "--force")
+
+    def update_submodules(self, repo: Repo) -> None:
+        repo_path = self.workspace_path / repo.dest
+        if not (repo_path / ".gitmodules").exists():
+            return
+        self.run_git(
+            repo_path, "submodule", "update", "--init", "--recursive", no_auto_gc=True
+        )
+
     def reset_repo(self, repo: Repo) -> str:
         ref = repo.sha1
         if not ref:
@@ -115,10 +219,24 @@ class Cloner(Task[Repo]):
         # `git reset` will be shown directly to the user, so we can use
         # an empty summary
         self.info_count(index, count, "Cloning", repo.dest)
-        self.check_shallow_with_sha1(repo)
         summary: str = ""
-        summary += self.clone_repo(repo)
-        summary += self.reset_repo(repo)
+        if self.journal and self.journal.has(repo.dest, CLONED):
+            # resuming an interrupted clone, see tsrc.sync_journal
+            summary += f"{repo.dest} cloned"
+        else:
+            with self.use_resource(ResourceClass.NETWORK, self.get_host(repo)):
+                summary += self.clone_repo(repo)
+            if self.journal:
+                self.journal.record(repo.dest, CLONED)
+        with self.use_resource(ResourceClass.LOCAL):
+            self.checkout(repo)
+        if not repo.ignore_submodules:
+            with self.use_resource(ResourceClass.NETWORK):
+                self.update_submodules(repo)
+        with self.use_resource(ResourceClass.LOCAL):
+            summary += self.reset_repo(repo)
+        if self.journal:
+            self.journal.record(repo.dest, DONE)
         return Outcome.from_summary(summary)
 
 
@@ -145,6 +263,9 @@ class BareCloner(Task[Repo]):
     able to do the same with SHA1. That is why Tag
     does not need to be translated to position,
     to be understood, unlike SHA1 does.
+
+    The bare Repos are shared by the Deep Manifest and the
+    Future Manifest, see tsrc.bare_cache.
     """
 
     def __init__(
@@ -152,10 +273,12 @@ class BareCloner(Task[Repo]):
         workspace_path: Path,
         *,
         remote_name: Optional[str] = None,
+        ttl: int = DEFAULT_TTL,
     ) -> None:
         self.workspace_path = workspace_path
-        # self.prefix_path = prefix_path  # Workspace Path alone is not it
         self.remote_name = remote_name
+        self.bare_cache = BareCache.for_workspace(workspace_path)
+        self.ttl = ttl
 
     def describe_process_start(self, item: Repo) -> List[ui.Token]:
         # return ["Cloning", item.dest]
@@ -180,79 +303,55 @@ class BareCloner(Task[Repo]):
 
         return repo.remotes[0]
 
-    def bare_clone_repo(self, repo: Repo) -> Path:
-        # check if our Repo is bare
-        repo_path = self.workspace_path / repo.dest
-        parent = repo_path.parent
-        parent.mkdir(parents=True, exist_ok=True)
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            return get_url_host(self._choose_remote(item).url)
+        except Error:
+            # will be reported when processing the item
+            return None
+
+    def bare_fetch_repo(self, repo: Repo) -> Path:
+        """Fetch what is needed to compute the position of the repo's
+        commit in the shared bare cache, see tsrc.bare_cache
+        """
         remote = self._choose_remote(repo)
-        remote_url = remote.url
-        if Path(str(repo_path) + os.sep + ".git").is_dir():
-            return repo_path
-        clone_args = [
-            "clone",
-            "--mirror",
-            remote_url,
-            str(repo_path) + os.sep + ".git",
-        ]
-
-        run_git_captured(parent, *clone_args)
-
-        # make sure from this moment on to use 'repo_path'
-
-        run_git_captured(
-            repo_path, "config", "--bool", "core.bare", "false", check=False
-        )
-
-        run_git_captured(repo_path, "remote", "remove", remote.name, check=False)
-        run_git_captured(
-            repo_path, "remote", "add", remote.name, remote_url, check=False
-        )
-
-        return repo_path
-
-    def bare_set_branch(self, repo: Repo) -> bool:
-
-        if repo.branch:
-            self.run_git(
-                Path(repo.dest), "symbolic-ref", "HEAD", f"refs/heads/{repo.branch}"
-            )
-
-        # check if 'Tag' is reference to same SHA1 provided, if not, it is an Error
-        if repo.tag:
-            # get Tag's SHA1 of commit
-            rc, t_sha1 = run_git_captured(
-                Path(repo.dest),
-                "rev-list",
-                "-n",
-                "1",
-                f"refs/tags/{repo.tag}",
-                check=False,
-            )
-            if rc != 0 or t_sha1 != repo.sha1:
+        with self.use_resource(ResourceClass.NETWORK, get_url_host(remote.url)):
+            try:
+                return self.bare_cache.update(
+                    remote.url,
+                    remote.name,
+                    branch=repo.branch,
+                    tag=repo.tag,
+                    sha1=repo.sha1,
+                    alternate=repo._bare_clone_path,
+                    ttl=self.ttl,
+                )
+            except Error:
                 repo._bare_clone_is_fail()  # mark repo: fail state
-                return False
-        return True
-
-    def bare_reset_repo(self, repo: Repo) -> None:
+                raise
 
-        ref = repo.sha1
-        if not ref:
+    def bare_check_tag(self, repo: Repo, repo_path: Path) -> None:
+        """Check that the Tag is a reference to the same SHA1 provided,
+        as it is an Error otherwise
+        """
+        if not repo.tag:
             return
-        else:
-            try:
-                self.run_git(Path(repo.dest), "reset", "--soft", ref)
-            except Error:
-                repo._bare_clone_is_fail()
-                raise Error("Resetting to", ref, "failed")
+        rc, t_sha1 = run_git_captured(
+            repo_path,
+            "rev-list",
+            "-n",
+            "1",
+            f"refs/tags/{repo.tag}",
+            check=False,
+        )
+        if rc != 0 or t_sha1 != repo.sha1:
+            repo._bare_clone_is_fail()  # mark repo: fail state
 
     def process(self, index: int, count: int, repo: Repo) -> Outcome:
 
         self.info_count(index, count, repo.dest, end="\r")
-        repo_path = self.bare_clone_repo(repo)
-        self.run_git(repo_path, "fetch", "--all", "--prune")
-        if self.bare_set_branch(repo) is True:
-            self.bare_reset_repo(repo)
+        repo_path = self.bare_fetch_repo(repo)
+        self.bare_check_tag(repo, repo_path)
         # NOTE: not considering submodules (not useful for bare Repo)
 
         return Outcome.empty()
@@ -0,0 +1,125 @@
+"""
+Durations
+
+Record how long each task (clone, sync, status, foreach, ...) took for
+each repo, in `<workspace>/.tsrc/durations.json`.
+
+This is used by process_items() to start with the items expected
+to take the longest, so that a big repo does not end up being processed
+alone at the end, while all other jobs are idle (this is known as
+"Longest Processing Time first" scheduling).
+
+The recorded data can be displayed with `tsrc stats`.
+"""
+
+import json
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from tsrc.utils import atomic_write
+
+T = TypeVar("T")
+
+# Weight of the last run in the expected duration
+_SMOOTHING = 0.5
+
+
+class DurationStore:
+    """Usage:
+
+    >>> store = DurationStore.for_workspace(workspace.root_path)
+    >>> durations = store.for_task("sync")
+    >>> process_items(repos, syncer, num_jobs=num_jobs, durations=durations)
+
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # task name -> item -> {"expected": float, "last": float, "runs": int}
+        self.data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = Lock()
+        self.load()
+
+    @classmethod
+    def for_workspace(cls, root_path: Path) -> "DurationStore":
+        return cls(root_path / ".tsrc" / "durations.json")
+
+    def load(self) -> None:
+        try:
+            parsed = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(parsed, dict):
+            self.data = parsed
+
+    def save(self) -> None:
+        if not self.path.parent.is_dir():
+            # not in a workspace (yet)
+            return
+        with self._lock:
+            contents = json.dumps(self.data, indent=2, sort_keys=True)
+        atomic_write(self.path, contents)
+
+    def for_task(self, task_name: str) -> "TaskDurations":
+        return TaskDurations(self, task_name)
+
+    def get(self, task_name: str, item: str) -> Optional[Dict[str, Any]]:
+        return self.data.get(task_name, {}).get(item)
+
+    def record(self, task_name: str, item: str, seconds: float) -> None:
+        with self._lock:
+            records = self.data.setdefault(task_name, {})
+            previous = records.get(item)
+            if previous:
+                expected = (
+                    _SMOOTHING * seconds + (1 - _SMOOTHING) * previous["expected"]
+                )
+                runs = previous["runs"] + 1
+            else:
+                expected = seconds
+                runs = 1
+            records[item] = {
+                "expected": round(expected, 3),
+                "last": round(seconds, 3),
+                "runs": runs,
+            }
+
+
+class TaskDurations:
+    """The durations recorded for one task"""
+
+    def __init__(self, store: DurationStore, task_name: str) -> None:
+        self.store = store
+        self.task_name = task_name
+
+    def expected(self, item: str) -> Optional[float]:
+        record = self.store.get(self.task_name, item)
+        if not record:
+            return None
+        res: float = record["expected"]
+        return res
+
+    def record(self, item: str, seconds: float) -> None:
+        self.store.record(self.task_name, item, seconds)
+
+    def save(self) -> None:
+        self.store.save()
+
+    def sort_longest_first(
+        self, items: List[T], describe: Callable[[T], str]
+    ) -> List[T]:
+        """Sort items by decreasing expected duration.
+
+        Items never processed before are expected to take as long as
+        the average item. The order of items expected to take the same
+        time is kept.
+        """
+        expected = [self.expected(describe(x)) for x in items]
+        known = [x for x in expected if x is not None]
+        if not known:
+            return items
+        average = sum(known) / len(known)
+        keys = [average if x is None else x for x in expected]
+        order = sorted(range(len(items)), key=lambda i: -keys[i])
+        return [items[i] for i in order]
@@ -24,6 +24,46 @@ the Task[T] interface
 * Both the SequentialExecutor and the ParallelExecutor will call
   Task.process() for each item, but the SequentialExecutor will do
   it in a simple loop, and ParallelExecutor will use a ThreadPoolExecutor
+* When the TSRC_EXECUTOR environment variable is set to `asyncio`,
+  the AsyncioExecutor is used instead of the ParallelExecutor. It
+  calls Task.process_async() for each item from an asyncio event loop,
+  with at most `num_jobs` items processed at the same time.
+
+## Resource classes
+
+Some steps of a task mostly wait for the network (like `git fetch`),
+others mostly use the disk and the CPU (like `git checkout`). Tasks can
+wrap their steps with `self.use_resource(ResourceClass.NETWORK)` or
+`self.use_resource(ResourceClass.LOCAL)`.
+
+When process_items() is called with `net_jobs`, there may be up to
+`net_jobs` NETWORK steps and up to `num_jobs` LOCAL steps running at the
+same time. Otherwise, use_resource() does nothing and `num_jobs` is the only
+limit.
+
+NETWORK steps may also tell which host they connect to. When process_items()
+is called with `host_jobs`, there may be up to `host_jobs` NETWORK steps
+connecting to the same host at the same time, and items are interleaved
+between hosts, using Task.get_host().
+
+## Scheduling
+
+When process_items() is called with `durations` (see tsrc.durations), the
+time spent on each item is recorded, and on the next runs the items expected
+to take the longest are started first.
+
+## Asynchronous tasks
+
+By default, Task.process_async() runs Task.process() in a thread, so
+every Task works with the AsyncioExecutor. The threads come from a pool
+owned by the AsyncioExecutor, with one worker per job, so that `num_jobs`
+items can always make progress, including when some of them are waiting
+in a thread for a resource (see acquire_async()).
+
+Tasks spending most of their time waiting on the network (like `git fetch`)
+can override process_async() and use `await self.run_git_async()` for those
+steps, so that many of them can be in flight without needing one thread
+per job.
 
 ## Displaying output when the tasks at running
 
@@ -84,16 +124,37 @@ to print the summary, or an error message when relevant.
 """
 
 import abc
+import asyncio
+import functools
+import os
+import sys
+import time
+import warnings
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, asynccontextmanager, contextmanager
 from dataclasses import dataclass
+from enum import Enum, unique
 from pathlib import Path
-from threading import Lock
-from typing import Any, Dict, Generic, List, Optional, TypeVar
+from threading import BoundedSemaphore, Lock
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import cli_ui as ui
 
+from tsrc.durations import TaskDurations
 from tsrc.errors import Error
-from tsrc.git import run_git
+from tsrc.git import run_git, run_git_async
 from tsrc.utils import erase_last_line
 
 T = TypeVar("T")
@@ -103,6 +164,100 @@ class ExecutorFailed(Error):
     pass
 
 
+class UnknownExecutor(Error):
+    def __init__(self, name: str) -> None:
+        super().__init__(
+            f"Unknown executor: '{name}' (TSRC_EXECUTOR should be "
+            "either 'thread' or 'asyncio')"
+        )
+
+
+@unique
+class ResourceClass(Enum):
+    """What a step of a Task mostly waits for"""
+
+    NETWORK = "network"
+    LOCAL = "local"
+
+
+class ResourceLimits:
+    """Limit how many steps of each ResourceClass run at the same time,
+    and, when `host_jobs` is set, how many NETWORK steps connect to
+    the same host at the same time.
+
+    Note: the same semaphores are used by use() and use_async(), since
+    with the AsyncioExecutor, some steps are awaited from the event loop
+    while others run in threads (see Task.process_async()).
+    """
+
+    def __init__(
+        self, limits: Dict[ResourceClass, int], *, host_jobs: Optional[int] = None
+    ) -> None:
+        self.limits = limits
+        self.host_jobs = host_jobs
+        self._semaphores: Dict[Hashable, BoundedSemaphore] = {}
+        self._lock = Lock()
+
+    def _get_limits(
+        self, resource: ResourceClass, host: Optional[str]
+    ) -> List[Tuple[Hashable, int]]:
+        res: List[Tuple[Hashable, int]] = []
+        # Note: wait for the host first, so that steps waiting for a busy
+        # host do not prevent steps using other hosts from running
+        if resource == ResourceClass.NETWORK and host and self.host_jobs:
+            res.append((("host", host), self.host_jobs))
+        if resource in self.limits:
+            res.append((resource, self.limits[resource]))
+        return res
+
+    def _get_semaphore(self, key: Hashable, limit: int) -> BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = BoundedSemaphore(limit)
+                self._semaphores[key] = semaphore
+            return semaphore
+
+    @contextmanager
+    def use(
+        self, resource: ResourceClass, host: Optional[str] = None
+    ) -> Iterator[None]:
+        with ExitStack() as stack:
+            for key, limit in self._get_limits(resource, host):
+                stack.enter_context(self._get_semaphore(key, limit))
+            yield
+
+    @asynccontextmanager
+    async def use_async(
+        self, resource: ResourceClass, host: Optional[str] = None
+    ) -> AsyncIterator[None]:
+        with ExitStack() as stack:
+            for key, limit in self._get_limits(resource, host):
+                semaphore = self._get_semaphore(key, limit)
+                await acquire_async(semaphore)
+                stack.callback(semaphore.release)
+            yield
+
+
+async def acquire_async(semaphore: BoundedSemaphore) -> None:
+    """Acquire a thread semaphore from the event loop, waiting for it
+    in a thread if it is not available right away
+
+    Note: the thread comes from the default pool of the loop, see
+    AsyncioExecutor.process_all()
+    """
+    if semaphore.acquire(blocking=False):
+        return
+    loop = asyncio.get_event_loop()
+    future = loop.run_in_executor(None, semaphore.acquire)
+    try:
+        await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # The thread will get the semaphore eventually: give it back then
+        future.add_done_callback(lambda _: semaphore.release())
+        raise
+
+
 @dataclass
 class Outcome:
     """The result of processing an item."""
@@ -160,9 +315,43 @@ class OutcomeCollection:
 class Task(Generic[T], metaclass=abc.ABCMeta):
     """Represent an action to be performed."""
 
+    # Set when the task is run in parallel, see use_resource()
+    resource_limits: Optional[ResourceLimits] = None
+
     def __init__(self, *, parallel: bool):
         self.parallel = parallel
 
+    @contextmanager
+    def use_resource(
+        self, resource: ResourceClass, host: Optional[str] = None
+    ) -> Iterator[None]:
+        """Wait until the step using `resource` (and connecting to `host`,
+        for NETWORK steps) is allowed to run.
+        """
+        if self.resource_limits is None:
+            yield
+            return
+        with self.resource_limits.use(resource, host):
+            yield
+
+    @asynccontextmanager
+    async def use_resource_async(
+        self, resource: ResourceClass, host: Optional[str] = None
+    ) -> AsyncIterator[None]:
+        """Same as use_resource(), to be used from process_async()."""
+        if self.resource_limits is None:
+            yield
+            return
+        async with self.resource_limits.use_async(resource, host):
+            yield
+
+    def get_host(self, item: T) -> Optional[str]:
+        """Return the host the NETWORK steps of the item connect to, if any.
+
+        Used to interleave items using different hosts.
+        """
+        return None
+
     def info(self, *args: Any, **kwargs: Any) -> None:
         """Same as cli_ui.info(), except this is a no-op if the
         task is run in parallel with other tasks.
@@ -195,14 +384,28 @@ class Task(Generic[T], metaclass=abc.ABCMeta):
         if not self.parallel:
             ui.info_count(index, count, *args, **kwargs)
 
-    def run_git(self, working_path: Path, *args: str) -> None:
+    def run_git(self, working_path: Path, *args: str, no_auto_gc: bool = False) -> None:
         """Same as tsrc.git.run_git, except the output of the git command
         is captured if the task is run in parallel with other tasks.
         """
         if self.parallel:
-            run_git(working_path, *args, show_output=False, show_cmd=False)
+            run_git(
+                working_path,
+                *args,
+                show_output=False,
+                show_cmd=False,
+                no_auto_gc=no_auto_gc,
+            )
         else:
-            run_git(working_path, *args)
+            run_git(working_path, *args, no_auto_gc=no_auto_gc)
+
+    async def run_git_async(
+        self, working_path: Path, *args: str, no_auto_gc: bool = False
+    ) -> None:
+        """Same as tsrc.git.run_git_async. Only used when the task is
+        run in parallel, so the output of the git command is always captured.
+        """
+        await run_git_async(working_path, *args, no_auto_gc=no_auto_gc)
 
     @abc.abstractmethod
     def describe_item(self, item: T) -> str:
@@ -233,14 +436,28 @@ class Task(Generic[T], metaclass=abc.ABCMeta):
         """
         pass
 
+    async def process_async(self, index: int, count: int, item: T) -> Outcome:
+        """Called by the AsyncioExecutor instead of process().
+
+        The default implementation runs process() in a thread, daughter
+        classes may override it to await on the slow parts instead.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.process, index, count, item)
+        )
+
 
 class SequentialExecutor(Generic[T]):
     """Run the task on all items one at a time, while collecting errors that
     occur in the process.
     """
 
-    def __init__(self, task: Task[T]) -> None:
+    def __init__(
+        self, task: Task[T], durations: Optional[TaskDurations] = None
+    ) -> None:
         self.task = task
+        self.durations = durations
 
     def process(self, items: List[T]) -> Dict[str, Outcome]:
         result = {}
@@ -248,7 +465,10 @@ class SequentialExecutor(Generic[T]):
         for index, item in enumerate(items):
             item_desc = self.task.describe_item(item)
             try:
+                start = time.perf_counter()
                 outcome = self.task.process(index, count, item)
+                if self.durations:
+                    self.durations.record(item_desc, time.perf_counter() - start)
             except Error as e:
                 ui.error(e)
                 outcome = Outcome.from_error(e)
@@ -261,9 +481,15 @@ class ParallelExecutor(Generic[T]):
     occur in the process.
     """
 
-    def __init__(self, task: Task[T], num_jobs: int) -> None:
+    def __init__(
+        self,
+        task: Task[T],
+        num_jobs: int,
+        durations: Optional[TaskDurations] = None,
+    ) -> None:
         self.task = task
         self.num_jobs = num_jobs
+        self.durations = durations
         self.done_count = 0
         self.lock = Lock()
 
@@ -300,7 +526,11 @@ class ParallelExecutor(Generic[T]):
                 erase_last_line()
                 ui.info_count(index, count, *tokens, end="\r")
 
+        start = time.perf_counter()
         result = self.task.process(index, count, item)
+        if self.durations:
+            duration = time.perf_counter() - start
+            self.durations.record(self.task.describe_item(item), duration)
 
         # Note: we don't know if tasks will be finished in the same order
         # they were started, so to keep the output relevant, we need a
@@ -318,25 +548,207 @@ class ParallelExecutor(Generic[T]):
         return result
 
 
+class AsyncioExecutor(Generic[T]):
+    """Run the tasks from an asyncio event loop, with at most `n` of them
+    running at the same time, while collecting errors that occur in the process.
+    """
+
+    def __init__(
+        self,
+        task: Task[T],
+        num_jobs: int,
+        durations: Optional[TaskDurations] = None,
+    ) -> None:
+        self.task = task
+        self.num_jobs = num_jobs
+        self.durations = durations
+        self.done_count = 0
+
+    def process(self, items: List[T]) -> Dict[str, Outcome]:
+        if not items:
+            return {}
+        outcomes = asyncio.run(self.process_all(items))
+        result = {}
+        for item, outcome in zip(items, outcomes):
+            result[self.task.describe_item(item)] = outcome
+        erase_last_line()
+        return result
+
+    async def process_all(self, items: List[T]) -> List[Outcome]:
+        use_pidfd_child_watcher()
+        # Note: the default pool of the loop is too small for large
+        # values of num_jobs. Since at most num_jobs items are processed at
+        # the same time, and each of them uses at most one thread at a time
+        # (to run process() or to wait for a resource), this one never runs
+        # out of workers. It is shut down by asyncio.run()
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.num_jobs))
+        semaphore = asyncio.Semaphore(self.num_jobs)
+        count = len(items)
+        return await asyncio.gather(
+            *(
+                self.process_item(semaphore, index, count, item)
+                for (index, item) in enumerate(items)
+            )
+        )
+
+    async def process_item(
+        self, semaphore: asyncio.Semaphore, index: int, count: int, item: T
+    ) -> Outcome:
+        # Note: all the output is done from the event loop thread,
+        # so unlike in ParallelExecutor, no lock is needed
+        async with semaphore:
+            tokens = self.task.describe_process_start(item)
+            if tokens:
+                erase_last_line()
+                ui.info_count(index, count, *tokens, end="\r")
+
+            try:
+                start = time.perf_counter()
+                result = await self.task.process_async(index, count, item)
+                if self.durations:
+                    duration = time.perf_counter() - start
+                    self.durations.record(self.task.describe_item(item), duration)
+            except Error as e:
+                result = Outcome.from_error(e)
+
+            self.done_count += 1
+
+            tokens = self.task.describe_process_end(item)
+            if tokens:
+                erase_last_line()
+                ui.info_count(self.done_count - 1, count, *tokens, end="\r")
+                if self.done_count == count:
+                    ui.info()
+
+            return result
+
+
+def use_pidfd_child_watcher() -> None:
+    """Before Python 3.12, asyncio waits for each subprocess in a
+    dedicated thread by default. Use pidfds instead when the kernel
+    supports them, so that running many git commands at the same
+    time does not need as many threads.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(asyncio.get_running_loop())
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        asyncio.set_child_watcher(watcher)
+
+
+def get_executor_name() -> str:
+    """Return the name of the executor used to run tasks in parallel,
+    from the TSRC_EXECUTOR environment variable.
+    """
+    name = os.environ.get("TSRC_EXECUTOR") or "thread"
+    if name not in ["thread", "asyncio"]:
+        raise UnknownExecutor(name)
+    return name
+
+
 def process_items(
-    items: List[T], task: Task[T], *, num_jobs: int = 1
+    items: List[T],
+    task: Task[T],
+    *,
+    num_jobs: int = 1,
+    net_jobs: Optional[int] = None,
+    host_jobs: Optional[int] = None,
+    durations: Optional[TaskDurations] = None,
 ) -> OutcomeCollection:
-    if num_jobs > 1:
-        res = process_items_parallel(items, task, num_jobs=num_jobs)
+    """Process all the items with the given task.
+
+    When `durations` is set, the time spent on each item is recorded,
+    and items expected to take the longest are processed first.
+
+    When `net_jobs` is set, `num_jobs` only limits the LOCAL steps
+    of the task, and `net_jobs` limits its NETWORK steps.
+
+    When `host_jobs` is set, NETWORK steps connecting to the same
+    host are limited to `host_jobs`, and items are reordered so
+    that consecutive items use different hosts.
+    """
+    limits = None
+    if net_jobs or host_jobs:
+        class_limits = {}
+        if net_jobs:
+            class_limits = {
+                ResourceClass.NETWORK: net_jobs,
+                ResourceClass.LOCAL: num_jobs,
+            }
+            num_jobs = max(num_jobs, net_jobs)
+        limits = ResourceLimits(class_limits, host_jobs=host_jobs)
+    if durations and num_jobs > 1:
+        items = durations.sort_longest_first(items, task.describe_item)
+    if host_jobs and num_jobs > 1:
+        items = interleave_by_host(items, task.get_host)
+    if num_jobs > 1 and get_executor_name() == "asyncio":
+        res = process_items_asyncio(
+            items, task, num_jobs=num_jobs, limits=limits, durations=durations
+        )
+    elif num_jobs > 1:
+        res = process_items_parallel(
+            items, task, num_jobs=num_jobs, limits=limits, durations=durations
+        )
     else:
-        res = process_items_sequence(items, task)
+        res = process_items_sequence(items, task, durations=durations)
+    if durations:
+        durations.save()
     return OutcomeCollection(res)
 
 
+def interleave_by_host(
+    items: List[T], get_host: Callable[[T], Optional[str]]
+) -> List[T]:
+    """Reorder items in a round-robin fashion between hosts, keeping
+    the relative order of items using the same host.
+    """
+    by_host: Dict[Optional[str], List[T]] = {}
+    for item in items:
+        by_host.setdefault(get_host(item), []).append(item)
+    queues = list(by_host.values())
+    longest = max((len(x) for x in queues), default=0)
+    return [queue[i] for i in range(longest) for queue in queues if i < len(queue)]
+
+
 def process_items_parallel(
-    items: List[T], task: Task[T], *, num_jobs: int
+    items: List[T],
+    task: Task[T],
+    *,
+    num_jobs: int,
+    limits: Optional[ResourceLimits] = None,
+    durations: Optional[TaskDurations] = None,
+) -> Dict[str, Outcome]:
+    task.parallel = True
+    task.resource_limits = limits
+    executor = ParallelExecutor(task, num_jobs=num_jobs, durations=durations)
+    return executor.process(items)
+
+
+def process_items_asyncio(
+    items: List[T],
+    task: Task[T],
+    *,
+    num_jobs: int,
+    limits: Optional[ResourceLimits] = None,
+    durations: Optional[TaskDurations] = None,
 ) -> Dict[str, Outcome]:
     task.parallel = True
-    executor = ParallelExecutor(task, num_jobs=num_jobs)
+    task.resource_limits = limits
+    executor = AsyncioExecutor(task, num_jobs=num_jobs, durations=durations)
     return executor.process(items)
 
 
-def process_items_sequence(items: List[T], task: Task[T]) -> Dict[str, Outcome]:
+def process_items_sequence(
+    items: List[T], task: Task[T], *, durations: Optional[TaskDurations] = None
+) -> Dict[str, Outcome]:
     task.parallel = False
-    executor = SequentialExecutor(task)
+    task.resource_limits = None
+    executor = SequentialExecutor(task, durations=durations)
     return executor.process(items)
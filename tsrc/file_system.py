@@ -1,13 +1,42 @@
 import abc
+import filecmp
 import os
 import shutil
+import sys
 from dataclasses import dataclass
+from enum import Enum, unique
 from pathlib import Path
-
-import cli_ui as ui
+from typing import List, Optional, Tuple
 
 from tsrc.errors import Error
 
+if sys.platform == "linux":
+    import fcntl
+
+# from <linux/fs.h>
+FICLONE = 0x40049409
+
+
+@unique
+class CopyMode(Enum):
+    """How copies are made, see `copy_mode` in the workspace configuration"""
+
+    # duplicate the bytes
+    COPY = "copy"
+    # share the bytes with the source until one of them is modified,
+    # on file systems supporting it (btrfs, xfs, ...)
+    REFLINK = "reflink"
+    # make a hard link to the source: both are then the same file
+    HARDLINK = "hardlink"
+
+
+def get_copy_mode(value: str) -> CopyMode:
+    try:
+        return CopyMode(value)
+    except ValueError:
+        choices = ", ".join(x.value for x in CopyMode)
+        raise Error(f"Invalid copy mode: '{value}' (should be one of {choices})")
+
 
 class FileSystemOperation(metaclass=abc.ABCMeta):
     @abc.abstractmethod
@@ -15,13 +44,29 @@ class FileSystemOperation(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    def perform(self, workspace_path: Path) -> None:
+    def perform(
+        self, workspace_path: Path, *, copy_mode: CopyMode = CopyMode.COPY
+    ) -> Optional[str]:
+        """Perform the operation, and return what to tell the user
+        about it, if anything (operations may run in parallel, so they
+        must not print anything themselves)
+        """
         pass
 
     @abc.abstractmethod
     def get_repo(self) -> str:
         pass
 
+    @abc.abstractmethod
+    def get_written_paths(self, workspace_path: Path) -> List[Path]:
+        """Return the paths created or modified by the operation"""
+        pass
+
+    @abc.abstractmethod
+    def get_read_paths(self, workspace_path: Path) -> List[Path]:
+        """Return the paths the operation depends on"""
+        pass
+
 
 @dataclass(frozen=True)
 class Copy(FileSystemOperation):
@@ -37,10 +82,23 @@ class Copy(FileSystemOperation):
         dest_path = workspace_path / self.dest
         return f"Copy {src_path} -> {dest_path}"
 
-    def perform(self, workspace_path: Path) -> None:
+    def perform(
+        self, workspace_path: Path, *, copy_mode: CopyMode = CopyMode.COPY
+    ) -> Optional[str]:
         src_path = workspace_path / self.repo / self.src
         dest_path = workspace_path / self.dest
-        shutil.copy(src_path, dest_path)
+        if dest_path.is_dir():
+            dest_path = dest_path / src_path.name
+        if is_up_to_date_copy(src_path, dest_path, copy_mode=copy_mode):
+            return "Leaving identical file"
+        copy_file(src_path, dest_path, copy_mode=copy_mode)
+        return None
+
+    def get_written_paths(self, workspace_path: Path) -> List[Path]:
+        return [workspace_path / self.dest]
+
+    def get_read_paths(self, workspace_path: Path) -> List[Path]:
+        return [workspace_path / self.repo / self.src]
 
 
 @dataclass(frozen=True)
@@ -56,14 +114,121 @@ class Link(FileSystemOperation):
         source = workspace_path / self.source
         return f"Link {source} -> {self.target}"
 
-    def perform(self, workspace_path: Path) -> None:
+    def perform(
+        self, workspace_path: Path, *, copy_mode: CopyMode = CopyMode.COPY
+    ) -> Optional[str]:
         source = workspace_path / self.source
         target = Path(self.target)
-        safe_link(source=source, target=target)
+        return safe_link(source=source, target=target)
+
+    def get_written_paths(self, workspace_path: Path) -> List[Path]:
+        return [workspace_path / self.source]
+
+    def get_read_paths(self, workspace_path: Path) -> List[Path]:
+        # Note: the target is relative to the directory of the link
+        source = workspace_path / self.source
+        return [Path(os.path.normpath(source.parent / self.target))]
+
+
+def is_up_to_date_copy(src_path: Path, dest_path: Path, *, copy_mode: CopyMode) -> bool:
+    """Whether `dest_path` is already a copy of `src_path`.
+
+    Files with the same size and modification time are assumed to be
+    identical (copies keep the modification time of their source), and
+    only files with the same size are compared byte by byte.
+    """
+    if not dest_path.exists() or dest_path.is_symlink():
+        return False
+    if copy_mode == CopyMode.HARDLINK:
+        return os.path.samefile(src_path, dest_path)
+    if os.path.samefile(src_path, dest_path):
+        # a hard link made with another copy mode, which must be broken
+        return False
+    src_stat = src_path.stat()
+    dest_stat = dest_path.stat()
+    if src_stat.st_size != dest_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    if not filecmp.cmp(src_path, dest_path, shallow=False):
+        return False
+    # So that the contents are not compared again next time
+    os.utime(dest_path, ns=(dest_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return True
+
+
+def copy_file(src_path: Path, dest_path: Path, *, copy_mode: CopyMode) -> None:
+    """Copy `src_path` to `dest_path`, keeping the permissions and the
+    modification time of the source.
+
+    The copy is made next to the destination, and then renamed, so that
+    the destination is never left half-written - and so that hard links
+    made by a previous sync are replaced instead of written through.
+    """
+    tmp_path = dest_path.with_name(f".{dest_path.name}.tsrc-tmp")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        if copy_mode == CopyMode.HARDLINK and try_hardlink(src_path, tmp_path):
+            os.replace(tmp_path, dest_path)
+            return
+        if copy_mode == CopyMode.REFLINK:
+            clone_file(src_path, tmp_path)
+        else:
+            shutil.copyfile(src_path, tmp_path)
+        shutil.copystat(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
 
-def safe_link(*, source: Path, target: Path) -> None:
-    """Safely create a link in 'source' pointing to 'target'."""
+def try_hardlink(src_path: Path, dest_path: Path) -> bool:
+    try:
+        os.link(src_path, dest_path)
+        return True
+    except OSError:
+        # for instance across file systems: fall back to a copy
+        return False
+
+
+def clone_file(src_path: Path, dest_path: Path) -> None:
+    """Copy the file without duplicating its bytes when possible:
+
+    * with the FICLONE ioctl on file systems supporting reflinks,
+    * or with copy_file_range(), which lets the kernel (or the
+      file server) copy the bytes, and share them when it can,
+    * or with a regular copy.
+    """
+    if sys.platform != "linux":
+        shutil.copyfile(src_path, dest_path)
+        return
+    with src_path.open("rb") as src, dest_path.open("wb") as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+        try:
+            size = os.fstat(src.fileno()).st_size
+            copied = 0
+            while copied < size:
+                count = os.copy_file_range(src.fileno(), dest.fileno(), size - copied)
+                if count == 0:
+                    break
+                copied += count
+            return
+        except OSError:
+            # for instance across file systems, with older kernels
+            dest.seek(0)
+            dest.truncate()
+        src.seek(0)
+        shutil.copyfileobj(src, dest)
+
+
+def safe_link(*, source: Path, target: Path) -> str:
+    """Safely create a link in 'source' pointing to 'target'.
+
+    Return what was done, to be shown to the user.
+    """
     # Not: we need to call both islink() and exist() to safely ensure
     # that the link exists:
     #
@@ -74,38 +239,35 @@ def safe_link(*, source: Path, target: Path) -> None:
     #    True      False       broken symlink, need to remove
     #    True      True        symlink points to a valid target, check target
     #    ----------------------------------------------------------
-    make_link = check_link(source=source, target=target)
+    make_link, message = check_link(source=source, target=target)
     if make_link:
-        ui.info_3("Creating link", source, "->", target)
-
         os.symlink(
             os.path.normpath(target),
             os.path.normcase(source),
             target_is_directory=target.is_dir(),
         )
+    return message
 
 
-def check_link(*, source: Path, target: Path) -> bool:
-    remove_link = False
+def check_link(*, source: Path, target: Path) -> Tuple[bool, str]:
+    """Return whether the link must be created, removing the existing
+    one if needed, and what to tell the user about it
+    """
     if source.exists() and not source.is_symlink():
         raise Error("Specified symlink source exists but is not a link")
-    if source.is_symlink():
-        if source.exists():
-            # symlink exists and points to some target
-            current_target = Path(os.readlink(str(source)))
-            if current_target.resolve() == target.resolve():
-                ui.info_3("Leaving existing link")
-                return False
-            else:
-                ui.info_3("Replacing existing link")
-                remove_link = True
-        else:
-            # symlink exists, but points to a non-existent target
-            ui.info_3("Replacing broken link")
-            remove_link = True
-    if remove_link:
-        os.unlink(source)
-    return True
+    if not source.is_symlink():
+        return True, f"Creating link {source} -> {target}"
+    if source.exists():
+        # symlink exists and points to some target
+        current_target = Path(os.readlink(str(source)))
+        if current_target.resolve() == target.resolve():
+            return False, "Leaving existing link"
+        message = "Replacing existing link"
+    else:
+        # symlink exists, but points to a non-existent target
+        message = "Replacing broken link"
+    os.unlink(source)
+    return True, message
 
 
 def make_relative(in_path: Path) -> Path:
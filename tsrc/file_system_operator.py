@@ -1,11 +1,12 @@
+import os
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 
 import cli_ui as ui
 
 from tsrc.errors import Error
 from tsrc.executor import Outcome, Task
-from tsrc.file_system import FileSystemOperation
+from tsrc.file_system import CopyMode, FileSystemOperation
 from tsrc.repo import Repo
 
 
@@ -15,9 +16,16 @@ class FileSystemOperator(Task[FileSystemOperation]):
 
     """
 
-    def __init__(self, workspace_path: Path, repos: List[Repo]) -> None:
+    def __init__(
+        self,
+        workspace_path: Path,
+        repos: List[Repo],
+        *,
+        copy_mode: CopyMode = CopyMode.COPY,
+    ) -> None:
         self.workspace_path = workspace_path
         self.repos = repos
+        self.copy_mode = copy_mode
 
     def describe_item(self, item: FileSystemOperation) -> str:
         return item.describe(self.workspace_path)
@@ -29,13 +37,71 @@ class FileSystemOperator(Task[FileSystemOperation]):
         return []
 
     def process(self, index: int, count: int, item: FileSystemOperation) -> Outcome:
-        # Note: we don't want to run this Task in parallel, just in case
-        # the order of filesystem operations matters, so we can always
-        # return an empty Outcome
+        # Note: operations which may depend on each other are never run
+        # at the same time, see get_operation_levels()
         description = item.describe(self.workspace_path)
         self.info_count(index, count, description)
         try:
-            item.perform(self.workspace_path)
+            message = item.perform(self.workspace_path, copy_mode=self.copy_mode)
         except OSError as e:
             raise Error(str(e))
+        if message:
+            self.info_3(message)
         return Outcome.empty()
+
+
+def paths_overlap(a: str, b: str) -> bool:
+    """Whether one of the (normalized) paths contains the other"""
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+# (written paths, read paths) of an operation, normalized
+OperationPaths = Tuple[List[str], List[str]]
+
+
+def get_operation_paths(
+    operation: FileSystemOperation, workspace_path: Path
+) -> OperationPaths:
+    written = operation.get_written_paths(workspace_path)
+    read = operation.get_read_paths(workspace_path)
+    return [os.path.normpath(x) for x in written], [os.path.normpath(x) for x in read]
+
+
+def depends_on(paths: OperationPaths, previous_paths: OperationPaths) -> bool:
+    """Whether an operation must wait for a previous one: that is when
+    the previous one writes a path it reads or writes, or reads a path
+    it writes
+    """
+    written, read = paths
+    previous_written, previous_read = previous_paths
+    for path in previous_written:
+        if any(paths_overlap(path, x) for x in written + read):
+            return True
+    for path in written:
+        if any(paths_overlap(path, x) for x in previous_read):
+            return True
+    return False
+
+
+def get_operation_levels(
+    operations: List[FileSystemOperation], workspace_path: Path
+) -> List[List[FileSystemOperation]]:
+    """Split the operations into levels, so that operations of the same
+    level can be performed in parallel, one level after the other.
+
+    An operation is put in the level following the ones of the previous
+    operations (in the order of the manifest) it depends on.
+    """
+    all_paths = [get_operation_paths(x, workspace_path) for x in operations]
+    res: List[List[FileSystemOperation]] = []
+    levels: List[int] = []
+    for i, operation in enumerate(operations):
+        level = 0
+        for j in range(i):
+            if levels[j] >= level and depends_on(all_paths[i], all_paths[j]):
+                level = levels[j] + 1
+        levels.append(level)
+        if level == len(res):
+            res.append([])
+        res[level].append(operation)
+    return res
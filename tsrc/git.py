@@ -1,17 +1,23 @@
 """ git tools """
 
+import asyncio
 import os
 import subprocess
+import tempfile
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import cli_ui as ui
 
 from tsrc.errors import Error
+from tsrc.git_refs import GitRefReader, UnsupportedGitLayout
+from tsrc.tag_index import TagIndex, TagRecord
 
 UP = ui.Symbol("↑", "+").as_string
 DOWN = ui.Symbol("↓", "-").as_string
 
+_READ_CHUNK_SIZE = 64 * 1024
+
 
 class GitError(Error):
     pass
@@ -61,87 +67,45 @@ class GitBareStatus:
     as only very few information is needed for related Use-Case
     """
 
-    def __init__(self, working_path: Path, remote_name: str, remote_url: str) -> None:
+    def __init__(
+        self,
+        working_path: Path,
+        remote_name: str,
+        branch: Optional[str],
+        sha1: Optional[str],
+    ) -> None:
         self.working_path = working_path
         self.remote_name = remote_name
-        self.remote_url = remote_url
-        self.branch: Optional[str] = None
+        self.branch = branch
+        self.sha1 = sha1
         self.ahead = 0
         self.behind = 0
         self.is_upstreamed: bool = False
         self.is_ok: bool = True
 
     def update(self) -> None:
-        self.update_branch()
-        if not self.branch:
+        if not self.branch or not self.sha1:
             return
-        self.update_upstream()
         self.update_remote_status()
 
-    def update_branch(self) -> None:
-        try:
-            self.branch = get_current_branch(self.working_path)
-        except GitError:
-            pass
-
-    def update_upstream(self) -> None:
-        if self.branch:
-
-            # check if upstream is already set
-            rc, is_upstr = run_git_captured(
-                self.working_path,
-                "rev-parse",
-                "--symbolic-full-name",
-                f"{self.branch}@{{u}}",
-                check=False,
-            )
-            if rc == 0:
-                self.is_upstreamed = True
-                return
-
-            # if we are here, than we need to take some measures
-            # so to setting upstream will be possible
-
-            # refresh remotes so setting upstream will be possible later
-            run_git_captured(
-                self.working_path, "remote", "remove", self.remote_name, check=False
-            )
-            run_git_captured(
-                self.working_path,
-                "remote",
-                "add",
-                self.remote_name,
-                self.remote_url,
-                check=False,
-            )
-            run_git_captured(
-                self.working_path, "fetch", "--all", "--prune", check=False
-            )
-
-            # only set upstream if it is not set
-            rc, _ = run_git_captured(
-                self.working_path,
-                "branch",
-                self.branch,
-                "--set-upstream-to",
-                f"{self.remote_name}/{self.branch}",
-                check=False,
-            )
-            if rc == 0:
-                self.is_upstreamed = True
-
     def update_remote_status(self) -> None:
-        rc, ahead_rev = run_git_captured(
-            self.working_path, "rev-list", "@{upstream}..HEAD", check=False
-        )
-        if rc == 0:
-            self.ahead = len(ahead_rev.splitlines())
-
-        rc, behind_rev = run_git_captured(
-            self.working_path, "rev-list", "HEAD..@{upstream}", check=False
+        # Note: the bare repo is shared, so the position is computed
+        # from the commit itself rather than from HEAD, see tsrc.bare_cache
+        upstream = f"refs/remotes/{self.remote_name}/{self.branch}"
+        rc, out = run_git_captured(
+            self.working_path,
+            "rev-list",
+            "--left-right",
+            "--count",
+            f"{self.sha1}...{upstream}",
+            check=False,
         )
-        if rc == 0:
-            self.behind = len(behind_rev.splitlines())
+        if rc != 0:
+            return
+        ahead, behind = out.split()
+        self.ahead = int(ahead)
+        self.behind = int(behind)
+        self.is_upstreamed = True
 
     @staticmethod
     def commit_string(number: int) -> str:
@@ -228,25 +192,74 @@ class GitStatus:
     def update(self) -> None:
         # Try and gather as many information about the git repository as
         # possible.
+        # Note: branch, sha1, upstream position and worktree state all
+        # come from a single `git status` call, see update_from_porcelain()
         try:
-            self.update_sha1()
+            self.update_from_porcelain()
         except GitCommandError:
             self.empty = True
             return
-        self.update_branch()
+        if self.empty:
+            return
         self.update_tag()
-        self.update_remote_status()
-        self.update_worktree_status()
 
-    def update_sha1(self) -> None:
-        self.sha1_full = get_sha1(self.working_path, short=False)
-        self.sha1 = self.sha1_full[:7]
+    def update_from_porcelain(self) -> None:
+        """Fill in everything but the tag from the output of
+        `git status --porcelain=v2 --branch -z`, which is parsed
+        while git is still writing it.
+        """
+        records = iter_git_records(
+            self.working_path, "status", "--porcelain=v2", "--branch", "-z"
+        )
+        self.parse_porcelain_v2(records)
+        if self.branch:
+            self.branch = shorten_branch_name(self.working_path, self.branch)
+
+    def parse_porcelain_v2(self, records: Iterable[str]) -> None:
+        # See the "Porcelain Format Version 2" section of git-status(1).
+        # Renamed or copied entries ('2') are followed by an extra record
+        # containing the original path, which we need to skip.
+        skip_next = False
+        for record in records:
+            if skip_next:
+                skip_next = False
+                continue
+            if record.startswith("# "):
+                self._parse_porcelain_v2_header(record[2:])
+                continue
+            kind = record[:1]
+            if kind == "?":
+                self.untracked += 1
+                self.dirty = True
+            elif kind in ("1", "2"):
+                index_state, worktree_state = record[2], record[3]
+                if index_state == "A":
+                    self.added += 1
+                elif index_state != ".":
+                    self.staged += 1
+                if worktree_state != ".":
+                    self.not_staged += 1
+                self.dirty = True
+                skip_next = kind == "2"
+            elif kind == "u":
+                self.not_staged += 1
+                self.dirty = True
 
-    def update_branch(self) -> None:
-        try:
-            self.branch = get_current_branch(self.working_path)
-        except GitError:
-            pass
+    def _parse_porcelain_v2_header(self, header: str) -> None:
+        key, _, value = header.partition(" ")
+        if key == "branch.oid":
+            if value == "(initial)":
+                self.empty = True
+            else:
+                self.sha1_full = value
+                self.sha1 = value[:7]
+        elif key == "branch.head":
+            if value != "(detached)":
+                self.branch = value
+        elif key == "branch.ab":
+            ahead, behind = value.split()
+            self.ahead = int(ahead)
+            self.behind = -int(behind)
 
     def update_tag(self) -> None:
         try:
@@ -254,36 +267,6 @@ class GitStatus:
         except GitError:
             pass
 
-    def update_remote_status(self) -> None:
-        rc, ahead_rev = run_git_captured(
-            self.working_path, "rev-list", "@{upstream}..HEAD", check=False
-        )
-        if rc == 0:
-            self.ahead = len(ahead_rev.splitlines())
-
-        rc, behind_rev = run_git_captured(
-            self.working_path, "rev-list", "HEAD..@{upstream}", check=False
-        )
-        if rc == 0:
-            self.behind = len(behind_rev.splitlines())
-
-    def update_worktree_status(self) -> None:
-        _, out = run_git_captured(self.working_path, "status", "--porcelain")
-
-        for line in out.splitlines():
-            if line.startswith("??"):
-                self.untracked += 1
-                self.dirty = True
-            if line.startswith(" M"):
-                self.staged += 1
-                self.dirty = True
-            if line.startswith(" .M"):
-                self.not_staged += 1
-                self.dirty = True
-            if line.startswith("A "):
-                self.added += 1
-                self.dirty = True
-
     def describe(self) -> List[ui.Token]:
         """Return a list of tokens suitable for ui.info."""
         res: List[ui.Token] = []
@@ -360,6 +343,35 @@ class GitStatus:
         return res
 
 
+# Configuration preventing a git command from running `git gc --auto` or
+# `git maintenance run --auto`. Used by the commands fetching or merging
+# while syncing and cloning (see the `no_auto_gc` parameter of run_git()
+# and friends), so that processing many repos at once does not start as
+# many garbage collections - see tsrc.maintenance.
+NO_AUTO_GC = {"gc.auto": "0", "maintenance.auto": "false"}
+
+
+def get_git_env(*, no_auto_gc: bool = False) -> Optional[Dict[str, str]]:
+    """Return the environment to run a git command with, or None to
+    inherit the one of the current process.
+
+    The configuration is passed with GIT_CONFIG_COUNT and friends rather
+    than with `-c` options, so that it does not clutter the commands shown
+    to the user, and so that git passes it on to the git commands it runs
+    itself (for submodules for instance).
+    """
+    if not no_auto_gc:
+        return None
+    env = dict(os.environ)
+    count = int(env.get("GIT_CONFIG_COUNT") or 0)
+    for key, value in NO_AUTO_GC.items():
+        env[f"GIT_CONFIG_KEY_{count}"] = key
+        env[f"GIT_CONFIG_VALUE_{count}"] = value
+        count += 1
+    env["GIT_CONFIG_COUNT"] = str(count)
+    return env
+
+
 def get_git_cmd(*args: str) -> List[str]:
     git_cmd = ["git"]
     testing = os.environ.get("TSRC_TESTING")
@@ -378,21 +390,29 @@ def run_git(
     check: bool = True,
     show_output: bool = True,
     show_cmd: bool = True,
+    no_auto_gc: bool = False,
 ) -> None:
     """Run git `cmd` in given `working_path`.
 
     Raise GitCommandError if return code is non-zero and `check` is True.
+
+    If `no_auto_gc` is True, the command does not run any automatic garbage
+    collection (see NO_AUTO_GC).
     """
     git_cmd = get_git_cmd(*cmd)
+    env = get_git_env(no_auto_gc=no_auto_gc)
 
     if show_cmd:
         ui.info(ui.blue, "$", ui.reset, *git_cmd)
     if show_output:
-        process = subprocess.run(git_cmd, cwd=working_path, universal_newlines=True)
+        process = subprocess.run(
+            git_cmd, cwd=working_path, env=env, universal_newlines=True
+        )
     else:
         process = subprocess.run(
             git_cmd,
             cwd=working_path,
+            env=env,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -402,7 +422,7 @@ def run_git(
 
 
 def run_git_captured(
-    working_path: Path, *cmd: str, check: bool = True
+    working_path: Path, *cmd: str, check: bool = True, no_auto_gc: bool = False
 ) -> Tuple[int, str]:
     """Run git `cmd` in given `working_path`, capturing the output.
 
@@ -417,6 +437,7 @@ def run_git_captured(
     options["stdout"] = subprocess.PIPE
     options["stderr"] = subprocess.PIPE
     options["text"] = True
+    options["env"] = get_git_env(no_auto_gc=no_auto_gc)
 
     ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
     process = subprocess.Popen(git_cmd, cwd=working_path, **options)
@@ -430,7 +451,119 @@ def run_git_captured(
     return returncode, out
 
 
+async def run_git_async(
+    working_path: Path, *cmd: str, check: bool = True, no_auto_gc: bool = False
+) -> None:
+    """Same as run_git(), but using an asyncio subprocess, so that it
+    can be awaited from an event loop.
+
+    The output is always captured, and only shown in the error message.
+    """
+    returncode, out, _ = await _communicate_async(
+        working_path, *cmd, merge_stderr=True, no_auto_gc=no_auto_gc
+    )
+    if returncode != 0 and check:
+        raise GitCommandError(working_path, cmd, output=out)
+
+
+async def run_git_captured_async(
+    working_path: Path, *cmd: str, check: bool = True, no_auto_gc: bool = False
+) -> Tuple[int, str]:
+    """Same as run_git_captured(), but using an asyncio subprocess, so that
+    it can be awaited from an event loop.
+    """
+    assert_working_path(working_path)
+    ui.debug(ui.lightgray, working_path, "$", ui.reset, *get_git_cmd(*cmd))
+    returncode, out, err = await _communicate_async(
+        working_path, *cmd, no_auto_gc=no_auto_gc
+    )
+    if out.endswith("\n"):
+        out = out.strip("\n")
+    ui.debug(ui.lightgray, "[", returncode, "]", ui.reset, out)
+    if check and returncode != 0:
+        raise GitCommandError(working_path, cmd, output=out, error=err)
+    return returncode, out
+
+
+async def _communicate_async(
+    working_path: Path,
+    *cmd: str,
+    merge_stderr: bool = False,
+    no_auto_gc: bool = False,
+) -> Tuple[int, str, str]:
+    """Return the return code, stdout and stderr of the git command
+    (stderr is empty when `merge_stderr` is True)
+    """
+    process = await asyncio.create_subprocess_exec(
+        *get_git_cmd(*cmd),
+        cwd=working_path,
+        env=get_git_env(no_auto_gc=no_auto_gc),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT if merge_stderr else asyncio.subprocess.PIPE,
+    )
+    out, err = await process.communicate()
+    returncode = process.returncode
+    assert returncode is not None
+    return (
+        returncode,
+        out.decode(errors="replace"),
+        err.decode(errors="replace") if err else "",
+    )
+
+
+def iter_git_records(
+    working_path: Path, *cmd: str, check: bool = True, separator: bytes = b"\0"
+) -> Iterator[str]:
+    """Run git `cmd` in given `working_path`, yielding each record of its
+    output as soon as it is read, instead of waiting for the process to exit.
+
+    Records are separated by `separator` (NUL by default, which is what
+    git commands use with the `-z` option).
+
+    Raise GitCommandError once the output is consumed if return code
+    is non-zero and check is True.
+    """
+    assert_working_path(working_path)
+    git_cmd = get_git_cmd(*cmd)
+    ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
+
+    # Note: stderr goes to a temporary file rather than a pipe, so that
+    # git can never block on it while we are busy reading stdout
+    with tempfile.TemporaryFile() as err_file:
+        process = subprocess.Popen(
+            git_cmd, cwd=working_path, stdout=subprocess.PIPE, stderr=err_file
+        )
+        assert process.stdout
+        try:
+            pending = b""
+            while True:
+                chunk = os.read(process.stdout.fileno(), _READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                *complete, pending = (pending + chunk).split(separator)
+                for record in complete:
+                    yield record.decode(errors="surrogateescape")
+            if pending:
+                yield pending.decode(errors="surrogateescape")
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        ui.debug(ui.lightgray, "[", returncode, "]", ui.reset)
+        if check and returncode != 0:
+            err_file.seek(0)
+            error = err_file.read().decode(errors="replace")
+            raise GitCommandError(working_path, cmd, error=error)
+
+
 def get_sha1(working_path: Path, short: bool = False, ref: str = "HEAD") -> str:
+    if ref == "HEAD" and not short:
+        # Note: when HEAD cannot be resolved, let git produce the error
+        try:
+            _, sha1 = GitRefReader(working_path).get_head()
+            if sha1:
+                return sha1
+        except UnsupportedGitLayout:
+            pass
     cmd = ["rev-parse"]
     if short:
         cmd.append("--short")
@@ -440,6 +573,15 @@ def get_sha1(working_path: Path, short: bool = False, ref: str = "HEAD") -> str:
 
 
 def get_current_branch(working_path: Path) -> str:
+    try:
+        reader = GitRefReader(working_path)
+        head_ref, sha1 = reader.get_head()
+        if not head_ref:
+            raise GitError("Not an any branch")
+        if sha1:
+            return reader.shorten_ref(head_ref)
+    except UnsupportedGitLayout:
+        pass
     cmd = ("rev-parse", "--abbrev-ref", "HEAD")
     _, output = run_git_captured(working_path, *cmd)
     if output == "HEAD":
@@ -448,11 +590,50 @@ def get_current_branch(working_path: Path) -> str:
 
 
 def get_current_tag(working_path: Path) -> str:
+    # Note: same output as `git tag --points-at HEAD`, but looked up in
+    # the tag index, which is only rebuilt when tags change
+    try:
+        reader = GitRefReader(working_path)
+        _, sha1 = reader.get_head()
+        if sha1:
+            index = TagIndex.for_repo(
+                reader, list_tags=lambda: list_tags_with_git(working_path)
+            )
+            return "\n".join(index.get_tags(sha1))
+    except UnsupportedGitLayout:
+        pass
     cmd = ("tag", "--points-at", "HEAD")
     _, output = run_git_captured(working_path, *cmd)
     return output
 
 
+def list_tags_with_git(working_path: Path) -> List[TagRecord]:
+    """Return (sha1, ref name, peeled sha1) for each tag of the repository"""
+    # fmt: off
+    _, output = run_git_captured(
+        working_path,
+        "for-each-ref", "--format=%(objectname) %(*objectname) %(refname)",
+        "refs/tags",
+    )
+    # fmt: on
+    res: List[TagRecord] = []
+    for line in output.splitlines():
+        sha1, peeled, ref_name = line.split(" ", 2)
+        res.append((sha1, ref_name, peeled or None))
+    return res
+
+
+def shorten_branch_name(working_path: Path, branch: str) -> str:
+    """Return `branch` as spelled by `git rev-parse --abbrev-ref`,
+    that is `heads/<branch>` if it is also the short name of another ref
+    (a tag with the same name, for instance).
+    """
+    try:
+        return GitRefReader(working_path).shorten_ref(f"refs/heads/{branch}")
+    except UnsupportedGitLayout:
+        return get_current_branch(working_path)
+
+
 def get_repo_root(working_path: Optional[Path] = None) -> Path:
     if not working_path:
         working_path = Path(os.getcwd())
@@ -486,9 +667,9 @@ def get_git_status(working_path: Path) -> GitStatus:
 
 
 def get_git_bare_status(
-    working_path: Path, remote_name: str, remote_url: str
+    working_path: Path, remote_name: str, branch: Optional[str], sha1: Optional[str]
 ) -> GitBareStatus:
-    bare_status = GitBareStatus(working_path, remote_name, remote_url)
+    bare_status = GitBareStatus(working_path, remote_name, branch, sha1)
     bare_status.update()
     return bare_status
 
@@ -496,6 +677,11 @@ def get_git_bare_status(
 def is_git_repository(working_path: Path) -> bool:
     if not working_path.is_dir():
         return False
+    try:
+        GitRefReader(working_path).get_head()
+        return True
+    except UnsupportedGitLayout:
+        pass
     rc, _ = run_git_captured(working_path, "rev-parse", "--git-dir", check=False)
     return rc == 0
 
@@ -519,3 +705,66 @@ def is_shallow(working_path: Path) -> bool:
     root = get_repo_root(working_path)
     res = (root / ".git/shallow").exists()
     return res
+
+
+def has_commit(working_path: Path, sha1: str) -> bool:
+    """Return True if the commit is present in the local object store."""
+    rc, _ = run_git_captured(
+        working_path, "cat-file", "-e", f"{sha1}^{{commit}}", check=False
+    )
+    return rc == 0
+
+
+def is_full_sha1(ref: str) -> bool:
+    return len(ref) in (40, 64) and all(c in "0123456789abcdef" for c in ref)
+
+
+def fetch_shallow_commit(
+    working_path: Path, remote_name: str, sha1: str, *, branch: str
+) -> None:
+    """Make sure the commit is present in a shallow repo, while fetching
+    as little history as possible.
+
+    First try to fetch the commit alone. This needs protocol v2, or
+    `uploadpack.allowReachableSHA1InWant` on the server, and a full sha1.
+    Otherwise, deepen the history of the branch until the commit is found.
+    """
+    if has_commit(working_path, sha1):
+        return
+    if is_full_sha1(sha1):
+        rc, _ = run_git_captured(
+            working_path,
+            "fetch",
+            "--depth",
+            "1",
+            remote_name,
+            sha1,
+            check=False,
+            no_auto_gc=True,
+        )
+        if rc == 0 and has_commit(working_path, sha1):
+            return
+    refspec = f"+refs/heads/{branch}:refs/remotes/{remote_name}/{branch}"
+    if not has_commit(working_path, f"refs/remotes/{remote_name}/{branch}"):
+        run_git_captured(
+            working_path,
+            "fetch",
+            "--depth",
+            "1",
+            remote_name,
+            refspec,
+            no_auto_gc=True,
+        )
+    depth = 1
+    while not has_commit(working_path, sha1):
+        if not is_shallow(working_path):
+            raise Error(f"{sha1} not found in {remote_name}/{branch}")
+        run_git_captured(
+            working_path,
+            "fetch",
+            f"--deepen={depth}",
+            remote_name,
+            refspec,
+            no_auto_gc=True,
+        )
+        depth *= 2
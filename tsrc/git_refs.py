@@ -0,0 +1,393 @@
+"""
+Git Refs
+
+Read-only access to the references and configuration of
+a local git repository, without spawning any git process.
+
+This covers what most tsrc commands need to know about
+a repository: "which branch is checked out, and what sha1
+does it point to?", as well as a few configuration values
+like remotes and upstreams.
+
+Only the usual on-disk layout is supported:
+
+* `.git` directory, or `.git` file containing a `gitdir:` line
+  (used by worktrees and submodules)
+* loose refs and `packed-refs`
+* plain `config` files
+
+Whenever something else is found (reftable, config includes,
+per-worktree config, URL rewriting, ...), UnsupportedGitLayout
+is raised, and callers are expected to fall back to running git.
+"""
+
+import mmap
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tsrc.errors import Error
+
+_SHA1_RE = re.compile(rb"^[0-9a-f]{40}([0-9a-f]{24})?$")
+
+# Refs that belong to a worktree rather than to the whole repository,
+# see gitrepository-layout(5)
+_PER_WORKTREE_PREFIXES = ("refs/bisect/", "refs/worktree/", "refs/rewritten/")
+
+# Same rules as the ones used by `git rev-parse` to expand a short
+# ref name, see gitrevisions(7)
+_ABBREV_RULES = (
+    "{}",
+    "refs/{}",
+    "refs/tags/{}",
+    "refs/heads/{}",
+    "refs/remotes/{}",
+    "refs/remotes/{}/HEAD",
+)
+
+_MAX_SYMREF_DEPTH = 5
+
+
+class UnsupportedGitLayout(Error):
+    pass
+
+
+class GitConfig:
+    """Parsed contents of a git `config` file.
+
+    Section and key names are case-insensitive, subsection names
+    are not, just like with `git config`.
+    """
+
+    def __init__(self) -> None:
+        # (section, subsection) -> key -> values, in file order
+        self.sections: Dict[Tuple[str, str], Dict[str, List[str]]] = {}
+
+    @classmethod
+    def from_text(cls, text: str) -> "GitConfig":
+        res = cls()
+        current: Optional[Dict[str, List[str]]] = None
+        lines = iter(text.splitlines())
+        for line in lines:
+            # Handle continuation lines
+            while line.endswith("\\") and not line.endswith("\\\\"):
+                line = line[:-1] + next(lines, "")
+            stripped = line.strip()
+            if not stripped or stripped[0] in "#;":
+                continue
+            if stripped.startswith("["):
+                key, rest = _parse_section_header(stripped)
+                current = res.sections.setdefault(key, {})
+                stripped = rest.strip()
+                if not stripped or stripped[0] in "#;":
+                    continue
+            if current is None:
+                raise UnsupportedGitLayout(f"unexpected config line: {line}")
+            name, value = _parse_config_entry(stripped)
+            current.setdefault(name, []).append(value)
+        return res
+
+    def get(self, section: str, subsection: str, key: str) -> Optional[str]:
+        values = self.get_all(section, subsection, key)
+        if values:
+            return values[-1]
+        return None
+
+    def get_all(self, section: str, subsection: str, key: str) -> List[str]:
+        entries = self.sections.get((section.lower(), subsection), {})
+        return entries.get(key.lower(), [])
+
+    def has_section(self, section: str) -> bool:
+        return any(name == section for (name, _) in self.sections)
+
+    def subsections(self, section: str) -> List[str]:
+        return [sub for (name, sub) in self.sections if name == section and sub]
+
+
+def _parse_section_header(line: str) -> Tuple[Tuple[str, str], str]:
+    match = re.match(r'^\[\s*([-.\w]+)\s*(?:"((?:[^"\\]|\\.)*)")?\s*\](.*)$', line)
+    if not match:
+        raise UnsupportedGitLayout(f"cannot parse config section: {line}")
+    name, subsection, rest = match.groups()
+    if subsection is not None:
+        subsection = re.sub(r"\\(.)", r"\1", subsection)
+    elif "." in name:
+        # Deprecated `[section.subsection]` syntax
+        name, subsection = name.split(".", 1)
+    return (name.lower(), subsection or ""), rest
+
+
+def _parse_config_entry(line: str) -> Tuple[str, str]:
+    name, equal, raw_value = line.partition("=")
+    name = name.strip().lower()
+    if not re.match(r"^[a-z][-a-z0-9]*$", name):
+        raise UnsupportedGitLayout(f"cannot parse config entry: {line}")
+    if not equal:
+        # A key without value means 'true'
+        return name, "true"
+    value = ""
+    in_quotes = False
+    chars = iter(raw_value.strip())
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            value += {"n": "\n", "t": "\t", "b": "\b"}.get(escaped, escaped)
+        elif char == '"':
+            in_quotes = not in_quotes
+        elif char in "#;" and not in_quotes:
+            break
+        else:
+            value += char
+    if not in_quotes:
+        value = value.rstrip()
+    return name, value
+
+
+class GitRefReader:
+    """Read refs and config from the git repository in `working_path`.
+
+    Usage:
+
+    >>> reader = GitRefReader(repo_path)
+    >>> reader.get_head()
+    ("refs/heads/main", "e7b3...")
+
+    Raise UnsupportedGitLayout when the repository cannot be read
+    without git's help.
+    """
+
+    def __init__(self, working_path: Path) -> None:
+        self.working_path = working_path
+        self.git_dir = find_git_dir(working_path)
+        self.common_dir = self.git_dir
+        commondir_file = self.git_dir / "commondir"
+        if commondir_file.is_file():
+            self.common_dir = self.git_dir / commondir_file.read_text().strip()
+        if (self.common_dir / "reftable").exists():
+            raise UnsupportedGitLayout("reftable is not supported")
+        self._config: Optional[GitConfig] = None
+
+    @property
+    def config(self) -> GitConfig:
+        if self._config is None:
+            self._config = self._read_config()
+        return self._config
+
+    def _read_config(self) -> GitConfig:
+        config_path = self.common_dir / "config"
+        try:
+            text = config_path.read_text()
+        except FileNotFoundError:
+            return GitConfig()
+        except (OSError, UnicodeDecodeError) as e:
+            raise UnsupportedGitLayout(f"cannot read {config_path}: {e}")
+        res = GitConfig.from_text(text)
+        if res.has_section("include") or res.has_section("includeif"):
+            raise UnsupportedGitLayout("config includes are not supported")
+        refstorage = res.get("extensions", "", "refStorage")
+        if refstorage and refstorage != "files":
+            raise UnsupportedGitLayout(f"{refstorage} ref storage is not supported")
+        if res.get("extensions", "", "worktreeConfig") == "true":
+            raise UnsupportedGitLayout("per-worktree config is not supported")
+        return res
+
+    def get_head(self) -> Tuple[Optional[str], Optional[str]]:
+        """Return the ref HEAD points to (None when detached),
+        and the sha1 of HEAD (None on unborn branches)
+        """
+        contents = self._read_loose_ref("HEAD")
+        if contents is None:
+            raise UnsupportedGitLayout(f"no HEAD found in {self.git_dir}")
+        if contents.startswith(b"ref:"):
+            ref = contents[4:].strip().decode()
+            return ref, self.resolve_ref(ref)
+        return None, self._check_sha1(contents, "HEAD")
+
+    def resolve_ref(self, ref: str, depth: int = 0) -> Optional[str]:
+        """Return the sha1 a full ref name like `refs/heads/main` points to,
+        following symbolic refs, or None if the ref does not exist.
+        """
+        if depth > _MAX_SYMREF_DEPTH:
+            raise UnsupportedGitLayout(f"too many levels of symbolic refs: {ref}")
+        contents = self._read_loose_ref(ref)
+        if contents is None:
+            return self.find_packed_ref(ref)
+        if contents.startswith(b"ref:"):
+            target = contents[4:].strip().decode()
+            return self.resolve_ref(target, depth=depth + 1)
+        return self._check_sha1(contents, ref)
+
+    def ref_exists(self, ref: str) -> bool:
+        return self.resolve_ref(ref) is not None
+
+    def shorten_ref(self, ref: str) -> str:
+        """Shorten a full ref name, the way `git rev-parse --abbrev-ref` does,
+        so that `refs/heads/main` becomes `main`, or `heads/main` if there is
+        also a tag called `main`.
+        """
+        for rule_index in range(len(_ABBREV_RULES) - 1, 0, -1):
+            prefix, _, suffix = _ABBREV_RULES[rule_index].partition("{}")
+            if not (ref.startswith(prefix) and ref.endswith(suffix)):
+                continue
+            short_name = ref[len(prefix) : len(ref) - len(suffix)]
+            if not short_name:
+                continue
+            ambiguous = False
+            for other_index, other_rule in enumerate(_ABBREV_RULES):
+                if other_index == rule_index:
+                    continue
+                candidate = other_rule.format(short_name)
+                if other_index == 0 and not re.match(r"^[A-Z_]+$", candidate):
+                    # Only pseudo-refs like FETCH_HEAD live at the top
+                    continue
+                if self.ref_exists(candidate):
+                    ambiguous = True
+                    break
+            if not ambiguous:
+                return short_name
+        return ref[len("refs/") :] if ref.startswith("refs/") else ref
+
+    def find_packed_ref(self, ref: str) -> Optional[str]:
+        """Look for `ref` in the packed-refs file.
+
+        When the file is sorted (which is always the case when
+        it was written by a recent git), use a binary search
+        on the memory-mapped file instead of reading all of it.
+        """
+        target = ref.encode()
+        with _PackedRefs(self.common_dir / "packed-refs") as packed_refs:
+            if packed_refs.sorted:
+                return packed_refs.bisect(target)
+            for sha1, name, _ in packed_refs:
+                if name == target:
+                    return sha1
+        return None
+
+    def has_packed_refs(self) -> bool:
+        with _PackedRefs(self.common_dir / "packed-refs") as packed_refs:
+            return packed_refs.data is not None
+
+    def get_packed_refs_traits(self) -> List[str]:
+        """Return the traits listed in the header of the packed-refs file,
+        like 'peeled' or 'sorted'
+        """
+        with _PackedRefs(self.common_dir / "packed-refs") as packed_refs:
+            return packed_refs.traits
+
+    def iter_packed_refs(self) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Yield (sha1, ref name, peeled sha1) for each packed ref"""
+        with _PackedRefs(self.common_dir / "packed-refs") as packed_refs:
+            for sha1, name, peeled in packed_refs:
+                yield sha1, name.decode(errors="surrogateescape"), peeled
+
+    def _read_loose_ref(self, ref: str) -> Optional[bytes]:
+        base = self.common_dir
+        if not ref.startswith("refs/") or ref.startswith(_PER_WORKTREE_PREFIXES):
+            base = self.git_dir
+        try:
+            return (base / ref).read_bytes().strip()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+
+    @staticmethod
+    def _check_sha1(contents: bytes, ref: str) -> str:
+        if not _SHA1_RE.match(contents):
+            raise UnsupportedGitLayout(f"cannot parse ref {ref}: {contents!r}")
+        return contents.decode()
+
+
+class _PackedRefs:
+    """Memory-mapped contents of a `packed-refs` file"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.data: Optional[mmap.mmap] = None
+        self.start = 0
+        self.traits: List[str] = []
+        self.sorted = False
+
+    def __enter__(self) -> "_PackedRefs":
+        try:
+            with self.path.open("rb") as f:
+                if self.path.stat().st_size:
+                    self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return self
+        if self.data and self.data[:1] == b"#":
+            header_end = self.data.find(b"\n") + 1
+            self.traits = self.data[:header_end].decode(errors="replace").split()
+            self.sorted = "sorted" in self.traits
+            self.start = header_end
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        if self.data:
+            self.data.close()
+
+    def __iter__(self) -> Iterator[Tuple[str, bytes, Optional[str]]]:
+        if not self.data:
+            return
+        offset = self.start
+        while offset < len(self.data):
+            record = self._read_record(offset)
+            yield record[:3]
+            offset = record[3]
+
+    def bisect(self, target: bytes) -> Optional[str]:
+        if not self.data:
+            return None
+        low, high = self.start, len(self.data)
+        while low < high:
+            # Find the start of the record containing the middle offset
+            middle = (low + high) // 2
+            line_start = self.data.rfind(b"\n", low, middle) + 1
+            line_start = max(line_start, low)
+            if self.data[line_start : line_start + 1] == b"^":
+                line_start = max(self.data.rfind(b"\n", low, line_start - 1) + 1, low)
+            sha1, name, _, next_record = self._read_record(line_start)
+            if name == target:
+                return sha1
+            if name < target:
+                low = next_record
+            else:
+                high = line_start
+        return None
+
+    def _read_record(self, offset: int) -> Tuple[str, bytes, Optional[str], int]:
+        # Return sha1, ref name, peeled sha1, offset of the next record
+        assert self.data
+        line_end = self._line_end(offset)
+        line = self.data[offset:line_end]
+        sha1, _, name = line.partition(b" ")
+        if not _SHA1_RE.match(sha1) or not name:
+            raise UnsupportedGitLayout(f"cannot parse {self.path}: {line!r}")
+        next_record = line_end + 1
+        peeled = None
+        if self.data[next_record : next_record + 1] == b"^":
+            peeled_end = self._line_end(next_record)
+            peeled = self.data[next_record + 1 : peeled_end].strip().decode()
+            next_record = peeled_end + 1
+        return sha1.decode(), name.rstrip(b"\r"), peeled, next_record
+
+    def _line_end(self, offset: int) -> int:
+        assert self.data
+        res = self.data.find(b"\n", offset)
+        if res == -1:
+            return len(self.data)
+        return res
+
+
+def find_git_dir(working_path: Path) -> Path:
+    """Return the git directory for the repository whose top-level
+    is `working_path`, following `gitdir:` files if needed.
+    """
+    dot_git = working_path / ".git"
+    if dot_git.is_dir():
+        return dot_git
+    if dot_git.is_file():
+        contents = dot_git.read_text().strip()
+        if contents.startswith("gitdir:"):
+            git_dir = working_path / contents[len("gitdir:") :].strip()
+            if git_dir.is_dir():
+                return git_dir
+    raise UnsupportedGitLayout(f"no git directory found in {working_path}")
@@ -11,10 +11,11 @@ checks.
 
 from pathlib import Path
 from sys import platform
-from typing import List, Tuple, Union
+from typing import List, Optional, Tuple, Union
 from urllib.parse import quote, urlparse
 
 from tsrc.git import run_git_captured
+from tsrc.git_refs import GitRefReader, UnsupportedGitLayout
 from tsrc.repo import Remote
 
 
@@ -34,6 +35,11 @@ class GitRemote:
         # obtain information about configured 'remotes'
         # in 'GitStatus' obtaining such information
         # is not useful as remotes are stored in Manifest
+        try:
+            self.remotes = read_remotes(GitRefReader(self.working_path))
+            return
+        except UnsupportedGitLayout:
+            pass
         _, out = run_git_captured(self.working_path, "remote")
         for line in out.splitlines():
             _, url = run_git_captured(self.working_path, "remote", "get-url", line)
@@ -51,6 +57,14 @@ class GitRemote:
             # skip check if upstreamed when there is no branch
             return
 
+        try:
+            config = GitRefReader(self.working_path).config
+            if config.get("branch", use_branch, "remote"):
+                self.upstreamed = True
+            return
+        except UnsupportedGitLayout:
+            pass
+
         rc, _ = run_git_captured(
             self.working_path,
             "config",
@@ -62,6 +76,29 @@ class GitRemote:
             self.upstreamed = True
 
 
+def read_remotes(reader: GitRefReader) -> List[Remote]:
+    """Same as `git remote` followed by `git remote get-url`,
+    but reading the repository config directly
+    """
+    config = reader.config
+    if config.has_section("url"):
+        # URLs may be rewritten with `insteadOf`, leave that to git
+        raise UnsupportedGitLayout("url rewriting is not supported")
+    for legacy_dir in ("remotes", "branches"):
+        legacy_path = reader.common_dir / legacy_dir
+        if legacy_path.is_dir() and any(legacy_path.iterdir()):
+            raise UnsupportedGitLayout(
+                f"remotes in .git/{legacy_dir} are not supported"
+            )
+    res = []
+    # Note: `git remote` lists remotes sorted by name
+    for name in sorted(config.subsections("remote")):
+        url = config.get("remote", name, "url")
+        if url:
+            res.append(Remote(name=name, url=url))
+    return res
+
+
 def remote_urls_are_same(url_1: str, url_2: str) -> bool:
     """
     return True if provided URLs are the same
@@ -91,6 +128,28 @@ def remote_urls_are_same(url_1: str, url_2: str) -> bool:
             )
 
 
+def get_url_host(url: str) -> Optional[str]:
+    """
+    return the host name of a git URL, like `example.com` for
+    `git@example.com:foo.git` or `https://example.com/foo.git`,
+    or None for local repositories
+    """
+    if "://" in url:
+        up = urlparse(url)
+        if up.scheme == "file":
+            return None
+        return up.hostname
+    if platform.startswith("win") and len(url) > 1 and url[1] == ":":
+        # a drive letter, like C:\foo
+        return None
+    # scp-like syntax: [user@]host:path, as long as there is
+    # no slash before the first colon
+    host, colon, _ = url.partition(":")
+    if colon and "/" not in host:
+        return host.rsplit("@", 1)[-1].lower() or None
+    return None
+
+
 def _norm_path(path: str) -> str:
     ret: str = ""
     if path[0] == "/":
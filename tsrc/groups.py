@@ -2,7 +2,7 @@
 
 # Note that groups are allowed to include other groups.
 
-from typing import Any, Dict, Generic, List, Optional, TypeVar
+from typing import Any, Dict, Generic, List, Optional, Set, Tuple, TypeVar
 
 import cli_ui as ui
 
@@ -61,11 +61,18 @@ class GroupList(Generic[T]):
     def __init__(self, *, elements: List[T]) -> None:
         self.groups: Dict[str, Group[T]] = {}
         self.all_elements = elements
-        self._groups_seen: List[str] = []
+        self._known_elements: Set[T] = set(elements)
+        # Note: used as an ordered set, see get_elements()
+        self._groups_seen: Dict[str, bool] = {}
         self.missing_elements: List[Dict[str, T]] = []
+        # Results of get_elements(), cleared when a group is added:
+        # (groups, ignore_if_group_not_found) -> (elements, groups seen)
+        self._resolved: Dict[
+            Tuple[Tuple[str, ...], bool], Tuple[List[T], Dict[str, bool]]
+        ] = {}
 
     def get_groups_seen(self) -> List[str]:
-        return self._groups_seen
+        return list(self._groups_seen)
 
     def add(
         self,
@@ -77,7 +84,7 @@ class GroupList(Generic[T]):
         can_add: bool = True
         ignored_elements: List[T] = []
         for element in elements:
-            if element not in self.all_elements:
+            if element not in self._known_elements:
                 if ignore_on_mtod:
                     can_add = False
                     if ignore_on_mtod != ManifestsTypeOfData.DEEP_ON_UPDATE:
@@ -92,6 +99,7 @@ class GroupList(Generic[T]):
         if can_add is False:
             elements = list(set(elements).difference(ignored_elements))
         self.groups[name] = Group(name, elements, includes=includes)
+        self._resolved.clear()
 
     def get_group(self, name: str) -> Optional[Group[T]]:
         return self.groups.get(name)
@@ -107,7 +115,15 @@ class GroupList(Generic[T]):
         #
         # This algorithms allows to have groups that include each other
         # without creating infinite loops.
-        self._groups_seen = []
+        #
+        # The result is memoized, since the same groups are usually
+        # resolved several times per command.
+        key = (tuple(groups), ignore_if_group_not_found)
+        resolved = self._resolved.get(key)
+        if resolved is not None:
+            elements, self._groups_seen = resolved
+            return list(elements)
+        self._groups_seen = {}
         # Note: we need to keep the result free of duplicates *and*
         # in the correct order.
         # There's no OrderedSet in the stdlib, so we use a dict instead
@@ -119,7 +135,9 @@ class GroupList(Generic[T]):
             parent_group=None,
             ignore_if_group_not_found=ignore_if_group_not_found,
         )
-        return list(res.keys())
+        elements = list(res.keys())
+        self._resolved[key] = (elements, self._groups_seen)
+        return list(elements)
 
     def _rec_get_elements(
         self,
@@ -137,7 +155,7 @@ class GroupList(Generic[T]):
                     continue
                 raise GroupNotFound(group_name, parent_group=parent_group)
             group = self.groups[group_name]
-            self._groups_seen.append(group.name)
+            self._groups_seen[group.name] = True
             self._rec_get_elements(res, group.includes, parent_group=group)
             for element in group.elements:
                 res[element] = True
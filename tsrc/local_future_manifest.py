@@ -2,29 +2,100 @@
 Local Future Manifest
 
 Obtains information about Future Manifest
-by init or update Manifest repository
-to *local* directory.
+by fetching the configured manifest branch
+into the *local* Manifest repository, without
+checking it out.
 
 Local Future Manifest will be in:
-root_path / ".tsrc" / "future_manifest"
+root_path / ".tsrc" / "manifest", as FUTURE_MANIFEST_REF
+
+and is read with `git show`, so it shares the objects of
+the Manifest used by `tsrc sync`. When it was fetched
+recently enough (see `future_manifest_ttl` in the
+workspace configuration), it is not fetched again.
 
 This way we can see how Workspace will transform
 after the 'sync'.
 """
 
-from typing import Dict, Tuple, Union
+import json
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
 
 import cli_ui as ui
 
-from tsrc.errors import LoadManifestSchemaError
+from tsrc.errors import Error
+from tsrc.git import run_git_captured
 from tsrc.groups_to_find import GroupsToFind
-from tsrc.local_manifest import LocalManifest
 from tsrc.manifest import Manifest
 from tsrc.manifest_common import ManifestGetRepos
 from tsrc.manifest_common_data import ManifestsTypeOfData
 from tsrc.repo import Repo
+from tsrc.utils import atomic_write
 from tsrc.workspace import Workspace
 
+FUTURE_MANIFEST_REF = "refs/tsrc/future_manifest"
+
+
+class FutureManifestState:
+    """Where and when the Future Manifest was last fetched from"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    @classmethod
+    def for_workspace(cls, root_path: Path) -> "FutureManifestState":
+        return cls(root_path / ".tsrc" / "future_manifest.json")
+
+    def get_age(self, url: str, branch: str) -> Optional[float]:
+        """Return how many seconds ago the Future Manifest was fetched
+        from the given URL and branch, if it was
+        """
+        try:
+            data = json.loads(self.path.read_text())
+            if data["url"] != url or data["branch"] != branch:
+                return None
+            return time.time() - float(data["fetched"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, url: str, branch: str) -> None:
+        data = {"url": url, "branch": branch, "fetched": time.time()}
+        atomic_write(self.path, json.dumps(data))
+
+
+def fetch_future_manifest(workspace: Workspace, *, ttl: Optional[float]) -> bool:
+    """Fetch the Future Manifest, unless it was fetched less than
+    `ttl` seconds ago (or at all, when `ttl` is None).
+
+    Return whether it was fetched.
+    """
+    url = workspace.config.manifest_url
+    branch = workspace.config.manifest_branch
+    clone_path = workspace.local_manifest.clone_path
+    state = FutureManifestState.for_workspace(workspace.root_path)
+    age = state.get_age(url, branch)
+    if age is not None and (ttl is None or age < ttl):
+        rc, _ = run_git_captured(
+            clone_path, "rev-parse", "--verify", FUTURE_MANIFEST_REF, check=False
+        )
+        if rc == 0:
+            return False
+    rc, out = run_git_captured(
+        clone_path,
+        "fetch",
+        "--no-tags",
+        "--no-write-fetch-head",
+        url,
+        f"+refs/heads/{branch}:{FUTURE_MANIFEST_REF}",
+        check=False,
+    )
+    if rc != 0:
+        raise Error(f"Could not fetch Future Manifest from {url} ({branch}):\n{out}")
+    state.save(url, branch)
+    return True
+
 
 def get_local_future_manifests_manifest_and_repos(
     workspace: Workspace,
@@ -35,44 +106,25 @@ def get_local_future_manifests_manifest_and_repos(
     Union[Manifest, None], Union[Dict[str, Repo], None], bool, GroupsToFind, bool
 ]:
     # returns: lfm, lfm_repos, must_find_all_groups, gtf, report_skip_fm_update
-    path = workspace.root_path / ".tsrc" / "future_manifest"
-    path_to_m_file = path / "manifest.yml"
-    report_skip_fm_update: bool = False
-
     # as Manifest.yml by itself does not have configuration, we need to check
     # Workspace config to apply some missing options
     clone_all_repos = False
     if workspace.config.clone_all_repos is True:
         clone_all_repos = True
 
-    lfm = LocalManifest(path)
-    if path.is_dir():
-        # if it is already present
-        if use_same_future_manifest is False or not path_to_m_file.is_file():
-            lfm.update(
-                url=workspace.config.manifest_url,
-                branch=workspace.config.manifest_branch,
-                show_output=False,
-                show_cmd=False,
-            )
-        else:
-            report_skip_fm_update = True
-
-    else:
-        # first time use
-        lfm.init(
-            url=workspace.config.manifest_url,
-            branch=workspace.config.manifest_branch,
-            show_output=False,
-            show_cmd=False,
-        )
+    # '--same-fm' means: never fetch again, if fetched already
+    ttl = None if use_same_future_manifest else workspace.config.future_manifest_ttl
+    report_skip_fm_update = not fetch_future_manifest(workspace, ttl=ttl)
 
     # read manifest file and obtain raw data
-    # lfmm = lfm.get_manifest()
+    lfm = workspace.local_manifest
     try:
-        lfmm = lfm.get_manifest_safe_mode(ManifestsTypeOfData.FUTURE)
-    except LoadManifestSchemaError as lmse:
-        ui.warning(lmse)
+        lfmm = lfm.get_manifest_safe_mode_at(
+            FUTURE_MANIFEST_REF, ManifestsTypeOfData.FUTURE
+        )
+    except Error as e:
+        # LoadManifestSchemaError, or no manifest.yml at all
+        ui.warning(e)
         return None, None, must_find_all_groups, gtf, False
 
     mgr = ManifestGetRepos(workspace, lfmm, True, clone_all_repos)
@@ -1,8 +1,18 @@
+import tempfile
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Callable, ClassVar, Dict, Optional
 
-from tsrc.git import get_current_branch, run_git
-from tsrc.manifest import Manifest, load_manifest, load_manifest_safe_mode
+from tsrc.config import Config
+from tsrc.errors import Error
+from tsrc.git import get_current_branch, run_git, run_git_captured
+from tsrc.manifest import (
+    Manifest,
+    load_manifest,
+    load_manifest_safe_mode,
+    parse_manifest,
+)
+from tsrc.manifest_cache import ManifestCache, dump_config, get_digest, load_config
 from tsrc.manifest_common_data import ManifestsTypeOfData
 
 
@@ -23,8 +33,19 @@ class LocalManifest:
 
     """
 
-    def __init__(self, clone_path: Path) -> None:
+    # In-process memo, shared by all instances, so that each command parses
+    # given manifest contents at most once: the marshaled result for
+    # each digest (see tsrc.manifest_cache).
+    # Note: a copy of the result is returned each time, since the
+    # callers are free to modify it.
+    _parsed: ClassVar[Dict[str, bytes]] = {}
+    _memo_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(
+        self, clone_path: Path, *, cache: Optional[ManifestCache] = None
+    ) -> None:
         self.clone_path = clone_path
+        self.cache = cache
 
     def current_branch(self) -> str:
         return get_current_branch(self.clone_path)
@@ -49,10 +70,80 @@ class LocalManifest:
         )
 
     def get_manifest(self) -> Manifest:
-        return load_manifest(self.clone_path / "manifest.yml")
+        return load_manifest(
+            self.clone_path / "manifest.yml", parse=self.parse_manifest
+        )
+
+    def get_manifest_at(self, ref: str) -> Optional[Manifest]:
+        """Return the manifest as it was at the given commit, or None
+        if it cannot be read from there.
+        """
+        try:
+            return self._load_at(
+                ref, lambda x: load_manifest(x, parse=self.parse_manifest)
+            )
+        except Error:
+            return None
 
     def get_manifest_safe_mode(self, mtod: ManifestsTypeOfData) -> Manifest:
-        return load_manifest_safe_mode(self.clone_path / "manifest.yml", mtod)
+        return load_manifest_safe_mode(
+            self.clone_path / "manifest.yml", mtod, parse=self.parse_manifest
+        )
+
+    def get_manifest_safe_mode_at(
+        self, ref: str, mtod: ManifestsTypeOfData
+    ) -> Manifest:
+        """Same as get_manifest_safe_mode(), reading the manifest
+        at the given ref instead of the one in the worktree
+        """
+        return self._load_at(
+            ref,
+            lambda x: load_manifest_safe_mode(x, mtod, parse=self.parse_manifest),
+        )
+
+    def parse_manifest(self, manifest_path: Path, remote_required: bool) -> Config:
+        """Same as tsrc.manifest.parse_manifest(), looking for the result
+        in the in-process memo first, then in the manifest cache, if any
+        """
+        try:
+            contents = manifest_path.read_bytes()
+        except OSError:
+            # let parse_manifest() report the error
+            return parse_manifest(manifest_path, remote_required)
+        digest = get_digest(contents, remote_required)
+        data = self._load_digest(digest)
+        if data is None:
+            parsed = parse_manifest(manifest_path, remote_required)
+            data = dump_config(parsed)
+            if data is None:
+                return parsed
+            if self.cache:
+                self.cache.save(digest, data)
+        with self._memo_lock:
+            self._parsed[digest] = data
+        res = load_config(data)
+        assert res is not None
+        return res
+
+    def _load_digest(self, digest: str) -> Optional[bytes]:
+        with self._memo_lock:
+            data = self._parsed.get(digest)
+        if data is None and self.cache:
+            data = self.cache.load(digest)
+            if data is not None and load_config(data) is None:
+                data = None
+        return data
+
+    def _load_at(self, ref: str, load: Callable[[Path], Manifest]) -> Manifest:
+        rc, contents = run_git_captured(
+            self.clone_path, "show", f"{ref}:manifest.yml", check=False
+        )
+        if rc != 0:
+            raise Error(f"Could not read manifest.yml at {ref}")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = Path(tmp_dir) / "manifest.yml"
+            manifest_path.write_text(contents + "\n")
+            return load(manifest_path)
 
     def update(
         self, url: str, *, branch: str, show_output: bool = True, show_cmd: bool = True
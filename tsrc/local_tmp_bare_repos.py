@@ -16,17 +16,17 @@ This is only usefull when these 3 conditions are met:
 ## What it does:
 
 Bare Git repository should be created
-to some temporary location (under '.tsrc')
-or updated to required commit SHA1.
+in the shared bare cache (under '.tsrc', see tsrc.bare_cache)
+or updated so it contains the required commit SHA1.
 
-current SHA1 is then checked with remote to
+such SHA1 is then checked with remote branch to
 count possition ahead/behind.
 """
 
-import hashlib
 from pathlib import Path
 from typing import List, Optional
 
+from tsrc.bare_cache import BareCache
 from tsrc.cloner import BareCloner
 
 # import cli_ui as ui
@@ -38,9 +38,12 @@ from tsrc.manifest_common import ManifestGetRepos
 from tsrc.manifest_common_data import ManifestsTypeOfData
 from tsrc.pcs_repo import PCSRepo
 from tsrc.repo import Repo
+from tsrc.tmp_caches import get_tmp_caches
 from tsrc.utils import erase_last_line
 from tsrc.workspace import Workspace
 
+BARE_DEST_PREFIX = "bare:"
+
 
 def prepare_tmp_bare_dm_repos(
     workspace: Workspace,
@@ -54,7 +57,7 @@ def prepare_tmp_bare_dm_repos(
 
     # get Repos from Deep Manifest (considering Groups)
     dm_path = workspace.root_path / dm.dest
-    ldm = LocalManifest(dm_path)
+    ldm = LocalManifest(dm_path, cache=workspace.local_manifest.cache)
     try:
         ldmm = ldm.get_manifest_safe_mode(ManifestsTypeOfData.DEEP)
     # except LoadManifestSchemaError as lmse:
@@ -78,40 +81,34 @@ def process_bare_repos(
 ) -> List[Repo]:
 
     # TODO: possibly add 'config' -> 'remote_name=self.config.singular_remote'
-    bare_cloner = BareCloner(workspace.root_path)
+    bare_cloner = BareCloner(workspace.root_path, ttl=workspace.config.bare_cache_ttl)
 
     process_items(c_repos, bare_cloner, num_jobs=num_jobs)
     erase_last_line()
+    get_tmp_caches(workspace).record_use(get_bare_cache_paths(workspace, c_repos))
 
     return c_repos
 
 
+def get_bare_cache_paths(workspace: Workspace, c_repos: List[Repo]) -> List[Path]:
+    bare_cache = BareCache.for_workspace(workspace.root_path)
+    return sorted({bare_cache.get_repo_path(x.clone_url) for x in c_repos})
+
+
 def ready_tmp_bare_repos(
     workspace: Workspace, mtod: ManifestsTypeOfData, repos: List[Repo]
 ) -> List[Repo]:
 
-    # create parent directory if it does not exists
-    if repos:
-        mtod_path: str
-        if mtod == ManifestsTypeOfData.DEEP:
-            mtod_path = ".tmp_dm_repos"
-        elif mtod == ManifestsTypeOfData.FUTURE:
-            mtod_path = ".tmp_fm_repos"
-        else:
-            return []  # do not continue
-
-        tmp_dir = workspace.root_path / ".tsrc" / mtod_path
-        if not tmp_dir.is_dir():
-            tmp_dir.mkdir(parents=True, exist_ok=True)
-
-    # create Repo's directory if it does not exists when there is SHA1
-    c_repos: List[Repo] = []  # consider repos (to get the possition)
+    if mtod not in [ManifestsTypeOfData.DEEP, ManifestsTypeOfData.FUTURE]:
+        return []  # do not continue
+
+    # consider repos (to get the possition) when there is SHA1
+    c_repos: List[Repo] = []
     for repo in repos:
         if repo.sha1 and repo.remotes:
-            h = hashlib.sha1(repo.clone_url.encode())
-            # create dirname with hash of URL
-            this_dir = h.hexdigest()[:13] + "_" + repo.dest
-            repo_dir = tmp_dir / this_dir
+            # the bare Repo itself is shared (see tsrc.bare_cache),
+            # so 'dest' only has to identify this use of it
+            this_dest = f"{BARE_DEST_PREFIX}{mtod.name.lower()}:{repo.dest}"
 
             # check if there is Repo in Workspace
             possible_w_path = workspace.root_path / repo.dest
@@ -123,7 +120,7 @@ def ready_tmp_bare_repos(
             # add Repo that can be processed by 'process_items'
             c_repos.append(
                 Repo(
-                    dest=str(repo_dir),
+                    dest=this_dest,
                     remotes=repo.remotes,
                     branch=repo.branch,
                     keep_branch=repo.keep_branch,
@@ -0,0 +1,133 @@
+"""
+Maintenance
+
+`tsrc sync` runs git with automatic garbage collection disabled (see
+tsrc.git.NO_AUTO_GC), because fetching hundreds of repos at once
+would otherwise start as many `git gc --auto`, all competing for the CPU.
+
+Instead, the repos that would have needed one (those with too many loose
+objects or packs, using the same estimates as `git gc --auto`) are added
+to a queue, stored in `<workspace>/.tsrc/maintenance_queue.json`. The queue
+is processed by `tsrc maintenance` (or `tsrc sync --maintenance`), which
+runs `git maintenance run` on a limited number of repos at a time. Besides
+garbage collection, this writes the commit-graph, which makes later
+computations of ahead/behind counts (see tsrc.git.GitStatus) faster.
+"""
+
+import json
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, List, Set
+
+import cli_ui as ui
+
+from tsrc.errors import Error
+from tsrc.executor import Outcome, ResourceClass, Task
+from tsrc.file_lock import file_lock
+from tsrc.git_refs import GitRefReader
+from tsrc.repo import Repo
+from tsrc.utils import atomic_write
+
+MAINTENANCE_TASKS = ["gc", "commit-graph", "loose-objects"]
+
+# defaults of gc.auto and gc.autoPackLimit
+DEFAULT_AUTO_GC = 6700
+DEFAULT_AUTO_PACK_LIMIT = 50
+
+
+class MaintenanceQueue:
+    """The destinations of the repos waiting for maintenance"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    @classmethod
+    def for_workspace(cls, root_path: Path) -> "MaintenanceQueue":
+        return cls(root_path / ".tsrc" / "maintenance_queue.json")
+
+    def load(self) -> Set[str]:
+        try:
+            return set(json.loads(self.path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return set()
+
+    def add(self, dests: Iterable[str]) -> None:
+        with file_lock(self.path.with_suffix(".lock")):
+            self._save(self.load() | set(dests))
+
+    def remove(self, dests: Iterable[str]) -> None:
+        with file_lock(self.path.with_suffix(".lock")):
+            self._save(self.load() - set(dests))
+
+    def _save(self, dests: Set[str]) -> None:
+        atomic_write(self.path, json.dumps(sorted(dests)))
+
+
+def get_config_int(reader: GitRefReader, key: str, default: int) -> int:
+    value = reader.config.get("gc", "", key)
+    try:
+        return int(value) if value else default
+    except ValueError:
+        return default
+
+
+def needs_maintenance(repo_path: Path) -> bool:
+    """Whether `git gc --auto` would do something in the repo.
+
+    Like git, estimate the number of loose objects from the ones in
+    `objects/17`, without looking at the other directories.
+    """
+    try:
+        reader = GitRefReader(repo_path)
+        objects_path = reader.common_dir / "objects"
+        auto_gc = get_config_int(reader, "auto", DEFAULT_AUTO_GC)
+        auto_pack_limit = get_config_int(
+            reader, "autopacklimit", DEFAULT_AUTO_PACK_LIMIT
+        )
+        if auto_gc <= 0:
+            return False
+        threshold = (auto_gc + 255) // 256
+        sample_path = objects_path / "17"
+        if sample_path.is_dir() and len(os.listdir(sample_path)) > threshold:
+            return True
+        if auto_pack_limit <= 0:
+            return False
+        packs = list((objects_path / "pack").glob("*.pack"))
+        kept = [x for x in packs if x.with_suffix(".keep").exists()]
+        return len(packs) - len(kept) > auto_pack_limit
+    except (Error, OSError):
+        return False
+
+
+class Maintainer(Task[Repo]):
+    """Run `git maintenance` in each repo, and collect the destinations
+    of the ones that succeeded in `self.done`.
+    """
+
+    def __init__(self, workspace_path: Path) -> None:
+        self.workspace_path = workspace_path
+        self.done: Set[str] = set()
+        self._lock = Lock()
+
+    def describe_item(self, item: Repo) -> str:
+        return item.dest
+
+    def describe_process_start(self, item: Repo) -> List[ui.Token]:
+        return ["Maintaining", item.dest]
+
+    def describe_process_end(self, item: Repo) -> List[ui.Token]:
+        return [ui.green, "ok", ui.reset, item.dest]
+
+    def process(self, index: int, count: int, repo: Repo) -> Outcome:
+        self.info_count(index, count, "Maintaining", repo.dest)
+        repo_path = self.workspace_path / repo.dest
+        task_args = [f"--task={x}" for x in MAINTENANCE_TASKS]
+        with self.use_resource(ResourceClass.LOCAL):
+            try:
+                self.run_git(repo_path, "maintenance", "run", "--quiet", *task_args)
+            except Error:
+                raise Error("git maintenance failed")
+        with self._lock:
+            self.done.add(repo.dest)
+        return Outcome.empty()
@@ -3,11 +3,11 @@
 # TODO: check for absolute paths in _handle_copies, _handle_links
 
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import schema
 
-from tsrc.config import parse_config
+from tsrc.config import Config, parse_config
 from tsrc.errors import (
     Error,
     InvalidConfigError,
@@ -34,6 +34,8 @@ class Manifest:
 
     def __init__(self) -> None:
         self._repos: List[Repo] = []
+        # dest -> first repo with this dest, see get_repo()
+        self._repos_by_dest: Dict[str, Repo] = {}
         self.group_list: Optional[GroupList[str]] = None
         self._switch: Optional[Switch] = None
 
@@ -70,6 +72,9 @@ class Manifest:
         sha1 = repo_config.get("sha1")
         url = repo_config.get("url")
         ignore_submodules = repo_config.get("ignore_submodules", False)
+        narrow_fetch = repo_config.get("narrow_fetch")
+        clone_filter = repo_config.get("clone_filter")
+        sparse = repo_config.get("sparse")
         if url:
             origin = Remote(name="origin", url=url)
             remotes = [origin]
@@ -83,8 +88,12 @@ class Manifest:
             tag=tag,
             remotes=remotes,
             ignore_submodules=ignore_submodules,
+            narrow_fetch=narrow_fetch,
+            clone_filter=clone_filter,
+            sparse=sparse,
         )
         self._repos.append(repo)
+        self._repos_by_dest.setdefault(dest, repo)
 
     def _handle_remotes(self, repo_config: Any) -> List[Remote]:
         remotes_config = repo_config.get("remotes")
@@ -187,16 +196,13 @@ class Manifest:
         elements = self.group_list.get_elements(
             groups=groups, ignore_if_group_not_found=ignore_if_group_not_found
         )
-        res = []
-        for dest in elements:
-            res.append(self.get_repo(dest))
-        return res
+        return [self.get_repo(dest) for dest in elements]
 
     def get_repo(self, dest: str) -> Repo:
-        for repo in self._repos:
-            if repo.dest == dest:
-                return repo
-        raise RepoNotFound(dest)
+        repo = self._repos_by_dest.get(dest)
+        if repo is None:
+            raise RepoNotFound(dest)
+        return repo
 
 
 def validate_repo(data: Any) -> None:
@@ -212,6 +218,9 @@ def validate_repo(data: Any) -> None:
             schema.Optional("sha1"): str,
             schema.Optional("tag"): str,
             schema.Optional("ignore_submodules"): bool,
+            schema.Optional("narrow_fetch"): bool,
+            schema.Optional("clone_filter"): str,
+            schema.Optional("sparse"): [str],
             schema.Optional("remotes"): [remote_schema],
             schema.Optional("url"): str,
         }
@@ -242,6 +251,9 @@ def validate_repo_no_remote_required(data: Any) -> None:
             schema.Optional("sha1"): str,
             schema.Optional("tag"): str,
             schema.Optional("ignore_submodules"): bool,
+            schema.Optional("narrow_fetch"): bool,
+            schema.Optional("clone_filter"): str,
+            schema.Optional("sparse"): [str],
             schema.Optional("remotes"): [remote_schema],
             schema.Optional("url"): str,
         }
@@ -270,18 +282,17 @@ def validate_switch(data: Any) -> None:
     switch_schema.validate(data)
 
 
-def load_manifest(manifest_path: Path) -> Manifest:
-    """Main entry point: return a manifest instance by parsing
-    a `manifest.yml` file.
-
-    """
+def get_manifest_schema(*, remote_required: bool = True) -> schema.Schema:
     remote_git_server_schema = {"url": str}
-    repo_schema = schema.Use(validate_repo)
+    if remote_required:
+        repo_schema = schema.Use(validate_repo)
+    else:
+        repo_schema = schema.Use(validate_repo_no_remote_required)
     group_schema = {"repos": [str], schema.Optional("includes"): [str]}
     # Note: gitlab and github_enterprise_url keys are ignored,
     # and kept here only for backward compatibility reasons
     on_switch_schema = schema.Use(validate_switch)
-    manifest_schema = schema.Schema(
+    return schema.Schema(
         {
             "repos": [repo_schema],
             schema.Optional("gitlab"): remote_git_server_schema,
@@ -290,13 +301,40 @@ def load_manifest(manifest_path: Path) -> Manifest:
             schema.Optional("switch"): on_switch_schema,
         }
     )
-    parsed = parse_config(manifest_path, schema=manifest_schema)
+
+
+def parse_manifest(manifest_path: Path, remote_required: bool = True) -> Config:
+    """Parse and validate a `manifest.yml` file.
+
+    Raise InvalidConfigError if it is not valid.
+    """
+    manifest_schema = get_manifest_schema(remote_required=remote_required)
+    return parse_config(manifest_path, schema=manifest_schema)
+
+
+# Used to plug a cache in, see LocalManifest.parse_manifest
+ManifestParser = Callable[[Path, bool], Config]
+
+
+def load_manifest(
+    manifest_path: Path, *, parse: ManifestParser = parse_manifest
+) -> Manifest:
+    """Main entry point: return a manifest instance by parsing
+    a `manifest.yml` file.
+
+    """
+    parsed = parse(manifest_path, True)
     res = Manifest()
     res.apply_config(parsed)
     return res
 
 
-def load_manifest_safe_mode(manifest_path: Path, mtod: ManifestsTypeOfData) -> Manifest:
+def load_manifest_safe_mode(
+    manifest_path: Path,
+    mtod: ManifestsTypeOfData,
+    *,
+    parse: ManifestParser = parse_manifest,
+) -> Manifest:
     """Main entry point: return a manifest instance by parsing
     a `manifest.yml` file.
 
@@ -306,30 +344,12 @@ def load_manifest_safe_mode(manifest_path: Path, mtod: ManifestsTypeOfData) -> M
     if we have Group that contain Repo that is not present in the Manifest,
     ignore such Repo (do not add it to Group).
     """
-    remote_git_server_schema = {"url": str}
-    if mtod in mtod_can_ignore_remotes():
-        repo_schema = schema.Use(validate_repo_no_remote_required)
-    else:
-        repo_schema = schema.Use(validate_repo)
-    group_schema = {"repos": [str], schema.Optional("includes"): [str]}
-    # Note: gitlab and github_enterprise_url keys are ignored,
-    # and kept here only for backward compatibility reasons
-    on_switch_schema = schema.Use(validate_switch)
-    manifest_schema = schema.Schema(
-        {
-            "repos": [repo_schema],
-            schema.Optional("gitlab"): remote_git_server_schema,
-            schema.Optional("github_enterprise"): remote_git_server_schema,
-            schema.Optional("groups"): {str: group_schema},
-            schema.Optional("switch"): on_switch_schema,
-        }
-    )
+    remote_required = mtod not in mtod_can_ignore_remotes()
     try:
-        parsed = parse_config(manifest_path, schema=manifest_schema)
+        parsed = parse(manifest_path, remote_required)
     except InvalidConfigError:
         raise LoadManifestSchemaError(mtod)
 
-    parsed = parse_config(manifest_path, schema=manifest_schema)
     res = Manifest()
     res.apply_config(parsed, ignore_on_mtod=mtod)
     return res
@@ -0,0 +1,140 @@
+"""
+Manifest Cache
+
+Parsing `manifest.yml` (with ruamel.yaml, in pure Python) and validating
+it against its schema is slow for big manifests, and happens several
+times per command. So the result is stored in
+`<workspace>/.tsrc/manifest_cache/<digest>.marshal`, where the digest is
+computed from the contents of the file, the schema used to validate it,
+the tsrc version and the source of the parsing and validation code (so
+that a new tsrc does not trust what an older one validated), and the
+Python version (the marshal format depends on it).
+
+Only successfully validated manifests are stored: invalid ones are
+parsed again, so that the error is reported each time.
+
+Each manifest read (including older revisions, the Deep Manifest and the
+Future Manifest) gets its own entry, so only the MAX_ENTRIES most
+recently used entries are kept.
+
+See LocalManifest.parse_manifest for the in-process memo on top of it.
+"""
+
+import functools
+import hashlib
+import marshal
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import tsrc.config
+import tsrc.manifest
+from tsrc import __version__
+from tsrc.config import Config
+from tsrc.utils import atomic_write
+
+# bump when the cached data changes
+FORMAT_VERSION = 1
+
+MAX_ENTRIES = 32
+
+
+@functools.lru_cache(maxsize=None)
+def get_parser_digest() -> str:
+    """Digest of the code parsing and validating manifests (empty if the
+    source cannot be read, leaving only the tsrc version to tell them apart)
+    """
+    h = hashlib.sha1()
+    for module in (tsrc.config, tsrc.manifest):
+        try:
+            h.update(Path(str(module.__file__)).read_bytes())
+        except OSError:
+            return ""
+    return h.hexdigest()
+
+
+def get_digest(contents: bytes, remote_required: bool) -> str:
+    h = hashlib.sha1()
+    header = ":".join(
+        [
+            str(FORMAT_VERSION),
+            __version__,
+            get_parser_digest(),
+            str(sys.implementation.cache_tag),
+            str(remote_required),
+        ]
+    )
+    h.update(header.encode() + b"\0")
+    h.update(contents)
+    return h.hexdigest()
+
+
+def dump_config(parsed: Config) -> Optional[bytes]:
+    """Serialize the parsed manifest, if possible (YAML timestamps for
+    instance cannot be marshaled)
+    """
+    try:
+        return marshal.dumps(parsed)
+    except ValueError:
+        return None
+
+
+def load_config(data: bytes) -> Optional[Config]:
+    """Deserialize a parsed manifest, or return None if the data is
+    corrupted
+    """
+    try:
+        res = marshal.loads(data)
+    except (EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(res, dict):
+        return None
+    return Config(res)
+
+
+class ManifestCache:
+    def __init__(self, cache_path: Path, *, max_entries: int = MAX_ENTRIES) -> None:
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+
+    @classmethod
+    def for_workspace(cls, root_path: Path) -> "ManifestCache":
+        return cls(root_path / ".tsrc" / "manifest_cache")
+
+    def get_entry_path(self, digest: str) -> Path:
+        return self.cache_path / f"{digest}.marshal"
+
+    def load(self, digest: str) -> Optional[bytes]:
+        entry_path = self.get_entry_path(digest)
+        try:
+            res = entry_path.read_bytes()
+            # the modification time records the last use, see evict()
+            os.utime(entry_path)
+        except OSError:
+            return None
+        return res
+
+    def save(self, digest: str, data: bytes) -> None:
+        try:
+            self.cache_path.mkdir(parents=True, exist_ok=True)
+            atomic_write(self.get_entry_path(digest), data)
+            self.evict()
+        except OSError:
+            # the cache is only an optimization
+            pass
+
+    def evict(self) -> None:
+        """Remove the least recently used entries, keeping at most
+        `max_entries` of them
+        """
+        entries = []
+        for entry_path in self.cache_path.glob("*.marshal"):
+            try:
+                entries.append((entry_path.stat().st_mtime_ns, entry_path))
+            except OSError:
+                # removed by another tsrc process
+                continue
+        entries.sort(reverse=True)
+        for _, entry_path in entries[self.max_entries :]:
+            entry_path.unlink(missing_ok=True)
@@ -0,0 +1,95 @@
+"""
+Manifest Diff
+
+Find the repos `tsrc sync` can leave alone because nothing changed for
+them since the last successful sync, by comparing the manifest at the
+commit of that sync with the current one.
+
+A repo is left alone when:
+
+* it was synced by the last successful sync,
+* it is frozen at a tag and/or a sha1 (repos following a branch may
+  have new commits at any time, so they are always synced),
+* its configuration (branch, tag, sha1, remotes, ...) and its
+  file operations (copies and symlinks) did not change,
+* it is still at its tag and/or sha1, with a clean worktree (checked
+  by Workspace.find_unchanged_repos, see tsrc.remote_probe), so that
+  a repo moved by hand is put back where the manifest says.
+
+The last successful sync is recorded in `<workspace>/.tsrc/last_sync.json`.
+It is removed when a sync starts, and written again once the sync
+succeeds, so that a sync that failed or was interrupted is always
+followed by a full one.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from tsrc.file_system import FileSystemOperation
+from tsrc.manifest import Manifest
+from tsrc.repo import Repo
+from tsrc.utils import atomic_write
+
+
+class LastSync:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    @classmethod
+    def for_workspace(cls, root_path: Path) -> "LastSync":
+        return cls(root_path / ".tsrc" / "last_sync.json")
+
+    def load(self) -> Optional[Tuple[str, Set[str]]]:
+        """Return the sha1 of the manifest commit, and the destinations
+        of the repos synced by the last successful sync, if any
+        """
+        try:
+            data = json.loads(self.path.read_text())
+            return data["manifest"], set(data["repos"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, manifest_sha1: str, dests: List[str]) -> None:
+        data = {"manifest": manifest_sha1, "repos": sorted(dests)}
+        atomic_write(self.path, json.dumps(data))
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def get_repos_by_dest(manifest: Manifest) -> Dict[str, Repo]:
+    return {x.dest: x for x in manifest.get_repos(all_=True)}
+
+
+def get_operations_by_dest(
+    manifest: Manifest,
+) -> Dict[str, List[FileSystemOperation]]:
+    res: Dict[str, List[FileSystemOperation]] = {}
+    for operation in manifest.file_system_operations:
+        res.setdefault(operation.get_repo(), []).append(operation)
+    return res
+
+
+def get_unchanged_repos(
+    old_manifest: Manifest, new_manifest: Manifest, synced: Set[str]
+) -> Set[str]:
+    """Return the destinations of the repos that do not need syncing,
+    given the manifests of the last sync and of this one, and the repos
+    synced by the last sync.
+    """
+    old_repos = get_repos_by_dest(old_manifest)
+    old_operations = get_operations_by_dest(old_manifest)
+    new_operations = get_operations_by_dest(new_manifest)
+    res = set()
+    for dest, repo in get_repos_by_dest(new_manifest).items():
+        if dest not in synced:
+            continue
+        if not (repo.sha1 or repo.tag):
+            continue
+        if old_repos.get(dest) != repo:
+            continue
+        if old_operations.get(dest) != new_operations.get(dest):
+            continue
+        res.add(dest)
+    return res
@@ -0,0 +1,149 @@
+"""
+Manifest Lock
+
+`tsrc lock` resolves the branch or tag of every repo of the manifest
+to a commit, and writes the result in `manifest.lock.yml`, next to
+`manifest.yml`:
+
+    repos:
+      bar: 2f5e8b9e3d5b0f7a3f3e1c4a0e0f4d3b5a8c7d6e
+      foo: 9a3f6c1e8b7d4c2a0f5e3d1b9c7a5e3f1d0b8a6c
+
+Once committed in the manifest repository, `tsrc sync --locked` and
+`tsrc init --locked` put every repo at exactly this commit: only the
+sha1 is fetched (see Syncer.get_narrow_refspecs), and there is no need
+to look for a branch containing it, so syncs are both deterministic
+and cheap.
+"""
+
+import dataclasses
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional
+
+import cli_ui as ui
+import ruamel.yaml
+from schema import Schema
+
+from tsrc.config import parse_config
+from tsrc.errors import Error
+from tsrc.executor import Outcome, ResourceClass, Task
+from tsrc.git import is_full_sha1, is_git_repository, run_git_captured
+from tsrc.git_remote import get_url_host
+from tsrc.remote_probe import get_probed_refs, parse_ls_remote
+from tsrc.repo import Repo
+from tsrc.syncer import pick_remotes
+
+LOCK_FILE_NAME = "manifest.lock.yml"
+
+
+class RepoNotLocked(Error):
+    def __init__(self, dest: str, lock_path: Path) -> None:
+        super().__init__(
+            f"No commit found for '{dest}' in {lock_path}.",
+            "Please run `tsrc lock` again",
+        )
+
+
+def load_lock(lock_path: Path) -> Dict[str, str]:
+    """Return the commit of each repo, by destination"""
+    lock_schema = Schema({"repos": {str: str}})
+    parsed = parse_config(lock_path, schema=lock_schema)
+    res: Dict[str, str] = parsed["repos"]
+    return res
+
+
+def save_lock(lock_path: Path, sha1s: Dict[str, str]) -> None:
+    yaml = ruamel.yaml.YAML(typ="rt")
+    with lock_path.open("w") as fp:
+        yaml.dump({"repos": dict(sorted(sha1s.items()))}, fp)
+
+
+def lock_repos(repos: List[Repo], lock_path: Path) -> List[Repo]:
+    """Return the repos frozen at the commits of the lock file"""
+    sha1s = load_lock(lock_path)
+    res = []
+    for repo in repos:
+        sha1 = sha1s.get(repo.dest)
+        if not sha1:
+            raise RepoNotLocked(repo.dest, lock_path)
+        # Note: the tag is dropped, so that nothing but the sha1
+        # is fetched. orig_branch is kept, so that a repo on a branch
+        # stays on it, while a repo frozen at a tag stays detached
+        locked = dataclasses.replace(repo, sha1=sha1, tag=None)
+        res.append(locked)
+    return res
+
+
+class Locker(Task[Repo]):
+    """Collect the commit of each repo in `self.sha1s`, using one
+    `git ls-remote` per repo.
+    """
+
+    def __init__(
+        self, workspace_path: Path, *, remote_name: Optional[str] = None
+    ) -> None:
+        self.workspace_path = workspace_path
+        self.remote_name = remote_name
+        self.sha1s: Dict[str, str] = {}
+        self._lock = Lock()
+
+    def describe_item(self, item: Repo) -> str:
+        return item.dest
+
+    def describe_process_start(self, item: Repo) -> List[ui.Token]:
+        return ["Locking", item.dest]
+
+    def describe_process_end(self, item: Repo) -> List[ui.Token]:
+        return [ui.green, "ok", ui.reset, item.dest]
+
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            remotes = pick_remotes(item, self.remote_name)
+        except Error:
+            # will be reported when processing the item
+            return None
+        return get_url_host(remotes[0].url) if remotes else None
+
+    def process(self, index: int, count: int, repo: Repo) -> Outcome:
+        self.info_count(index, count, "Locking", repo.dest)
+        if repo.sha1:
+            sha1 = self.resolve_sha1(repo, repo.sha1)
+        else:
+            sha1 = self.resolve_ref(repo)
+        with self._lock:
+            self.sha1s[repo.dest] = sha1
+        return Outcome.empty()
+
+    def resolve_sha1(self, repo: Repo, sha1: str) -> str:
+        if is_full_sha1(sha1):
+            return sha1
+        # Abbreviated sha1s cannot be resolved by the remotes
+        repo_path = self.workspace_path / repo.dest
+        if not is_git_repository(repo_path):
+            raise Error(f"cannot resolve abbreviated sha1 {sha1} without a clone")
+        rc, out = run_git_captured(
+            repo_path, "rev-parse", "--verify", f"{sha1}^{{commit}}", check=False
+        )
+        if rc != 0:
+            raise Error(f"cannot resolve abbreviated sha1 {sha1}")
+        return out
+
+    def resolve_ref(self, repo: Repo) -> str:
+        remotes = pick_remotes(repo, self.remote_name)
+        if not remotes:
+            raise Error("no remote configured")
+        remote = remotes[0]
+        refs = get_probed_refs(repo)
+        with self.use_resource(ResourceClass.NETWORK, get_url_host(remote.url)):
+            rc, out = run_git_captured(
+                self.workspace_path, "ls-remote", remote.url, *refs, check=False
+            )
+        if rc != 0:
+            raise Error(f"ls-remote on '{remote.name}' failed")
+        advertised = parse_ls_remote(out)
+        # Note: for annotated tags, the commit comes last
+        for ref in reversed(refs):
+            if ref in advertised:
+                return advertised[ref]
+        raise Error(f"{refs[0]} not found on '{remote.name}'")
@@ -0,0 +1,129 @@
+"""
+Mirror Cache
+
+Bare mirrors of the repositories cloned by tsrc, shared by all the
+workspaces of the machine, in `~/.cache/tsrc/mirrors/<url-hash>.git`
+(or in the directory set by the TSRC_MIRROR_CACHE environment variable).
+
+When the cache is enabled (see `use_mirror_cache` in the workspace
+configuration), the mirror of a repository is created or updated
+right before cloning it, and the clone is made with
+`git clone --reference-if-able <mirror> --dissociate`: only the objects
+missing from the mirror are then transferred from the server, and the
+new clone does not depend on the mirror afterwards.
+
+Mirrors are protected by a lock file, so that several tsrc processes
+can use the cache at the same time.
+"""
+
+import hashlib
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from tsrc.errors import Error
+from tsrc.file_lock import file_lock
+from tsrc.git import run_git_captured
+from tsrc.git_refs import GitConfig
+
+
+@dataclass(frozen=True)
+class MirrorInfo:
+    url: str
+    path: Path
+    size: int
+    # time of the last update, in seconds since the epoch
+    updated: float
+
+
+class MirrorCache:
+    def __init__(self, root_path: Path) -> None:
+        self.root_path = root_path
+
+    @classmethod
+    def default(cls) -> "MirrorCache":
+        from_env = os.environ.get("TSRC_MIRROR_CACHE")
+        if from_env:
+            return cls(Path(from_env).expanduser())
+        cache_home = os.environ.get("XDG_CACHE_HOME")
+        if cache_home:
+            cache_path = Path(cache_home)
+        else:
+            cache_path = Path.home() / ".cache"
+        return cls(cache_path / "tsrc" / "mirrors")
+
+    def get_mirror_path(self, url: str) -> Path:
+        url_hash = hashlib.sha1(url.encode()).hexdigest()
+        return self.root_path / f"{url_hash}.git"
+
+    def update(self, url: str) -> Path:
+        """Create or update the mirror of the given URL, and return its path"""
+        mirror_path = self.get_mirror_path(url)
+        with file_lock(mirror_path.with_suffix(".lock")):
+            if mirror_path.exists():
+                rc, out = run_git_captured(
+                    mirror_path, "fetch", "--prune", "origin", check=False
+                )
+            else:
+                rc, out = self._create(url, mirror_path)
+            if rc != 0:
+                raise Error(f"Could not update mirror of {url}:\n{out}")
+            (mirror_path / "tsrc-updated").touch()
+        return mirror_path
+
+    def _create(self, url: str, mirror_path: Path) -> Tuple[int, str]:
+        # Clone next to the final location, so that an interrupted clone
+        # is never mistaken for a mirror
+        tmp_path = mirror_path.with_suffix(".tmp")
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+        self.root_path.mkdir(parents=True, exist_ok=True)
+        rc, out = run_git_captured(
+            self.root_path, "clone", "--mirror", url, str(tmp_path), check=False
+        )
+        if rc == 0:
+            os.replace(tmp_path, mirror_path)
+        return rc, out
+
+    def get_mirrors(self) -> List[MirrorInfo]:
+        if not self.root_path.is_dir():
+            return []
+        res = []
+        for mirror_path in sorted(self.root_path.glob("*.git")):
+            url = get_mirror_url(mirror_path)
+            if not url:
+                continue
+            stamp_path = mirror_path / "tsrc-updated"
+            if stamp_path.exists():
+                updated = stamp_path.stat().st_mtime
+            else:
+                updated = mirror_path.stat().st_mtime
+            info = MirrorInfo(
+                url=url,
+                path=mirror_path,
+                size=get_dir_size(mirror_path),
+                updated=updated,
+            )
+            res.append(info)
+        return res
+
+
+def get_mirror_url(mirror_path: Path) -> Optional[str]:
+    try:
+        config = GitConfig.from_text((mirror_path / "config").read_text())
+    except (OSError, Error):
+        return None
+    return config.get("remote", "origin", "url")
+
+
+def get_dir_size(path: Path) -> int:
+    res = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                res += os.lstat(os.path.join(dir_path, file_name)).st_size
+            except OSError:
+                pass
+    return res
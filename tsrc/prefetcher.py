@@ -0,0 +1,117 @@
+"""
+Prefetcher
+
+Used by `tsrc prefetch`, meant to be run in the background (from cron
+or a systemd timer for instance), so that the next `tsrc sync` has
+(almost) nothing left to download.
+
+Branches and tags of each remote are fetched in a private namespace,
+`refs/prefetch/<remote>/heads/*` and `refs/prefetch/<remote>/tags/*`:
+remote-tracking branches, local branches, tags and the worktree are
+left alone, so prefetching never changes what the user sees. The
+objects are there though, so the `git fetch` run by `tsrc sync` only
+has to update refs.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import cli_ui as ui
+
+from tsrc.errors import Error
+from tsrc.executor import Outcome, ResourceClass, Task
+from tsrc.git_remote import get_url_host
+from tsrc.repo import Remote, Repo
+from tsrc.syncer import get_filter_args, pick_remotes
+
+
+def get_prefetch_refspecs(remote_name: str) -> List[str]:
+    prefix = f"refs/prefetch/{remote_name}"
+    return [
+        f"+refs/heads/*:{prefix}/heads/*",
+        f"+refs/tags/*:{prefix}/tags/*",
+    ]
+
+
+def lower_priority() -> None:
+    """Lower the CPU and I/O priority of the current process, and thus
+    of the git commands it runs (they inherit it)
+    """
+    if sys.platform == "win32":
+        return
+    try:
+        os.nice(19)
+    except OSError:
+        pass
+    ionice = shutil.which("ionice")
+    if ionice:
+        # Note: the "idle" class only gets disk time when no other
+        # process needs it
+        subprocess.run(
+            [ionice, "-c", "3", "-p", str(os.getpid())],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+
+
+class Prefetcher(Task[Repo]):
+    def __init__(
+        self,
+        workspace_path: Path,
+        *,
+        remote_name: Optional[str] = None,
+        clone_filter: Optional[str] = None,
+    ) -> None:
+        self.workspace_path = workspace_path
+        self.remote_name = remote_name
+        self.clone_filter = clone_filter
+
+    def describe_item(self, item: Repo) -> str:
+        return item.dest
+
+    def describe_process_start(self, item: Repo) -> List[ui.Token]:
+        return ["Prefetching", item.dest]
+
+    def describe_process_end(self, item: Repo) -> List[ui.Token]:
+        return [ui.green, "ok", ui.reset, item.dest]
+
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            remotes = pick_remotes(item, self.remote_name)
+        except Error:
+            # will be reported when processing the item
+            return None
+        return get_url_host(remotes[0].url) if remotes else None
+
+    def get_prefetch_cmd(self, repo: Repo, remote: Remote) -> List[str]:
+        repo_path = self.workspace_path / repo.dest
+        # Note: the empty --refmap prevents git from updating the
+        # remote-tracking branches as well
+        return [
+            "fetch",
+            "--no-tags",
+            "--prune",
+            "--no-write-fetch-head",
+            "--recurse-submodules=no",
+            "--refmap=",
+            *get_filter_args(repo_path, repo, remote, self.clone_filter),
+            remote.name,
+            *get_prefetch_refspecs(remote.name),
+        ]
+
+    def process(self, index: int, count: int, repo: Repo) -> Outcome:
+        self.info_count(index, count, "Prefetching", repo.dest)
+        repo_path = self.workspace_path / repo.dest
+        for remote in pick_remotes(repo, self.remote_name):
+            cmd = self.get_prefetch_cmd(repo, remote)
+            try:
+                with self.use_resource(ResourceClass.NETWORK, get_url_host(remote.url)):
+                    self.run_git(repo_path, *cmd)
+            except Error:
+                raise Error(f"prefetch from '{remote.name}' failed")
+        return Outcome.empty()
@@ -0,0 +1,288 @@
+"""
+Remote Probe
+
+Find the repos `tsrc sync` has nothing to do for, before syncing them.
+
+For each repo, the refs advertised by its remotes for the branch
+or tag configured in the manifest are listed with `git ls-remote`,
+which is much cheaper than a `git fetch`, and compared with the
+local refs (read with tsrc.git_refs, without spawning git).
+
+A repo is considered up to date when:
+
+* it is on the configured branch, its remote-tracking branches match
+  the advertised ones, and HEAD matches its upstream, or
+* it is at the configured tag and/or sha1, the tag matches the
+  advertised one, and the worktree is clean,
+
+and all its submodules (if any) have been checked out, and its sparse
+checkout (if any) matches the manifest.
+
+Such repos can skip `git fetch`, `git merge` and the submodules update
+entirely. Note that they do not get new tags, nor have their stale
+remote-tracking branches pruned.
+
+Whenever something is unexpected, the repo is not considered
+up to date, so that the Syncer can take care of it (and report
+errors if needed).
+"""
+
+import asyncio
+import functools
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Set
+
+import cli_ui as ui
+
+from tsrc.errors import Error
+from tsrc.executor import Outcome, ResourceClass, Task
+from tsrc.git import (
+    get_git_status,
+    is_git_repository,
+    run_git_captured,
+    run_git_captured_async,
+)
+from tsrc.git_refs import GitConfig, GitRefReader
+from tsrc.git_remote import get_url_host
+from tsrc.repo import Remote, Repo
+from tsrc.sparse_checkout import get_sparse_checkout_cmds
+from tsrc.status_cache import get_upstream_ref
+from tsrc.syncer import pick_remotes
+
+# remote name -> ref -> sha1
+AdvertisedRefs = Dict[str, Dict[str, str]]
+
+
+class RemoteProbe(Task[Repo]):
+    """Collect the destinations of the repos that are up to date
+    with their remotes in `self.up_to_date`.
+    """
+
+    def __init__(self, workspace_path: Path, *, remote_name: Optional[str] = None):
+        self.workspace_path = workspace_path
+        self.remote_name = remote_name
+        self.up_to_date: Set[str] = set()
+        self._lock = Lock()
+
+    def describe_item(self, item: Repo) -> str:
+        return item.dest
+
+    def describe_process_start(self, item: Repo) -> List[ui.Token]:
+        return ["Probing remotes", item.dest]
+
+    def describe_process_end(self, item: Repo) -> List[ui.Token]:
+        return [ui.green, "ok", ui.reset, item.dest]
+
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            remotes = pick_remotes(item, self.remote_name)
+        except Error:
+            return None
+        return get_url_host(remotes[0].url) if remotes else None
+
+    def process(self, index: int, count: int, repo: Repo) -> Outcome:
+        repo_path = self.workspace_path / repo.dest
+        advertised: AdvertisedRefs = {}
+        for remote in self._get_remotes_to_probe(repo):
+            with self.use_resource(ResourceClass.NETWORK, get_url_host(remote.url)):
+                rc, out = run_git_captured(
+                    repo_path,
+                    "ls-remote",
+                    remote.name,
+                    *get_probed_refs(repo),
+                    check=False,
+                )
+            if rc != 0:
+                return Outcome.empty()
+            advertised[remote.name] = parse_ls_remote(out)
+        with self.use_resource(ResourceClass.LOCAL):
+            self._check(repo, advertised)
+        return Outcome.empty()
+
+    async def process_async(self, index: int, count: int, repo: Repo) -> Outcome:
+        repo_path = self.workspace_path / repo.dest
+        advertised: AdvertisedRefs = {}
+        for remote in self._get_remotes_to_probe(repo):
+            host = get_url_host(remote.url)
+            async with self.use_resource_async(ResourceClass.NETWORK, host):
+                rc, out = await run_git_captured_async(
+                    repo_path,
+                    "ls-remote",
+                    remote.name,
+                    *get_probed_refs(repo),
+                    check=False,
+                )
+            if rc != 0:
+                return Outcome.empty()
+            advertised[remote.name] = parse_ls_remote(out)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None, functools.partial(self._check, repo, advertised)
+        )
+        return Outcome.empty()
+
+    def _get_remotes_to_probe(self, repo: Repo) -> List[Remote]:
+        if not get_probed_refs(repo):
+            # a fixed sha1 cannot change, no need to ask the remotes
+            return []
+        try:
+            return pick_remotes(repo, self.remote_name)
+        except Error:
+            # will be reported by the Syncer
+            return []
+
+    def _check(self, repo: Repo, advertised: AdvertisedRefs) -> None:
+        if self.is_up_to_date(repo, advertised):
+            with self._lock:
+                self.up_to_date.add(repo.dest)
+
+    def is_up_to_date(self, repo: Repo, advertised: AdvertisedRefs) -> bool:
+        repo_path = self.workspace_path / repo.dest
+        try:
+            reader = GitRefReader(repo_path)
+            if not repo.ignore_submodules and not submodules_are_checked_out(repo_path):
+                return False
+            if get_sparse_checkout_cmds(repo_path, repo):
+                return False
+            if repo.sha1 or repo.tag:
+                if not ref_is_up_to_date(reader, repo, advertised):
+                    return False
+                # Syncer refuses to reset dirty repos
+                return not get_git_status(repo_path).dirty
+            return bool(advertised) and branch_is_up_to_date(reader, repo, advertised)
+        except (Error, OSError):
+            return False
+
+
+class PinnedRefCheck(Task[Repo]):
+    """Collect the destinations of the repos that are still at the tag
+    and/or sha1 they are frozen at in `self.at_pinned_ref`, see
+    is_at_pinned_ref().
+    """
+
+    def __init__(self, workspace_path: Path) -> None:
+        self.workspace_path = workspace_path
+        self.at_pinned_ref: Set[str] = set()
+        self._lock = Lock()
+
+    def describe_item(self, item: Repo) -> str:
+        return item.dest
+
+    def describe_process_start(self, item: Repo) -> List[ui.Token]:
+        return ["Checking", item.dest]
+
+    def describe_process_end(self, item: Repo) -> List[ui.Token]:
+        return [ui.green, "ok", ui.reset, item.dest]
+
+    def process(self, index: int, count: int, repo: Repo) -> Outcome:
+        with self.use_resource(ResourceClass.LOCAL):
+            if is_at_pinned_ref(self.workspace_path, repo):
+                with self._lock:
+                    self.at_pinned_ref.add(repo.dest)
+        return Outcome.empty()
+
+
+def is_at_pinned_ref(workspace_path: Path, repo: Repo) -> bool:
+    """Same as RemoteProbe.is_up_to_date() for a repo frozen at a tag
+    and/or a sha1, trusting the local tag instead of asking the remotes
+    """
+    repo_path = workspace_path / repo.dest
+    if not is_git_repository(repo_path):
+        # missing: it will be cloned again
+        return False
+    advertised: AdvertisedRefs = {}
+    if repo.tag:
+        tag_ref = f"refs/tags/{repo.tag}"
+        try:
+            rc, out = run_git_captured(
+                repo_path, "rev-parse", tag_ref, f"{tag_ref}^{{commit}}", check=False
+            )
+        except (Error, OSError):
+            return False
+        if rc != 0:
+            return False
+        tag_sha1, commit = out.split()
+        advertised["local"] = {tag_ref: tag_sha1, f"{tag_ref}^{{}}": commit}
+    return RemoteProbe(workspace_path).is_up_to_date(repo, advertised)
+
+
+def submodules_are_checked_out(repo_path: Path) -> bool:
+    """Check that every submodule listed in `.gitmodules` has been
+    initialized, because they are only updated when syncing.
+    """
+    gitmodules_path = repo_path / ".gitmodules"
+    if not gitmodules_path.exists():
+        return True
+    gitmodules = GitConfig.from_text(gitmodules_path.read_text())
+    for name in gitmodules.subsections("submodule"):
+        path = gitmodules.get("submodule", name, "path")
+        if not path or not (repo_path / path / ".git").exists():
+            return False
+    return True
+
+
+def get_probed_refs(repo: Repo) -> List[str]:
+    """Return the refs to ask the remotes about"""
+    if repo.tag:
+        return [f"refs/tags/{repo.tag}", f"refs/tags/{repo.tag}^{{}}"]
+    if repo.sha1:
+        return []
+    return [f"refs/heads/{repo.branch}"]
+
+
+def parse_ls_remote(out: str) -> Dict[str, str]:
+    res = {}
+    for line in out.splitlines():
+        sha1, _, ref = line.partition("\t")
+        if ref:
+            res[ref] = sha1
+    return res
+
+
+def branch_is_up_to_date(
+    reader: GitRefReader, repo: Repo, advertised: AdvertisedRefs
+) -> bool:
+    head_ref, head_sha1 = reader.get_head()
+    if not head_sha1 or head_ref != f"refs/heads/{repo.branch}":
+        return False
+    for remote_name, refs in advertised.items():
+        remote_sha1 = refs.get(f"refs/heads/{repo.branch}")
+        local_sha1 = reader.resolve_ref(f"refs/remotes/{remote_name}/{repo.branch}")
+        if remote_sha1 != local_sha1:
+            return False
+    upstream_ref = get_upstream_ref(reader, head_ref)
+    if not upstream_ref:
+        return False
+    return reader.resolve_ref(upstream_ref) == head_sha1
+
+
+def ref_is_up_to_date(
+    reader: GitRefReader, repo: Repo, advertised: AdvertisedRefs
+) -> bool:
+    head_ref, head_sha1 = reader.get_head()
+    if not head_sha1:
+        return False
+    if repo.orig_branch and head_ref != f"refs/heads/{repo.orig_branch}":
+        return False
+    if repo.sha1 and not head_sha1.startswith(repo.sha1):
+        return False
+    if not repo.tag:
+        return True
+
+    tag_ref = f"refs/tags/{repo.tag}"
+    local_sha1 = reader.resolve_ref(tag_ref)
+    if not local_sha1:
+        return False
+    commit = None
+    for refs in advertised.values():
+        remote_sha1 = refs.get(tag_ref)
+        if not remote_sha1:
+            continue
+        if remote_sha1 != local_sha1:
+            return False
+        # annotated tags are followed by the commit they point to
+        commit = refs.get(f"{tag_ref}^{{}}", remote_sha1)
+    if not commit:
+        return False
+    return bool(repo.sha1) or head_sha1 == commit
@@ -52,6 +52,12 @@ class Repo:
     tag: Optional[str] = None
     shallow: bool = False
     ignore_submodules: bool = False
+    # None means: use the workspace configuration
+    narrow_fetch: Optional[bool] = None
+    # Same, and an empty string means: no filter
+    clone_filter: Optional[str] = None
+    # directories to check out, see tsrc.sparse_checkout
+    sparse: Optional[List[str]] = None
     is_bare: bool = False
     # only used by RepoGrabber
     _grabbed_from_path: Optional[Path] = None
@@ -0,0 +1,61 @@
+"""
+Sparse Checkout
+
+Repos with a `sparse` key in the manifest only have the listed
+directories checked out, using `git sparse-checkout` in cone mode.
+
+The `tsrc.sparse` git config entry is set in such repos, so that
+tsrc knows the sparse checkout is its own, and can disable it
+when the `sparse` key is removed from the manifest. Sparse checkouts
+set up by hand are left alone.
+"""
+
+from pathlib import Path
+from typing import List, Optional
+
+from tsrc.git import run_git_captured
+from tsrc.git_refs import GitRefReader, UnsupportedGitLayout
+from tsrc.repo import Repo
+
+
+def normalize_sparse_paths(paths: List[str]) -> List[str]:
+    return sorted({x.strip("/") for x in paths if x.strip("/")})
+
+
+def get_managed_sparse_paths(repo_path: Path) -> Optional[List[str]]:
+    """Return the paths of the sparse checkout set by tsrc,
+    or None if tsrc did not set one.
+    """
+    try:
+        # Note: this is called for every repo, so avoid running git
+        # for repos without sparse checkout
+        managed = GitRefReader(repo_path).config.get("tsrc", "", "sparse")
+    except UnsupportedGitLayout:
+        _, managed = run_git_captured(
+            repo_path, "config", "--bool", "tsrc.sparse", check=False
+        )
+    if managed != "true":
+        return None
+    _, out = run_git_captured(repo_path, "sparse-checkout", "list", check=False)
+    return normalize_sparse_paths(out.splitlines())
+
+
+def get_sparse_checkout_cmds(repo_path: Path, repo: Repo) -> List[List[str]]:
+    """Return the git commands needed to match the `sparse` key
+    of the manifest (nothing if the repo is already up to date).
+    """
+    wanted = None
+    if repo.sparse is not None:
+        wanted = normalize_sparse_paths(repo.sparse)
+    current = get_managed_sparse_paths(repo_path)
+    if wanted == current:
+        return []
+    if wanted is None:
+        return [
+            ["sparse-checkout", "disable"],
+            ["config", "--unset", "tsrc.sparse"],
+        ]
+    return [
+        ["sparse-checkout", "set", "--cone", *wanted],
+        ["config", "--bool", "tsrc.sparse", "true"],
+    ]
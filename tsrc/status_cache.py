@@ -0,0 +1,406 @@
+"""
+Status Cache
+
+Keep the last GitStatus and GitRemote collected for each repo of the
+workspace in `<workspace>/.tsrc/status_cache/`, so that `tsrc status`
+does not need to run git for repos where nothing happened since
+the previous run.
+
+Each record is stored along with a fingerprint of the repo, made of
+cheap `stat()` calls:
+
+* `HEAD`, `config` and `packed-refs` in the git directory,
+* the entries of the index (but not their cached stat data, which
+  `git status` itself may refresh),
+* the ref HEAD points to and its upstream,
+* the tags (see tsrc.tag_index),
+* every file listed in the index, and the directories containing them,
+  so that modified files and new untracked files are noticed,
+* the untracked directories found in those, so that files created in
+  empty directories are noticed too,
+* the files telling which untracked files are ignored, besides the
+  `.gitignore` files (which are in the index): `info/exclude`, the file
+  `core.excludesFile` points to, and the system and global config files
+  where it may be set.
+
+Note that the fingerprint is computed *before* running git, so that
+changes happening while git is running are never hidden.
+
+Repos that cannot be fingerprinted (submodules, unsupported index
+format, split index, sha256 object format, files modified in the last
+couple of seconds, config includes in the global config, ...) are never
+cached. Neither are repos with untracked files: the content of untracked
+directories is not fingerprinted, so new files in them would not be
+noticed.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import struct
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from tsrc.git import GitStatus
+from tsrc.git_refs import GitConfig, GitRefReader, UnsupportedGitLayout
+from tsrc.git_remote import GitRemote
+from tsrc.repo import Remote
+from tsrc.tag_index import get_tags_stamp
+from tsrc.utils import atomic_write
+
+# Fields of GitStatus that are stored in the cache
+_GIT_STATUS_FIELDS = [
+    "empty",
+    "untracked",
+    "staged",
+    "not_staged",
+    "added",
+    "ahead",
+    "behind",
+    "dirty",
+    "tag",
+    "branch",
+    "sha1",
+    "sha1_full",
+]
+
+# Changes made during the same filesystem timestamp tick cannot
+# be told apart, so do not trust files modified too recently
+_RACY_DELAY_NS = 2 * 1_000_000_000
+
+_GITLINK_MODE = 0o160000
+
+
+class StatusCache:
+    """Usage:
+
+    >>> cache = StatusCache(workspace.root_path / ".tsrc" / "status_cache")
+    >>> fingerprint = cache.get_fingerprint(repo_path)
+    >>> cached = cache.load(repo.dest, repo_path, fingerprint, with_remote=True)
+    >>> if not cached:
+    ...     # collect statuses
+    ...     cache.store(repo.dest, fingerprint, git_status, git_remote)
+
+    """
+
+    def __init__(self, cache_path: Path) -> None:
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def get_fingerprint(self, repo_path: Path) -> Optional[str]:
+        """Return a fingerprint of the repo, or None if it cannot be cached"""
+        try:
+            return get_repo_fingerprint(repo_path)
+        except (UnsupportedGitLayout, OSError, struct.error, ValueError, IndexError):
+            # Note: ValueError, struct.error and IndexError come from
+            # truncated or corrupt index files
+            return None
+
+    def load(
+        self,
+        dest: str,
+        repo_path: Path,
+        fingerprint: Optional[str],
+        *,
+        with_remote: bool,
+    ) -> Optional[Tuple[GitStatus, Optional[GitRemote]]]:
+        """Return the statuses recorded for `dest` if the fingerprint
+        still matches.
+
+        When `with_remote` is True, records without a GitRemote
+        (stored by `tsrc status --local-git-only`) are ignored.
+        """
+        res = None
+        if fingerprint:
+            res = self._load(dest, repo_path, fingerprint, with_remote=with_remote)
+        with self._lock:
+            if res:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return res
+
+    def _load(
+        self, dest: str, repo_path: Path, fingerprint: str, *, with_remote: bool
+    ) -> Optional[Tuple[GitStatus, Optional[GitRemote]]]:
+        try:
+            record = json.loads(self._record_path(dest).read_text())
+            return self._parse_record(
+                record, dest, repo_path, fingerprint, with_remote=with_remote
+            )
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # missing or malformed record
+            return None
+
+    def _parse_record(
+        self,
+        record: Dict[str, Any],
+        dest: str,
+        repo_path: Path,
+        fingerprint: str,
+        *,
+        with_remote: bool,
+    ) -> Optional[Tuple[GitStatus, Optional[GitRemote]]]:
+        if record.get("dest") != dest or record.get("fingerprint") != fingerprint:
+            return None
+        git_status = GitStatus(repo_path)
+        for name in _GIT_STATUS_FIELDS:
+            setattr(git_status, name, record["git"][name])
+        git_remote = None
+        remote_record = record.get("remote")
+        if remote_record:
+            git_remote = GitRemote(repo_path, remote_record["branch"])
+            git_remote.remotes = [
+                Remote(name=name, url=url) for (name, url) in remote_record["remotes"]
+            ]
+            git_remote.upstreamed = remote_record["upstreamed"]
+        elif with_remote and git_status.branch:
+            return None
+        return git_status, git_remote
+
+    def store(
+        self,
+        dest: str,
+        fingerprint: Optional[str],
+        git_status: GitStatus,
+        git_remote: Optional[GitRemote],
+    ) -> None:
+        if not fingerprint or git_status.untracked:
+            return
+        record: Dict[str, Any] = {
+            "dest": dest,
+            "fingerprint": fingerprint,
+            "git": {name: getattr(git_status, name) for name in _GIT_STATUS_FIELDS},
+        }
+        if git_remote:
+            record["remote"] = {
+                "branch": git_remote.branch,
+                "remotes": [[x.name, x.url] for x in git_remote.remotes],
+                "upstreamed": git_remote.upstreamed,
+            }
+        path = self._record_path(dest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(path, json.dumps(record))
+
+    def _record_path(self, dest: str) -> Path:
+        return self.cache_path / (hashlib.sha1(dest.encode()).hexdigest() + ".json")
+
+
+def get_repo_fingerprint(repo_path: Path) -> Optional[str]:
+    now_ns = time.time_ns()
+    reader = GitRefReader(repo_path)
+    object_format = reader.config.get("extensions", "", "objectformat")
+    if object_format and object_format.lower() != "sha1":
+        # read_index_entries() only knows about 20-byte hashes
+        return None
+    if any(reader.git_dir.glob("sharedindex.*")):
+        # The index only lists the entries changed since the shared index
+        return None
+    stamps: Dict[str, Any] = {}
+    stamps["HEAD"] = _stat_stamp(reader.git_dir / "HEAD")
+    for name in ["config", "packed-refs", "info/exclude"]:
+        stamps[name] = _stat_stamp(reader.common_dir / name)
+
+    head_ref, _ = reader.get_head()
+    if head_ref:
+        stamps["head_ref"] = _stat_stamp(reader.common_dir / head_ref)
+        upstream_ref = get_upstream_ref(reader, head_ref)
+        if upstream_ref:
+            stamps["upstream_ref"] = _stat_stamp(reader.common_dir / upstream_ref)
+    stamps["tags"] = get_tags_stamp(reader)
+    stamps["excludes"] = get_excludes_stamp(reader)
+
+    worktree_stamp = get_worktree_stamp(repo_path, reader.git_dir / "index", now_ns)
+    if worktree_stamp is None:
+        return None
+    stamps["worktree"] = worktree_stamp
+    return hashlib.sha1(json.dumps(stamps, sort_keys=True).encode()).hexdigest()
+
+
+def get_upstream_ref(reader: GitRefReader, head_ref: str) -> Optional[str]:
+    """Return the remote-tracking ref for `head_ref`,
+    like `refs/remotes/origin/main`
+    """
+    if not head_ref.startswith("refs/heads/"):
+        return None
+    branch = head_ref[len("refs/heads/") :]
+    remote = reader.config.get("branch", branch, "remote")
+    merge = reader.config.get("branch", branch, "merge")
+    if not remote or not merge or not merge.startswith("refs/heads/"):
+        return None
+    if remote == ".":
+        return merge
+    return f"refs/remotes/{remote}/{merge[len('refs/heads/'):]}"
+
+
+def get_excludes_stamp(reader: GitRefReader) -> Dict[str, Any]:
+    """Stamp the system and global config files, and the file
+    `core.excludesFile` points to
+    """
+    res: Dict[str, Any] = {}
+    excludes_file = None
+    for config_path in get_user_config_paths():
+        stamp = _stat_stamp(config_path)
+        res[str(config_path)] = stamp
+        if stamp:
+            config = read_user_config(config_path, tuple(stamp))
+            excludes_file = config.get("core", "", "excludesFile") or excludes_file
+    excludes_file = reader.config.get("core", "", "excludesFile") or excludes_file
+    if excludes_file:
+        excludes_path = reader.working_path / Path(excludes_file).expanduser()
+    else:
+        excludes_path = get_xdg_config_home() / "git" / "ignore"
+    res["excludes_file"] = [str(excludes_path), _stat_stamp(excludes_path)]
+    return res
+
+
+def get_user_config_paths() -> List[Path]:
+    """Return the system and global config files, from lowest to highest
+    priority, see git-config(1)
+    """
+    res = []
+    if not os.environ.get("GIT_CONFIG_NOSYSTEM"):
+        res.append(Path(os.environ.get("GIT_CONFIG_SYSTEM") or "/etc/gitconfig"))
+    global_config = os.environ.get("GIT_CONFIG_GLOBAL")
+    if global_config:
+        res.append(Path(global_config))
+    else:
+        res.append(get_xdg_config_home() / "git" / "config")
+        res.append(Path.home() / ".gitconfig")
+    return res
+
+
+def get_xdg_config_home() -> Path:
+    return Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config")
+
+
+@functools.lru_cache(maxsize=8)
+def read_user_config(path: Path, stamp: Tuple[int, ...]) -> GitConfig:
+    """Read a system or global config file. The stamp of the file
+    is only used as a cache key, so that it is read once per process
+    as long as it does not change.
+    """
+    try:
+        text = path.read_text()
+    except (OSError, UnicodeDecodeError) as e:
+        raise UnsupportedGitLayout(f"cannot read {path}: {e}")
+    res = GitConfig.from_text(text)
+    if res.has_section("include") or res.has_section("includeif"):
+        raise UnsupportedGitLayout("config includes are not supported")
+    return res
+
+
+def get_worktree_stamp(repo_path: Path, index_path: Path, now_ns: int) -> Optional[str]:
+    """Hash the entries of the index, along with the stat() of every
+    file in the index, of the directories containing them, and of the
+    untracked directories in those.
+
+    Return None when this is not enough to notice changes in the worktree.
+    """
+    entries = read_index_entries(index_path)
+    if entries is None:
+        return None
+    digest = hashlib.sha1()
+    dirs = {""}
+    for path, mode, key in entries:
+        digest.update(key)
+        if mode == _GITLINK_MODE:
+            # Changes inside submodules are reported by `git status`
+            # but not visible from here
+            return None
+        stamp = _stat_stamp(repo_path / path)
+        if stamp and stamp[1] > now_ns - _RACY_DELAY_NS:
+            return None
+        digest.update(f"{path}\0{stamp}\0".encode(errors="surrogateescape"))
+        parent = os.path.dirname(path)
+        while parent not in dirs:
+            dirs.add(parent)
+            parent = os.path.dirname(parent)
+    for dir_path in sorted(dirs | get_untracked_dirs(repo_path, dirs)):
+        stamp = _stat_stamp(repo_path / dir_path)
+        if stamp and stamp[1] > now_ns - _RACY_DELAY_NS:
+            return None
+        digest.update(f"{dir_path}/\0{stamp}\0".encode(errors="surrogateescape"))
+    return digest.hexdigest()
+
+
+def get_untracked_dirs(repo_path: Path, dirs: Set[str]) -> Set[str]:
+    """Return the directories found in `dirs` which are not in `dirs`
+    themselves.
+
+    Note: they are not walked: as repos with untracked files are not
+    cached, there is nothing in them but ignored files and empty
+    directories, and stat() of the directory is enough to notice
+    a new file in it.
+    """
+    res = set()
+    for dir_path in dirs:
+        try:
+            with os.scandir(repo_path / dir_path) as entries:
+                for entry in entries:
+                    if entry.name == ".git" or not entry.is_dir(follow_symlinks=False):
+                        continue
+                    path = os.path.join(dir_path, entry.name)
+                    if path not in dirs:
+                        res.add(path)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    return res
+
+
+def read_index_entries(index_path: Path) -> Optional[List[Tuple[str, int, bytes]]]:
+    """Return the path and mode of every entry in the git index, along
+    with the raw sha1 and flags of the entry.
+
+    Return None for formats we do not support: index version 4, which
+    compresses path names, and split indexes (with a `link` extension),
+    whose entries are partly stored in a shared index.
+    """
+    try:
+        data = index_path.read_bytes()
+    except FileNotFoundError:
+        return []
+    if len(data) < 12 or data[:4] != b"DIRC":
+        return None
+    version, count = struct.unpack(">II", data[4:12])
+    if version not in (2, 3):
+        return None
+    res = []
+    offset = 12
+    for _ in range(count):
+        # ctime, mtime, dev, ino, mode, uid, gid, size, sha1, flags
+        (mode,) = struct.unpack(">I", data[offset + 24 : offset + 28])
+        (flags,) = struct.unpack(">H", data[offset + 60 : offset + 62])
+        header_size = 62
+        if flags & 0x4000:
+            # extended flags
+            header_size += 2
+        name_start = offset + header_size
+        name_end = data.index(b"\0", name_start)
+        path = data[name_start:name_end].decode(errors="surrogateescape")
+        res.append((path, mode, data[offset + 40 : name_start]))
+        # Entries are padded with 1 to 8 NUL bytes
+        offset += (header_size + name_end - name_start + 8) & ~7
+    # Then come the extensions, each with a 4-byte signature and a
+    # 4-byte size, and the trailing 20-byte checksum
+    end = len(data) - 20
+    while offset + 8 <= end:
+        signature = data[offset : offset + 4]
+        if signature == b"link":
+            return None
+        (size,) = struct.unpack(">I", data[offset + 4 : offset + 8])
+        offset += 8 + size
+    return res
+
+
+def _stat_stamp(path: Path) -> Optional[List[int]]:
+    try:
+        stat = path.lstat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
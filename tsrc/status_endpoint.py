@@ -4,6 +4,7 @@ from typing import Dict, List, Optional, Tuple, Union
 
 import cli_ui as ui
 
+from tsrc.bare_cache import BareCache
 from tsrc.errors import MissingRepoError
 from tsrc.executor import Outcome, Task
 from tsrc.git import GitBareStatus, GitStatus, get_git_bare_status, get_git_status
@@ -11,6 +12,7 @@ from tsrc.git_remote import GitRemote, get_git_remotes
 from tsrc.manifest import Manifest
 from tsrc.manifest_common_data import ManifestsTypeOfData
 from tsrc.repo import Repo
+from tsrc.status_cache import StatusCache
 from tsrc.utils import erase_last_line
 from tsrc.workspace import Workspace
 
@@ -76,6 +78,7 @@ class StatusCollector(Task[Repo]):
         workspace: Workspace,
         only_full_status: bool = False,
         ignore_group_item: bool = False,
+        use_cache: bool = False,
     ) -> None:
         self.workspace = workspace
         if ignore_group_item is True:
@@ -83,6 +86,8 @@ class StatusCollector(Task[Repo]):
         else:
             self.manifest = workspace.get_manifest()
         self.only_full_status = only_full_status
+        self.status_cache = get_status_cache(workspace) if use_cache else None
+        self.bare_cache = BareCache.for_workspace(workspace.root_path)
         self.statuses: CollectedAllStatuses = collections.OrderedDict()
 
     def describe_item(self, item: Repo) -> str:
@@ -100,7 +105,7 @@ class StatusCollector(Task[Repo]):
         # of calling OutcomeCollection.print_summary()
         self.info_count(index, count, repo.dest, end="\r")
         if repo.is_bare is True and self.only_full_status is False:
-            self._process_bare(Path(repo.dest), repo)
+            self._process_bare(self.bare_cache.get_repo_path(repo.clone_url), repo)
         else:
             full_path = self.workspace.root_path / repo.dest
             if not full_path.exists():
@@ -112,7 +117,7 @@ class StatusCollector(Task[Repo]):
 
     def _process_bare(self, full_path: Path, repo: Repo) -> None:
         git_bare_status = get_git_bare_status(
-            full_path, repo.remotes[0].name, repo.remotes[0].url
+            full_path, repo.remotes[0].name, repo.branch, repo.sha1
         )
         if repo._bare_clone_is_ok is False:
             git_bare_status.is_ok = False
@@ -122,10 +127,7 @@ class StatusCollector(Task[Repo]):
 
     def _process_default(self, full_path: Path, repo: Repo) -> None:
         try:
-            git_status = get_git_status(full_path)
-            git_remote: Union[GitRemote, None] = None
-            if git_status.branch:
-                git_remote = get_git_remotes(full_path, git_status.branch)
+            git_status, git_remote = self._get_git_statuses(full_path, repo)
             manifest_status = ManifestStatus(repo, manifest=self.manifest)
             manifest_status.update(git_status, git_remote)
             status = Status(
@@ -135,6 +137,25 @@ class StatusCollector(Task[Repo]):
         except Exception as e:
             self.statuses[repo.dest] = e
 
+    def _get_git_statuses(
+        self, full_path: Path, repo: Repo
+    ) -> Tuple[GitStatus, Union[GitRemote, None]]:
+        fingerprint = None
+        if self.status_cache:
+            fingerprint = self.status_cache.get_fingerprint(full_path)
+            cached = self.status_cache.load(
+                repo.dest, full_path, fingerprint, with_remote=True
+            )
+            if cached:
+                return cached
+        git_status = get_git_status(full_path)
+        git_remote: Union[GitRemote, None] = None
+        if git_status.branch:
+            git_remote = get_git_remotes(full_path, git_status.branch)
+        if self.status_cache:
+            self.status_cache.store(repo.dest, fingerprint, git_status, git_remote)
+        return git_status, git_remote
+
 
 class StatusCollectorLocalOnly(Task[Repo]):
     """Implement a Task to collect local git status and
@@ -144,12 +165,18 @@ class StatusCollectorLocalOnly(Task[Repo]):
     can be time consuming.
     """
 
-    def __init__(self, workspace: Workspace, ignore_group_item: bool = False) -> None:
+    def __init__(
+        self,
+        workspace: Workspace,
+        ignore_group_item: bool = False,
+        use_cache: bool = False,
+    ) -> None:
         self.workspace = workspace
         if ignore_group_item is True:
             self.manifest = workspace.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
         else:
             self.manifest = workspace.get_manifest()
+        self.status_cache = get_status_cache(workspace) if use_cache else None
         self.statuses: CollectedStatuses = collections.OrderedDict()
 
     def describe_item(self, item: Repo) -> str:
@@ -170,7 +197,7 @@ class StatusCollectorLocalOnly(Task[Repo]):
         if not full_path.exists():
             self.statuses[repo.dest] = MissingRepoError(repo.dest)
         try:
-            git_status = get_git_status(full_path)
+            git_status = self._get_git_status(full_path, repo)
             manifest_status = ManifestStatus(repo, manifest=self.manifest)
             manifest_status.update(git_status, None)
             status = Status(git=git_status, git_remote=None, manifest=manifest_status)
@@ -181,6 +208,24 @@ class StatusCollectorLocalOnly(Task[Repo]):
             erase_last_line()
         return Outcome.empty()
 
+    def _get_git_status(self, full_path: Path, repo: Repo) -> GitStatus:
+        fingerprint = None
+        if self.status_cache:
+            fingerprint = self.status_cache.get_fingerprint(full_path)
+            cached = self.status_cache.load(
+                repo.dest, full_path, fingerprint, with_remote=False
+            )
+            if cached:
+                return cached[0]
+        git_status = get_git_status(full_path)
+        if self.status_cache:
+            self.status_cache.store(repo.dest, fingerprint, git_status, None)
+        return git_status
+
+
+def get_status_cache(workspace: Workspace) -> StatusCache:
+    return StatusCache(workspace.root_path / ".tsrc" / "status_cache")
+
 
 class BareStatus:
     """Wrapper class for both ManifestStatus and GitStatus"""
@@ -0,0 +1,172 @@
+"""
+Sync Journal
+
+Record the progress of `tsrc sync` in `<workspace>/.tsrc/sync_journal`,
+so that an interrupted sync (Ctrl-C, CI timeout, ...)
+can be resumed without processing the repos that were already done.
+
+The journal is a text file, with one JSON object per line:
+
+* the first line contains the sha1 of the manifest commit the
+  workspace is synced to,
+* each following line records a stage completed by a task for a repo,
+  like `{"task": "sync", "dest": "foo", "stage": "fetched"}`,
+* or whether the sync ran to completion, like `{"finished": true}`.
+
+Lines are only ever appended, so that recording a stage is cheap
+even for workspaces with thousands of repos, and so that the journal
+stays readable whenever the sync is interrupted (an incomplete last
+line is ignored).
+
+The journal is removed once the sync succeeds. When it is still there
+and the manifest commit did not change (or when `--resume` is used),
+the next sync resumes from it.
+
+When the sync ran to completion but some repos failed (a dirty worktree,
+a wrong branch, ...), the journal is kept but marked as finished: the
+next sync starts over, so that the repos that were synced get fetched
+again, unless `--resume` is used to only retry the failed ones.
+"""
+
+import json
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Set, TextIO, Tuple, Union
+
+# Stages shared by all tasks
+DONE = "done"
+
+
+class SyncJournal:
+    """Usage:
+
+    >>> journal = SyncJournal.for_workspace(workspace.root_path)
+    >>> journal.start(manifest_sha1)
+    >>> cloner = Cloner(..., journal=journal.for_task("clone"))
+    >>> ...
+    >>> journal.finish()  # or journal.end_with_errors()
+
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.manifest_sha1: Optional[str] = None
+        # True if the sync ran to completion, with errors
+        self.finished = False
+        # (task name, dest) -> completed stages
+        self.stages: Dict[Tuple[str, str], Set[str]] = {}
+        self._fp: Optional[TextIO] = None
+        self._lock = Lock()
+
+    @classmethod
+    def for_workspace(cls, root_path: Path) -> "SyncJournal":
+        return cls(root_path / ".tsrc" / "sync_journal")
+
+    def load(self) -> bool:
+        """Load the existing journal, if any"""
+        try:
+            lines = self.path.read_text().splitlines()
+        except OSError:
+            return False
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # interrupted while writing
+                break
+        if not records or "manifest" not in records[0]:
+            return False
+        self.manifest_sha1 = records[0]["manifest"]
+        for record in records[1:]:
+            if "finished" in record:
+                self.finished = bool(record["finished"])
+                continue
+            key = (record["task"], record["dest"])
+            self.stages.setdefault(key, set()).add(record["stage"])
+        return True
+
+    def start(self, manifest_sha1: str, *, resume: bool = False) -> bool:
+        """Start recording the progress of the sync.
+
+        Return True if the previous sync is resumed: that is when it was
+        interrupted while syncing to the same manifest commit, or
+        when `resume` is True (even if it finished with errors).
+        """
+        found = self.load()
+        if resume:
+            resumed = found
+        else:
+            # Not after a sync that finished with errors: the repos it synced
+            # may have to be fetched again
+            interrupted = found and not self.finished
+            resumed = interrupted and self.manifest_sha1 == manifest_sha1
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resumed:
+            self._fp = self.path.open("a")
+            if self.finished:
+                self.finished = False
+                self._write({"finished": False})
+        else:
+            self.finished = False
+            self.stages = {}
+            self._fp = self.path.open("w")
+            self._write({"manifest": manifest_sha1})
+        self.manifest_sha1 = manifest_sha1
+        return resumed
+
+    def finish(self) -> None:
+        """Called when the sync succeeded: nothing is left to resume"""
+        if self._fp:
+            self._fp.close()
+            self._fp = None
+        self.path.unlink(missing_ok=True)
+        self.stages = {}
+
+    def end_with_errors(self) -> None:
+        """Called when the sync ran to completion, but some repos failed:
+        the journal is only resumed by `--resume` from now on
+        """
+        with self._lock:
+            self.finished = True
+            self._write({"finished": True})
+        if self._fp:
+            self._fp.close()
+            self._fp = None
+
+    def for_task(self, task_name: str) -> "TaskJournal":
+        return TaskJournal(self, task_name)
+
+    def has(self, task_name: str, dest: str, stage: str) -> bool:
+        with self._lock:
+            return stage in self.stages.get((task_name, dest), set())
+
+    def record(self, task_name: str, dest: str, stage: str) -> None:
+        with self._lock:
+            self.stages.setdefault((task_name, dest), set()).add(stage)
+            self._write({"task": task_name, "dest": dest, "stage": stage})
+
+    def _write(self, record: Dict[str, Union[str, bool]]) -> None:
+        if not self._fp:
+            return
+        self._fp.write(json.dumps(record) + "\n")
+        # Note: flush, but do not fsync - this is about surviving
+        # an interrupted tsrc process, not a power failure
+        self._fp.flush()
+
+
+class TaskJournal:
+    """The stages recorded for one task"""
+
+    def __init__(self, journal: SyncJournal, task_name: str) -> None:
+        self.journal = journal
+        self.task_name = task_name
+
+    def has(self, dest: str, stage: str) -> bool:
+        return self.journal.has(self.task_name, dest, stage)
+
+    def record(self, dest: str, stage: str) -> None:
+        self.journal.record(self.task_name, dest, stage)
+
+    def is_done(self, dest: str) -> bool:
+        return self.has(dest, DONE)
@@ -1,12 +1,28 @@
+import asyncio
+import functools
 from pathlib import Path
 from typing import List, Optional, Tuple
 
 import cli_ui as ui
 
+from tsrc.cloner import get_clone_filter
 from tsrc.errors import Error
-from tsrc.executor import Outcome, Task
-from tsrc.git import get_current_branch, get_git_status, run_git_captured
+from tsrc.executor import Outcome, ResourceClass, Task
+from tsrc.git import (
+    fetch_shallow_commit,
+    get_current_branch,
+    get_git_status,
+    has_commit,
+    is_full_sha1,
+    is_shallow,
+    run_git_captured,
+    run_git_captured_async,
+)
+from tsrc.git_refs import GitRefReader
+from tsrc.git_remote import get_url_host
 from tsrc.repo import Remote, Repo
+from tsrc.sparse_checkout import get_sparse_checkout_cmds
+from tsrc.sync_journal import DONE, TaskJournal
 
 
 class IncorrectBranch(Error):
@@ -26,6 +42,46 @@ class IncorrectBranch(Error):
             self.message = f"Not on any branch. Expected branch: '{expected}'"
 
 
+# Stages recorded in the sync journal, see tsrc.sync_journal
+FETCHED = "fetched"
+UPDATED = "updated"
+
+
+def pick_remotes(repo: Repo, remote_name: Optional[str]) -> List[Remote]:
+    """Return the remotes to fetch when syncing the repo: all of them,
+    or only the one called `remote_name` if set.
+    """
+    if remote_name:
+        for remote in repo.remotes:
+            if remote.name == remote_name:
+                return [remote]
+        message = f"Remote {remote_name} not found for repository {repo.dest}"
+        raise Error(message)
+
+    return repo.remotes
+
+
+def get_filter_args(
+    repo_path: Path, repo: Repo, remote: Remote, default_filter: Optional[str]
+) -> List[str]:
+    """Return the `--filter` option to use when fetching from the remote.
+
+    Note: this is only possible from the remote a partial clone was made
+    from (the "promisor" remote), so the filter is not used for repos
+    cloned before it was configured.
+    """
+    clone_filter = get_clone_filter(repo, default_filter)
+    if not clone_filter:
+        return []
+    try:
+        config = GitRefReader(repo_path).config
+    except Error:
+        return []
+    if config.get("remote", remote.name, "promisor") != "true":
+        return []
+    return [f"--filter={clone_filter}"]
+
+
 class Syncer(Task[Repo]):
     def __init__(
         self,
@@ -34,11 +90,21 @@ class Syncer(Task[Repo]):
         force: bool = False,
         remote_name: Optional[str] = None,
         correct_branch: bool = False,
+        narrow_fetch: bool = False,
+        clone_filter: Optional[str] = None,
+        journal: Optional[TaskJournal] = None,
+        locked: bool = False,
     ) -> None:
         self.workspace_path = workspace_path
         self.force = force
         self.remote_name = remote_name
         self.correct_branch = correct_branch
+        self.narrow_fetch = narrow_fetch
+        self.clone_filter = clone_filter
+        self.journal = journal
+        # Whether the repos are frozen at the commits of
+        # the lock file, see tsrc.manifest_lock
+        self.locked = locked
 
     def describe_item(self, item: Repo) -> str:
         return item.dest
@@ -60,11 +126,64 @@ class Syncer(Task[Repo]):
         * or try merging the local branch with its upstream (abort if not
           on on the correct branch, or if the merge is not fast-forward).
         """
-        error = None
         self.info_count(index, count, "Synchronizing", repo.dest)
-        self.fetch(repo)
+        if not self.has_stage(repo, FETCHED):
+            self.fetch(repo)
+            self.record_stage(repo, FETCHED)
+        return self.update(repo)
+
+    async def process_async(self, index: int, count: int, repo: Repo) -> Outcome:
+        # Note: only `git fetch` is awaited, the rest is run
+        # in the default thread pool.
+        self.info_count(index, count, "Synchronizing", repo.dest)
+        if not self.has_stage(repo, FETCHED):
+            await self.fetch_async(repo)
+            self.record_stage(repo, FETCHED)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, functools.partial(self.update, repo))
+
+    def has_stage(self, repo: Repo, stage: str) -> bool:
+        """Whether the stage was completed by an interrupted sync,
+        see tsrc.sync_journal
+        """
+        return self.journal is not None and self.journal.has(repo.dest, stage)
+
+    def record_stage(self, repo: Repo, stage: str) -> None:
+        if self.journal:
+            self.journal.record(repo.dest, stage)
+
+    def update(self, repo: Repo) -> Outcome:
+        """Update a repo which has just been fetched."""
+        error = None
+        summary_lines: List[str] = []
+        if not self.has_stage(repo, UPDATED):
+            with self.use_resource(ResourceClass.LOCAL):
+                error, summary_lines = self.update_worktree(repo)
+            if not error:
+                self.record_stage(repo, UPDATED)
+
+        if not repo.ignore_submodules:
+            # Note: submodules may have to be fetched
+            with self.use_resource(ResourceClass.NETWORK):
+                submodule_line = self.update_submodules(repo)
+            if submodule_line:
+                summary_lines.append(submodule_line)
+
+        if not error:
+            self.record_stage(repo, DONE)
+        summary = "\n".join(summary_lines)
+        return Outcome(error=error, summary=summary)
 
+    def update_worktree(self, repo: Repo) -> Tuple[Optional[Error], List[str]]:
+        """Reset or merge the repo, depending on its configuration.
+
+        Return an optional error, and the lines of the summary.
+        """
+        error = None
         summary_lines = []
+        # Note: done first, so that merging does not check out
+        # directories about to be removed from the sparse checkout
+        sparse_line = self.update_sparse_checkout(repo)
         ref = None
         if repo.sha1:
             ref = repo.sha1
@@ -85,13 +204,27 @@ class Syncer(Task[Repo]):
                 title = f"{repo.dest} on {current_branch}"
                 summary_lines += [title, "-" * len(title), sync_summary]
 
-        if not repo.ignore_submodules:
-            submodule_line = self.update_submodules(repo)
-            if submodule_line:
-                summary_lines.append(submodule_line)
+        if sparse_line:
+            if not summary_lines:
+                summary_lines += [repo.dest, "-" * len(repo.dest)]
+            summary_lines.append(sparse_line)
+        return error, summary_lines
 
-        summary = "\n".join(summary_lines)
-        return Outcome(error=error, summary=summary)
+    def update_sparse_checkout(self, repo: Repo) -> str:
+        """Make the sparse checkout match the `sparse` key of the manifest."""
+        repo_path = self.workspace_path / repo.dest
+        cmds = get_sparse_checkout_cmds(repo_path, repo)
+        if not cmds:
+            return ""
+        self.info_3("Updating sparse checkout")
+        try:
+            for cmd in cmds:
+                self.run_git(repo_path, *cmd)
+        except Error:
+            raise Error("updating sparse checkout failed")
+        if repo.sparse is None:
+            return "Sparse checkout disabled"
+        return "Sparse checkout set to: " + ", ".join(repo.sparse)
 
     def check_or_change_branch(self, repo: Repo) -> Tuple[Optional[Error], str]:
         """Check that the current branch:
@@ -141,24 +274,121 @@ class Syncer(Task[Repo]):
         return current_branch
 
     def _pick_remotes(self, repo: Repo) -> List[Remote]:
-        if self.remote_name:
-            for remote in repo.remotes:
-                if remote.name == self.remote_name:
-                    return [remote]
-            message = f"Remote {self.remote_name} not found for repository {repo.dest}"
-            raise Error(message)
+        return pick_remotes(repo, self.remote_name)
+
+    def _get_fetch_cmd(self, remote: Remote) -> List[str]:
+        cmd = ["fetch", "--tags", "--prune", remote.name]
+        if self.force:
+            cmd.append("--force")
+        return cmd
+
+    def use_narrow_fetch(self, repo: Repo) -> bool:
+        if self.locked:
+            return True
+        if repo.narrow_fetch is not None:
+            return repo.narrow_fetch
+        return self.narrow_fetch
+
+    def get_narrow_refspecs(self, repo: Repo, remote: Remote) -> Optional[List[str]]:
+        """Return the refspecs needed to sync the repo, or None if all refs
+        and tags must be fetched.
+
+        Note: an empty list means there is nothing to fetch at all.
+        """
+        repo_path = self.workspace_path / repo.dest
+        if self.locked and repo.sha1:
+            # Only the locked commit is needed, and the lock file
+            # only contains full sha1s
+            return [] if has_commit(repo_path, repo.sha1) else [repo.sha1]
+        refspecs = []
+        if repo.sha1 or repo.tag:
+            # the branch is only needed to stay on it, see sync_repo_to_ref()
+            branch = repo.orig_branch
+        else:
+            branch = repo.branch
+        if branch:
+            refspecs.append(f"+refs/heads/{branch}:refs/remotes/{remote.name}/{branch}")
+        if repo.tag:
+            refspecs.append(f"refs/tags/{repo.tag}:refs/tags/{repo.tag}")
+        if repo.sha1 and not has_commit(repo_path, repo.sha1):
+            if not is_full_sha1(repo.sha1):
+                # abbreviated sha1s cannot be fetched
+                return None
+            refspecs.append(repo.sha1)
+        return refspecs
+
+    def get_fetch_cmds(self, repo: Repo, remote: Remote) -> List[List[str]]:
+        """Return the commands to try in turn to fetch from the remote.
+
+        In narrow fetch mode, only the branch, tag or sha1 used by the repo
+        are fetched. Should this fail (for instance because the server does
+        not allow fetching a sha1 directly), all refs and tags are fetched.
+        """
+        filter_args = self.get_filter_args(repo, remote)
+        wide_cmd = self._get_fetch_cmd(remote) + filter_args
+        if not self.use_narrow_fetch(repo):
+            return [wide_cmd]
+        refspecs = self.get_narrow_refspecs(repo, remote)
+        if refspecs is None:
+            return [wide_cmd]
+        if not refspecs:
+            return []
+        narrow_cmd = ["fetch", "--no-tags", remote.name, *refspecs]
+        if self.force:
+            narrow_cmd.append("--force")
+        return [narrow_cmd + filter_args, wide_cmd]
+
+    def get_filter_args(self, repo: Repo, remote: Remote) -> List[str]:
+        repo_path = self.workspace_path / repo.dest
+        return get_filter_args(repo_path, repo, remote, self.clone_filter)
 
-        return repo.remotes
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            remotes = self._pick_remotes(item)
+        except Error:
+            # will be reported when processing the item
+            return None
+        return get_url_host(remotes[0].url) if remotes else None
 
     def fetch(self, repo: Repo) -> None:
         repo_path = self.workspace_path / repo.dest
         for remote in self._pick_remotes(repo):
             try:
                 self.info_3("Fetching", remote.name)
-                cmd = ["fetch", "--tags", "--prune", remote.name]
-                if self.force:
-                    cmd.append("--force")
-                self.run_git(repo_path, *cmd)
+                cmds = self.get_fetch_cmds(repo, remote)
+                host = get_url_host(remote.url)
+                with self.use_resource(ResourceClass.NETWORK, host):
+                    for cmd in cmds[:-1]:
+                        rc, _ = run_git_captured(
+                            repo_path, *cmd, check=False, no_auto_gc=True
+                        )
+                        if rc == 0:
+                            break
+                    else:
+                        if cmds:
+                            self.run_git(repo_path, *cmds[-1], no_auto_gc=True)
+            except Error:
+                raise Error(f"fetch from '{remote.name}' failed")
+
+    async def fetch_async(self, repo: Repo) -> None:
+        repo_path = self.workspace_path / repo.dest
+        for remote in self._pick_remotes(repo):
+            try:
+                self.info_3("Fetching", remote.name)
+                cmds = self.get_fetch_cmds(repo, remote)
+                host = get_url_host(remote.url)
+                async with self.use_resource_async(ResourceClass.NETWORK, host):
+                    for cmd in cmds[:-1]:
+                        rc, _ = await run_git_captured_async(
+                            repo_path, *cmd, check=False, no_auto_gc=True
+                        )
+                        if rc == 0:
+                            break
+                    else:
+                        if cmds:
+                            await self.run_git_async(
+                                repo_path, *cmds[-1], no_auto_gc=True
+                            )
             except Error:
                 raise Error(f"fetch from '{remote.name}' failed")
 
@@ -167,14 +397,43 @@ class Syncer(Task[Repo]):
         status = get_git_status(repo_path)
         if status.dirty:
             raise Error(f"git repo is dirty: cannot sync to ref: {ref}")
+        if ref == repo.sha1 and is_shallow(repo_path):
+            self.fetch_shallow_commit(repo, ref)
         try:
-            if repo.orig_branch:
+            if self.locked and repo.orig_branch:
+                self.sync_repo_to_locked_sha1(repo, ref, repo.orig_branch)
+            elif repo.orig_branch:
                 self.sync_repo_to_ref_and_branch(repo, ref, repo.orig_branch)
             else:
                 self.run_git(repo_path, "reset", "--hard", ref)
         except Error:
             raise Error("updating ref failed")
 
+    def fetch_shallow_commit(self, repo: Repo, sha1: str) -> None:
+        """Fetch a sha1 missing from a shallow repo, see
+        tsrc.git.fetch_shallow_commit()
+        """
+        repo_path = self.workspace_path / repo.dest
+        if has_commit(repo_path, sha1):
+            return
+        remote = self._pick_remotes(repo)[0]
+        branch = repo.orig_branch or repo.branch or "master"
+        self.info_3("Fetching", sha1, "from", remote.name)
+        with self.use_resource(ResourceClass.NETWORK, get_url_host(remote.url)):
+            try:
+                fetch_shallow_commit(repo_path, remote.name, sha1, branch=branch)
+            except Error as e:
+                raise Error(f"fetching {sha1} failed: {e.message}")
+
+    def sync_repo_to_locked_sha1(self, repo: Repo, sha1: str, branch: str) -> None:
+        """Put the branch at the locked commit.
+
+        No need to look for the branch containing the commit, as this
+        is where `tsrc lock` found it.
+        """
+        repo_path = self.workspace_path / repo.dest
+        self.run_git(repo_path, "checkout", "-B", branch, sha1)
+
     def sync_repo_to_ref_and_branch(
         self, repo: Repo, ref: str, orig_branch: str
     ) -> None:
@@ -286,10 +545,10 @@ class Syncer(Task[Repo]):
         repo_path = self.workspace_path / repo.dest
         cmd = ("submodule", "update", "--init", "--recursive")
         if self.parallel:
-            _, out = run_git_captured(repo_path, *cmd, check=True)
+            _, out = run_git_captured(repo_path, *cmd, check=True, no_auto_gc=True)
             return out
         else:
-            self.run_git(repo_path, *cmd)
+            self.run_git(repo_path, *cmd, no_auto_gc=True)
             return ""
 
     def sync_repo_to_branch(self, repo: Repo, *, current_branch: str) -> str:
@@ -304,7 +563,12 @@ class Syncer(Task[Repo]):
             if rc == 0 and not out:
                 return ""
             _, merge_output = run_git_captured(
-                repo_path, "merge", "--ff-only", "@{upstream}", check=True
+                repo_path,
+                "merge",
+                "--ff-only",
+                "@{upstream}",
+                check=True,
+                no_auto_gc=True,
             )
             return merge_output
         else:
@@ -312,7 +576,9 @@ class Syncer(Task[Repo]):
             # is not captured, so the diffstat or the "Already up to
             # date"  message are directly shown to the user
             try:
-                self.run_git(repo_path, "merge", "--ff-only", "@{upstream}")
+                self.run_git(
+                    repo_path, "merge", "--ff-only", "@{upstream}", no_auto_gc=True
+                )
             except Error:
                 raise Error("updating branch failed")
             return ""
@@ -0,0 +1,201 @@
+"""
+Tag Index
+
+Map each commit sha1 to the tags pointing at it, so that finding
+the tag of HEAD (like `git tag --points-at HEAD` does) is a simple
+dictionary lookup, even in repositories containing many tags.
+
+The index is built from `packed-refs` and the loose refs in
+`refs/tags`, using the peeled values of annotated tags, and is
+stored in `<workspace>/.tsrc/tag_index/` when the repository is
+part of a workspace.
+
+Each index records the state of the files it was built from
+(inode, size and modification time of `packed-refs` and of every
+loose tag), so that it is only rebuilt when tags are added, removed
+or updated.
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from tsrc.git_refs import GitRefReader, UnsupportedGitLayout
+from tsrc.utils import atomic_write
+
+# (sha1, ref name, peeled sha1)
+TagRecord = Tuple[str, str, Optional[str]]
+
+_MAX_PEEL_DEPTH = 5
+
+
+class TagIndex:
+    """Usage:
+
+    >>> index = TagIndex.for_repo(GitRefReader(repo_path), list_tags=...)
+    >>> index.get_tags(sha1)
+    ["v1.0", "v1.0-rc1"]
+
+    """
+
+    def __init__(self, stamp: Dict[str, Any], tags: Dict[str, List[str]]) -> None:
+        self.stamp = stamp
+        self.tags = tags
+
+    @classmethod
+    def for_repo(
+        cls,
+        reader: GitRefReader,
+        *,
+        list_tags: Callable[[], Iterable[TagRecord]],
+        cache_dir: Optional[Path] = None,
+    ) -> "TagIndex":
+        """Return the index for the repository read by `reader`,
+        loading it from the cache if it is still valid, or building
+        it (and then saving it) otherwise.
+
+        `list_tags` is used when the tags cannot be read directly,
+        for instance when annotated tag objects are packed.
+        """
+        if cache_dir is None:
+            cache_dir = find_tag_index_dir(reader.working_path)
+        stamp = get_tags_stamp(reader)
+        cache_path = None
+        if cache_dir:
+            key = str(reader.common_dir.resolve()).encode()
+            cache_path = cache_dir / (hashlib.sha1(key).hexdigest() + ".json")
+            cached = cls.load(cache_path)
+            if cached and cached.stamp == stamp:
+                return cached
+
+        try:
+            records = list(read_tags(reader))
+        except UnsupportedGitLayout:
+            records = list(list_tags())
+        res = cls.from_records(stamp, records)
+        if cache_path:
+            res.save(cache_path)
+        return res
+
+    @classmethod
+    def from_records(
+        cls, stamp: Dict[str, Any], records: Iterable[TagRecord]
+    ) -> "TagIndex":
+        tags: Dict[str, List[str]] = {}
+        for sha1, ref_name, peeled in records:
+            name = ref_name[len("refs/tags/") :]
+            tags.setdefault(peeled or sha1, []).append(name)
+        for names in tags.values():
+            names.sort()
+        return cls(stamp, tags)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["TagIndex"]:
+        try:
+            parsed = json.loads(path.read_text())
+            return cls(parsed["stamp"], parsed["tags"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Note: several repos may share the same cache directory, and
+        # tsrc may run in parallel, so write atomically
+        atomic_write(path, json.dumps({"stamp": self.stamp, "tags": self.tags}))
+
+    def get_tags(self, sha1: str) -> List[str]:
+        return self.tags.get(sha1, [])
+
+
+def find_tag_index_dir(working_path: Path) -> Optional[Path]:
+    """Return `.tsrc/tag_index` for the workspace containing `working_path`,
+    if any.
+    """
+    for path in [working_path.resolve(), *working_path.resolve().parents]:
+        tsrc_path = path / ".tsrc"
+        if tsrc_path.is_dir():
+            return tsrc_path / "tag_index"
+    return None
+
+
+def get_tags_stamp(reader: GitRefReader) -> Dict[str, Any]:
+    """Describe the state of the files the tags are read from."""
+    res: Dict[str, Any] = {
+        "packed_refs": _stat_stamp(reader.common_dir / "packed-refs")
+    }
+    res["loose"] = {
+        ref_name: _stat_stamp(path) for ref_name, path in _iter_loose_tags(reader)
+    }
+    return res
+
+
+def read_tags(reader: GitRefReader) -> Iterable[TagRecord]:
+    """Read all the tags of the repository, packed and loose, along
+    with their peeled value.
+
+    Raise UnsupportedGitLayout when peeled values are unknown.
+    """
+    res: Dict[str, TagRecord] = {}
+    if reader.has_packed_refs() and "peeled" not in reader.get_packed_refs_traits():
+        raise UnsupportedGitLayout("packed-refs does not contain peeled values")
+    for sha1, ref_name, peeled in reader.iter_packed_refs():
+        if ref_name.startswith("refs/tags/"):
+            res[ref_name] = (sha1, ref_name, peeled)
+    for ref_name, _ in _iter_loose_tags(reader):
+        loose_sha1 = reader.resolve_ref(ref_name)
+        if loose_sha1:
+            res[ref_name] = (loose_sha1, ref_name, peel_tag(reader, loose_sha1))
+    return res.values()
+
+
+def peel_tag(reader: GitRefReader, sha1: str) -> Optional[str]:
+    """Return the object an annotated tag points to, or None
+    if `sha1` is not a tag object.
+
+    Only loose objects can be read.
+    """
+    res = None
+    for _ in range(_MAX_PEEL_DEPTH):
+        object_type, contents = read_loose_object(reader, sha1)
+        if object_type != b"tag":
+            return res
+        first_line = contents.split(b"\n", 1)[0]
+        if not first_line.startswith(b"object "):
+            raise UnsupportedGitLayout(f"cannot parse tag object {sha1}")
+        sha1 = first_line[len(b"object ") :].decode()
+        res = sha1
+    raise UnsupportedGitLayout(f"too many levels of tags for {sha1}")
+
+
+def read_loose_object(reader: GitRefReader, sha1: str) -> Tuple[bytes, bytes]:
+    path = reader.common_dir / "objects" / sha1[:2] / sha1[2:]
+    try:
+        data = zlib.decompress(path.read_bytes())
+    except FileNotFoundError:
+        raise UnsupportedGitLayout(f"object {sha1} is not a loose object")
+    except zlib.error:
+        raise UnsupportedGitLayout(f"cannot read object {sha1}")
+    header, _, contents = data.partition(b"\0")
+    object_type, _, _ = header.partition(b" ")
+    return object_type, contents
+
+
+def _iter_loose_tags(reader: GitRefReader) -> Iterable[Tuple[str, Path]]:
+    tags_path = reader.common_dir / "refs" / "tags"
+    for dir_path, _, file_names in os.walk(tags_path):
+        for file_name in file_names:
+            path = Path(dir_path) / file_name
+            yield path.relative_to(reader.common_dir).as_posix(), path
+
+
+def _stat_stamp(path: Path) -> Optional[List[int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    # Note: git always writes refs to a new file which is then renamed,
+    # so the inode changes even when size and mtime do not
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
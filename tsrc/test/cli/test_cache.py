@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from cli_ui.tests import MessageRecorder
+
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+from tsrc.workspace_config import WorkspaceConfig
+
+
+def make_entry(path: Path) -> Path:
+    path.mkdir(parents=True)
+    (path / "data").write_bytes(b"x" * 1000)
+    return path
+
+
+def test_cache_info_and_gc(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Initialize a workspace
+    * Create a cached bare repo, and one left by an older tsrc
+    * Check that `tsrc cache info` shows both of them
+    * Run `tsrc cache gc`: only the legacy one is removed
+    * Run `tsrc cache gc --all`: the other one is removed too
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_path = workspace_path / ".tsrc"
+    legacy = make_entry(tsrc_path / ".tmp_fm_repos" / "1234567890abc_foo")
+    bare = make_entry(tsrc_path / "bare_cache" / "1234.git")
+
+    tsrc_cli.run("cache", "info")
+    assert message_recorder.find(r"2 repos")
+    assert message_recorder.find(r"bare_cache/1234.git")
+    assert message_recorder.find(r"\.tmp_fm_repos/1234567890abc_foo")
+    assert message_recorder.find(r"unused \(older tsrc\)")
+
+    tsrc_cli.run("cache", "gc")
+    assert not legacy.exists()
+    assert bare.exists()
+
+    tsrc_cli.run("cache", "gc", "--all")
+    assert not bare.exists()
+
+
+def test_status_evicts_over_budget(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+) -> None:
+    """Scenario:
+    * Initialize a workspace, with no budget for temporary caches
+    * Create a cached bare repo not used by the workspace
+    * Run `tsrc status`, and check that the repo was removed
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    cfg_path = workspace_path / ".tsrc" / "config.yml"
+    config = WorkspaceConfig.from_file(cfg_path)
+    config.tmp_cache_max_size = 0
+    config.save_to_file(cfg_path)
+    bare = make_entry(workspace_path / ".tsrc" / "bare_cache" / "1234.git")
+
+    tsrc_cli.run("status")
+
+    assert not bare.exists()
@@ -946,7 +946,7 @@ def test_dm_and_fm_manifests_mising_group_item(
     # 8th: set manifest branch to change to 'dev'
     # 9th: go back to 'master' for Manifest repo
     # 10th: add non-existent item to Group in Future Manifest
-    # 11th: check for Warking on FM, disabling FM to update
+    # 11th: check for Warking on FM
     """
 
     # 1st: create a bunch of repos
@@ -989,13 +989,16 @@ def test_dm_and_fm_manifests_mising_group_item(
     run_git(manifest_path, "push", "-u", "origin", "master")
 
     # 10th: add non-existent item to Group in Future Manifest
-    ad_hoc_insert_to_manifests_groups(
-        workspace_path / ".tsrc" / "future_manifest" / "manifest.yml"
-    )
+    #   by pushing it to the 'dev' branch
+    run_git(manifest_path, "checkout", "dev")
+    ad_hoc_insert_to_manifests_groups(manifest_path / "manifest.yml")
+    run_git(manifest_path, "commit", "-a", "-m", "Group's missing item")
+    run_git(manifest_path, "push", "origin", "dev")
+    run_git(manifest_path, "checkout", "master")
 
-    # 11th: check for Warking on FM, disabling FM to update
+    # 11th: check for Warking on FM
     message_recorder.reset()
-    tsrc_cli.run("status", "--same-fm")
+    tsrc_cli.run("status")
     assert message_recorder.find(
         r"Warning: Future Manifest: Groups: cannot add 'repo_1' to 'gm'"
     )
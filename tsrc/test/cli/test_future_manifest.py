@@ -0,0 +1,113 @@
+from pathlib import Path
+
+from cli_ui.tests import MessageRecorder
+
+from tsrc.git import get_sha1, run_git
+from tsrc.local_future_manifest import FUTURE_MANIFEST_REF
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+from tsrc.workspace_config import WorkspaceConfig
+
+
+def test_future_manifest_is_fetched_not_cloned(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with a 'dev' branch
+    * Initialize a workspace, and use 'dev' as the next manifest branch
+    * Run `tsrc status`
+    * Check that the Future Manifest was fetched in .tsrc/manifest,
+      without changing its branch, and without a separate clone
+    """
+    git_server.add_repo("foo")
+    git_server.manifest.change_branch("dev")
+    git_server.add_repo("bar")
+    git_server.manifest.change_branch("master")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("manifest", "--branch", "dev")
+
+    message_recorder.reset()
+    tsrc_cli.run("status")
+
+    assert message_recorder.find(r"bar")
+    manifest_path = workspace_path / ".tsrc" / "manifest"
+    dev_sha1 = get_sha1(git_server.bare_path / "manifest", ref="refs/heads/dev")
+    assert get_sha1(manifest_path, ref=FUTURE_MANIFEST_REF) == dev_sha1
+    assert get_sha1(manifest_path, ref="HEAD") != dev_sha1
+    assert not (workspace_path / ".tsrc" / "future_manifest").exists()
+
+
+def test_future_manifest_ttl(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Initialize a workspace, use 'dev' as the next manifest branch,
+      and set a long future_manifest_ttl
+    * Run `tsrc status` once
+    * Push a new repo in the 'dev' manifest
+    * Run `tsrc status` again: the Future Manifest is not fetched again
+    * Run `tsrc status` with a zero TTL: the new repo is shown
+    """
+    git_server.add_repo("foo")
+    git_server.manifest.change_branch("dev")
+    git_server.manifest.change_branch("master")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("manifest", "--branch", "dev")
+    cfg_path = workspace_path / ".tsrc" / "config.yml"
+    config = WorkspaceConfig.from_file(cfg_path)
+    config.future_manifest_ttl = 3600
+    config.save_to_file(cfg_path)
+    tsrc_cli.run("status")
+
+    git_server.manifest.change_branch("dev")
+    git_server.add_repo("bar")
+
+    message_recorder.reset()
+    tsrc_cli.run("status")
+    assert message_recorder.find(r"Skiping update of: Future Manifest")
+    assert not message_recorder.find(r"bar")
+
+    config.future_manifest_ttl = 0
+    config.save_to_file(cfg_path)
+    message_recorder.reset()
+    tsrc_cli.run("status")
+    assert not message_recorder.find(r"Skiping update of: Future Manifest")
+    assert message_recorder.find(r"bar")
+
+
+def test_future_manifest_without_manifest_file(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    tmp_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with a 'dev' branch that has no manifest.yml
+    * Initialize a workspace, and use 'dev' as the next manifest branch
+    * Run `tsrc status`
+    * Check that a warning is shown instead of an error
+    """
+    git_server.add_repo("foo")
+    clone_path = tmp_path / "manifest"
+    run_git(tmp_path, "clone", git_server.manifest_url, str(clone_path))
+    run_git(clone_path, "checkout", "--orphan", "dev")
+    run_git(clone_path, "rm", "-rf", "--quiet", ".")
+    (clone_path / "README").write_text("not a manifest\n")
+    run_git(clone_path, "add", "README")
+    run_git(clone_path, "commit", "--message", "no manifest")
+    run_git(clone_path, "push", "origin", "dev")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("manifest", "--branch", "dev")
+
+    message_recorder.reset()
+    tsrc_cli.run("status")
+
+    assert message_recorder.find(r"Could not read manifest.yml")
+    assert message_recorder.find(r"foo")
@@ -0,0 +1,142 @@
+from pathlib import Path
+
+from tsrc.git import get_current_branch, get_sha1, run_git
+from tsrc.git_refs import GitRefReader
+from tsrc.manifest_lock import RepoNotLocked, load_lock
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def test_lock(tsrc_cli: CLI, git_server: GitServer, workspace_path: Path) -> None:
+    """Scenario:
+    * Create a manifest with a repo on a branch, one frozen at a tag,
+      and one frozen at a sha1
+    * Initialize a workspace from this manifest
+    * Push new commits to all of them
+    * Run `tsrc lock`
+    * Check that the lock file contains the commits configured
+      in the manifest
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.tag("bar", "v0.1")
+    bar_sha1 = git_server.get_sha1("bar")
+    git_server.manifest.set_repo_tag("bar", "v0.1")
+    git_server.add_repo("baz")
+    baz_sha1 = git_server.get_sha1("baz")
+    git_server.manifest.set_repo_sha1("baz", baz_sha1)
+    tsrc_cli.run("init", git_server.manifest_url)
+    for name in ["foo", "bar", "baz"]:
+        git_server.push_file(name, "new.txt")
+
+    tsrc_cli.run("lock")
+
+    lock_path = workspace_path / ".tsrc/manifest/manifest.lock.yml"
+    assert load_lock(lock_path) == {
+        "foo": git_server.get_sha1("foo"),
+        "bar": bar_sha1,
+        "baz": baz_sha1,
+    }
+
+
+def test_sync_locked(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with one repo
+    * Initialize a workspace from this manifest
+    * Push a new commit, run `tsrc lock`, and push another commit
+    * Check that `tsrc sync --locked` puts the repo at the locked commit,
+      on its branch
+    * Check that `tsrc sync` gets the last commit
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "locked.txt")
+    locked_sha1 = git_server.get_sha1("foo")
+    tsrc_cli.run("lock")
+    git_server.push_file("foo", "new.txt")
+
+    tsrc_cli.run("sync", "--locked", "--no-update-manifest")
+
+    foo_path = workspace_path / "foo"
+    assert get_sha1(foo_path) == locked_sha1
+    assert get_current_branch(foo_path) == "master"
+    assert not (foo_path / "new.txt").exists()
+
+    tsrc_cli.run("sync", "--no-update-manifest")
+    assert (foo_path / "new.txt").exists()
+
+
+def test_sync_locked_tag(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a repo frozen at a tag
+    * Initialize a workspace from this manifest, and run `tsrc lock`
+    * Check that `tsrc sync --locked` puts the repo at the commit of the
+      tag, without creating a branch the manifest does not mention
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "foo.txt")
+    git_server.tag("foo", "v0.1")
+    tagged_sha1 = git_server.get_sha1("foo")
+    git_server.manifest.set_repo_tag("foo", "v0.1")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("lock")
+    foo_path = workspace_path / "foo"
+    run_git(foo_path, "reset", "--hard", "HEAD~1")
+
+    tsrc_cli.run("sync", "--locked", "--no-update-manifest")
+
+    assert get_sha1(foo_path) == tagged_sha1
+    assert not GitRefReader(foo_path).ref_exists("refs/heads/master")
+
+
+def test_init_locked(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, tmp_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with one repo
+    * Lock it in a first workspace, and push the lock file in the
+      manifest repository
+    * Push a new commit to the repo
+    * Run `tsrc init --locked` in a second workspace
+    * Check that the repo is cloned at the locked commit
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "locked.txt")
+    locked_sha1 = git_server.get_sha1("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("lock")
+    lock_path = workspace_path / ".tsrc/manifest/manifest.lock.yml"
+    git_server.push_file(
+        "manifest", "manifest.lock.yml", contents=lock_path.read_text()
+    )
+    git_server.push_file("foo", "new.txt")
+
+    other_path = tmp_path / "other"
+    tsrc_cli.run("init", "-w", str(other_path), "--locked", git_server.manifest_url)
+
+    assert get_sha1(other_path / "foo") == locked_sha1
+    assert not (other_path / "foo/new.txt").exists()
+
+
+def test_sync_locked_missing_repo(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with one repo, initialize a workspace and lock it
+    * Add a repo to the manifest
+    * Check that `tsrc sync --locked` fails, asking to lock again
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    lock_path = workspace_path / ".tsrc/manifest/manifest.lock.yml"
+    tsrc_cli.run("lock")
+    git_server.push_file(
+        "manifest", "manifest.lock.yml", contents=lock_path.read_text()
+    )
+    git_server.add_repo("bar")
+
+    tsrc_cli.run_and_fail_with(RepoNotLocked, "sync", "--locked")
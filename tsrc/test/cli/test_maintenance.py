@@ -0,0 +1,100 @@
+import hashlib
+import subprocess
+from pathlib import Path
+
+from cli_ui.tests import MessageRecorder
+
+from tsrc.maintenance import MaintenanceQueue
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def write_loose_objects(repo_path: Path, count: int) -> None:
+    """Write `count` blobs whose sha1 starts with 17, the directory
+    git looks at to estimate the number of loose objects
+    """
+    i = 0
+    while count:
+        contents = f"blob {i}\n".encode()
+        header = f"blob {len(contents)}\0".encode()
+        if hashlib.sha1(header + contents).hexdigest().startswith("17"):
+            cmd = ["git", "hash-object", "-w", "--stdin"]
+            subprocess.run(cmd, cwd=repo_path, input=contents, check=True)
+            count -= 1
+        i += 1
+
+
+def test_maintenance_processes_queue(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos
+    * Initialize a workspace from this manifest
+    * Queue foo for maintenance
+    * Run `tsrc maintenance`
+    * Check that foo got a commit-graph, that bar was left alone,
+      and that the queue is empty
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    queue = MaintenanceQueue.for_workspace(workspace_path)
+    queue.add(["foo"])
+
+    tsrc_cli.run("maintenance")
+
+    objects_path = Path(".git") / "objects" / "info"
+    assert (workspace_path / "foo" / objects_path / "commit-graph").exists()
+    assert not (workspace_path / "bar" / objects_path / "commit-graph").exists()
+    assert queue.load() == set()
+
+
+def test_maintenance_all(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    tsrc_cli.run("maintenance", "--all")
+
+    objects_path = Path(".git") / "objects" / "info"
+    assert (workspace_path / "foo" / objects_path / "commit-graph").exists()
+    assert (workspace_path / "bar" / objects_path / "commit-graph").exists()
+
+
+def test_sync_queues_repos_needing_maintenance(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Initialize a workspace with one repo
+    * Make foo need a `git gc` by lowering gc.auto
+    * Push a new commit to foo
+    * Run `tsrc sync`: foo is queued instead of being gc'ed
+    * Run `tsrc sync --maintenance`: the queue is processed
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    foo_path = workspace_path / "foo"
+    subprocess.run(["git", "config", "gc.auto", "1"], cwd=foo_path, check=True)
+    # so that an automatic gc, if any, is done when the sync returns
+    subprocess.run(
+        ["git", "config", "gc.autoDetach", "false"], cwd=foo_path, check=True
+    )
+    write_loose_objects(foo_path, 2)
+    queue = MaintenanceQueue.for_workspace(workspace_path)
+    git_server.push_file("foo", "new.txt")
+
+    tsrc_cli.run("sync")
+    assert queue.load() == {"foo"}
+    # no automatic gc ran (it would have written a commit-graph)
+    assert not (foo_path / ".git" / "objects" / "info" / "commit-graph").exists()
+    # and the commands shown to the user are not cluttered
+    assert message_recorder.find(r"git .*fetch")
+    assert not message_recorder.find(r"gc\.auto")
+
+    tsrc_cli.run("sync", "--maintenance")
+    assert queue.load() == set()
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import pytest
+from cli_ui.tests import MessageRecorder
+
+from tsrc.git import get_sha1
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+@pytest.fixture
+def mirrors_path(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    res = tmp_path / "mirrors"
+    monkeypatch.setenv("TSRC_MIRROR_CACHE", str(res))
+    return res
+
+
+def test_init_with_mirror_cache(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    mirrors_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos
+    * Run `tsrc init --mirror-cache`
+    * Check that a mirror was created for each repo, and that
+      the clones do not depend on them
+    * Check that `tsrc mirrors` displays them
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+
+    tsrc_cli.run("init", "--mirror-cache", git_server.manifest_url)
+
+    assert len(list(mirrors_path.glob("*.git"))) == 2
+    foo_path = workspace_path / "foo"
+    assert get_sha1(foo_path) == git_server.get_sha1("foo")
+    assert not (foo_path / ".git/objects/info/alternates").exists()
+
+    message_recorder.reset()
+    tsrc_cli.run("mirrors")
+    assert message_recorder.find(r"2 mirrors")
+    assert message_recorder.find(r"foo")
+
+
+def test_mirror_cache_is_shared(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    tmp_path: Path,
+    workspace_path: Path,
+    mirrors_path: Path,
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo
+    * Run `tsrc init --mirror-cache` in a first workspace
+    * Push a new file to foo
+    * Run `tsrc init --mirror-cache` in a second workspace
+    * Check that both the mirror and the new clone are up to date
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", "--mirror-cache", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt")
+
+    other_path = tmp_path / "other"
+    other_path.mkdir()
+    tsrc_cli.run(
+        "init", "-w", str(other_path), "--mirror-cache", git_server.manifest_url
+    )
+
+    (mirror_path,) = mirrors_path.glob("*.git")
+    assert get_sha1(mirror_path, ref="master") == git_server.get_sha1("foo")
+    assert (other_path / "foo/new.txt").exists()
+
+
+def test_no_mirrors(
+    tsrc_cli: CLI, mirrors_path: Path, message_recorder: MessageRecorder
+) -> None:
+    tsrc_cli.run("mirrors")
+    assert message_recorder.find("No mirrors found")
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+from tsrc.git import get_sha1, run_git, run_git_captured
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def allow_filters(git_server: GitServer, name: str) -> None:
+    run_git(git_server.bare_path / name, "config", "uploadpack.allowFilter", "true")
+
+
+def get_partial_clone_filter(repo_path: Path) -> str:
+    _, out = run_git_captured(
+        repo_path, "config", "--get", "remote.origin.partialclonefilter", check=False
+    )
+    return out
+
+
+def test_partial_clones(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo
+    * Run `tsrc init --filter blob:none`
+    * Check that foo is a partial clone
+    * Push a new file to foo, and freeze foo at this commit in the manifest
+    * Run `tsrc sync`
+    * Check that foo has been reset to the new commit
+    """
+    git_server.add_repo("foo")
+    allow_filters(git_server, "foo")
+
+    tsrc_cli.run("init", "--filter", "blob:none", git_server.manifest_url)
+
+    foo_path = workspace_path / "foo"
+    assert get_partial_clone_filter(foo_path) == "blob:none"
+
+    git_server.push_file("foo", "new.txt")
+    new_sha1 = git_server.get_sha1("foo")
+    git_server.manifest.set_repo_sha1("foo", new_sha1)
+
+    tsrc_cli.run("sync")
+
+    assert get_sha1(foo_path) == new_sha1
+    assert (foo_path / "new.txt").exists()
+
+
+def test_clone_filter_per_repo(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo using the tree:0 filter, and a bar
+      repo using no filter
+    * Run `tsrc init --filter blob:none`
+    * Check that the filters from the manifest were used
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    allow_filters(git_server, "foo")
+    allow_filters(git_server, "bar")
+    git_server.manifest.configure_repo("foo", "clone_filter", "tree:0")
+    git_server.manifest.configure_repo("bar", "clone_filter", "")
+
+    tsrc_cli.run("init", "--filter", "blob:none", git_server.manifest_url)
+
+    assert get_partial_clone_filter(workspace_path / "foo") == "tree:0"
+    assert get_partial_clone_filter(workspace_path / "bar") == ""
@@ -0,0 +1,79 @@
+import shutil
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from tsrc.git import get_sha1
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+@pytest.fixture
+def priority_calls(monkeypatch: pytest.MonkeyPatch) -> List[bool]:
+    """Do not change the priority of the process running the tests"""
+    res: List[bool] = []
+    monkeypatch.setattr("tsrc.cli.prefetch.lower_priority", lambda: res.append(True))
+    return res
+
+
+def test_prefetch(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    priority_calls: List[bool],
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos
+    * Initialize a workspace from this manifest
+    * Push a new file and a new tag to foo
+    * Run `tsrc prefetch`
+    * Check that the new commit is in refs/prefetch, and that neither
+      the remote-tracking branch, the tags nor the worktree changed
+    * Run `tsrc sync` and check that foo is updated
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    foo_path = workspace_path / "foo"
+    old_sha1 = get_sha1(foo_path)
+    git_server.push_file("foo", "new.txt")
+    git_server.tag("foo", "v0.1")
+    new_sha1 = git_server.get_sha1("foo")
+
+    tsrc_cli.run("prefetch")
+
+    assert priority_calls
+    assert get_sha1(foo_path, ref="refs/prefetch/origin/heads/master") == new_sha1
+    assert get_sha1(foo_path, ref="refs/prefetch/origin/tags/v0.1") == new_sha1
+    assert get_sha1(foo_path, ref="refs/remotes/origin/master") == old_sha1
+    assert get_sha1(foo_path) == old_sha1
+    assert not (foo_path / "new.txt").exists()
+    assert not (foo_path / ".git/refs/tags/v0.1").exists()
+
+    tsrc_cli.run("sync")
+    assert (foo_path / "new.txt").exists()
+
+
+def test_prefetch_skips_missing_repos(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    priority_calls: List[bool],
+) -> None:
+    """Scenario:
+    * Initialize a workspace with two repos
+    * Remove the bar clone
+    * Run `tsrc prefetch --normal-priority`
+    * Check that bar is not cloned again, and that the priority
+      was left alone
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    shutil.rmtree(workspace_path / "bar")
+
+    tsrc_cli.run("prefetch", "--normal-priority")
+
+    assert not priority_calls
+    assert not (workspace_path / "bar").exists()
@@ -1,8 +1,6 @@
 from pathlib import Path
 
-from cli_ui.tests import MessageRecorder
-
-from tsrc.git import is_shallow
+from tsrc.git import get_current_branch, get_sha1, is_shallow, run_git_captured
 from tsrc.test.helpers.cli import CLI
 from tsrc.test.helpers.git_server import GitServer
 
@@ -29,17 +27,86 @@ def test_shallow_clones(
     assert_shallow_clone(workspace_path, "foo/baz")
 
 
+def get_commit_count(repo_path: Path) -> int:
+    _, out = run_git_captured(repo_path, "rev-list", "--count", "HEAD")
+    return int(out)
+
+
 def test_shallow_with_fix_ref(
     tsrc_cli: CLI,
     git_server: GitServer,
     workspace_path: Path,
-    message_recorder: MessageRecorder,
 ) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo frozen at its first commit,
+      with two commits on top of it
+    * Run `tsrc init --shallow`
+    * Check that foo is a shallow clone containing only the first commit
+    """
     git_server.add_repo("foo")
     initial_sha1 = git_server.get_sha1("foo")
     git_server.push_file("foo", "one.c")
+    git_server.push_file("foo", "two.c")
     git_server.manifest.set_repo_sha1("foo", initial_sha1)
 
     manifest_url = git_server.manifest_url
-    tsrc_cli.run_and_fail("init", "--shallow", manifest_url)
-    assert message_recorder.find("Cannot use --shallow with a fixed sha1")
+    tsrc_cli.run("init", "--shallow", manifest_url)
+
+    foo_path = workspace_path / "foo"
+    assert_shallow_clone(workspace_path, "foo")
+    assert get_sha1(foo_path) == initial_sha1
+    assert get_commit_count(foo_path) == 1
+    assert get_current_branch(foo_path) == "master"
+
+
+def test_shallow_with_short_sha1(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo frozen at an abbreviated sha1,
+      with a few commits on top of it
+    * Run `tsrc init --shallow`
+    * Check that foo is at the given sha1 (abbreviated sha1s cannot be
+      fetched directly, so the history is deepened until it is found)
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "one.c")
+    initial_sha1 = git_server.get_sha1("foo")
+    for i in range(4):
+        git_server.push_file("foo", f"{i}.c")
+    git_server.manifest.set_repo_sha1("foo", initial_sha1[:10])
+
+    tsrc_cli.run("init", "--shallow", git_server.manifest_url)
+
+    foo_path = workspace_path / "foo"
+    assert get_sha1(foo_path) == initial_sha1
+
+
+def test_sync_shallow_to_older_sha1(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo with a few commits
+    * Run `tsrc init --shallow`
+    * Freeze foo at an older commit in the manifest
+    * Run `tsrc sync`
+    * Check that foo is still shallow, and at the given sha1
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "one.c")
+    old_sha1 = git_server.get_sha1("foo")
+    git_server.push_file("foo", "two.c")
+    git_server.push_file("foo", "three.c")
+    tsrc_cli.run("init", "--shallow", git_server.manifest_url)
+    foo_path = workspace_path / "foo"
+    assert get_commit_count(foo_path) == 1
+
+    git_server.manifest.set_repo_sha1("foo", old_sha1)
+    tsrc_cli.run("sync")
+
+    assert_shallow_clone(workspace_path, "foo")
+    assert get_sha1(foo_path) == old_sha1
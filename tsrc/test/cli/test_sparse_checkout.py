@@ -0,0 +1,88 @@
+from pathlib import Path
+
+from cli_ui.tests import MessageRecorder
+
+from tsrc.git import run_git
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def setup_repo(git_server: GitServer, tmp_path: Path) -> None:
+    """Push a few files in several directories to a new foo repo"""
+    foo_url = git_server.add_repo("foo")
+    src_path = tmp_path / "foo-src"
+    run_git(tmp_path, "clone", foo_url, str(src_path))
+    for name in ("top.txt", "a/a.txt", "b/b.txt", "c/d/d.txt"):
+        file_path = src_path / name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(name)
+    run_git(src_path, "add", ".")
+    run_git(
+        src_path,
+        "-c",
+        "user.name=Tasty",
+        "-c",
+        "user.email=tasty@example.com",
+        "commit",
+        "--message",
+        "add directories",
+    )
+    run_git(src_path, "push", "origin", "master")
+
+
+def test_clone_with_sparse_checkout(
+    tsrc_cli: CLI, git_server: GitServer, tmp_path: Path, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a foo repo with several directories, and only some
+      of them listed in the `sparse` key of the manifest
+    * Run `tsrc init`
+    * Check that only those directories (and the files at the top)
+      were checked out
+    """
+    setup_repo(git_server, tmp_path)
+    git_server.manifest.configure_repo("foo", "sparse", ["a", "c/d"])
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    foo_path = workspace_path / "foo"
+    assert (foo_path / "top.txt").exists()
+    assert (foo_path / "a/a.txt").exists()
+    assert (foo_path / "c/d/d.txt").exists()
+    assert not (foo_path / "b").exists()
+
+
+def test_sync_updates_sparse_checkout(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    tmp_path: Path,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a foo repo with several directories, and only one of
+      them listed in the `sparse` key of the manifest
+    * Run `tsrc init`
+    * Change the `sparse` key in the manifest
+    * Run `tsrc sync`, and check the sparse checkout was updated
+    * Remove the `sparse` key from the manifest
+    * Run `tsrc sync`, and check the whole repo is checked out
+    """
+    setup_repo(git_server, tmp_path)
+    git_server.manifest.configure_repo("foo", "sparse", ["a"])
+    tsrc_cli.run("init", git_server.manifest_url)
+    foo_path = workspace_path / "foo"
+
+    git_server.manifest.configure_repo("foo", "sparse", ["b"])
+    tsrc_cli.run("sync")
+
+    assert not (foo_path / "a").exists()
+    assert (foo_path / "b/b.txt").exists()
+    assert message_recorder.find("Sparse checkout set to: b")
+
+    del git_server.manifest.get_repo("foo")["sparse"]
+    git_server.manifest.write_changes("remove foo sparse")
+    tsrc_cli.run("sync")
+
+    assert (foo_path / "a/a.txt").exists()
+    assert (foo_path / "c/d/d.txt").exists()
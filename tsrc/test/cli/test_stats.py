@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from cli_ui.tests import MessageRecorder
+
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def test_stats_after_sync(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a workspace with two repos
+    * Push a new file to both repos
+    * Run `tsrc sync`
+    * Check that `tsrc stats` displays the durations of
+      the clone and sync tasks for both repos
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "foo.txt")
+    git_server.push_file("bar", "bar.txt")
+    tsrc_cli.run("sync")
+    assert (workspace_path / ".tsrc/durations.json").exists()
+
+    message_recorder.reset()
+    tsrc_cli.run("stats")
+
+    assert message_recorder.find(r"clone.*\(2 repos")
+    assert message_recorder.find(r"sync.*\(2 repos")
+    assert message_recorder.find(r"foo")
+
+
+def test_stats_without_durations(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    message_recorder: MessageRecorder,
+) -> None:
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    message_recorder.reset()
+    tsrc_cli.run("stats", "--task", "status")
+
+    assert message_recorder.find("No durations recorded yet")
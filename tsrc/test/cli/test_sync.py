@@ -1,13 +1,16 @@
 import os
+import shutil
 from pathlib import Path
 from typing import Any
 
+import pytest
 from cli_ui.tests import MessageRecorder
 from ruamel.yaml import YAML
 
 from tsrc.errors import Error
 from tsrc.git import get_sha1, run_git, run_git_captured
 from tsrc.groups import GroupNotFound
+from tsrc.sync_journal import DONE, SyncJournal
 from tsrc.test.helpers.cli import CLI
 from tsrc.test.helpers.git_server import GitServer
 from tsrc.workspace import SyncError
@@ -58,6 +61,360 @@ def test_sync_sequential(
     tsrc_cli.run("sync", "-j", "1")
 
 
+def test_sync_with_asyncio_executor(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Scenario:
+    * Create a manifest with three repos
+    * Initialize a workspace from this manifest
+    * Push new files to two of them
+    * Run `tsrc sync` with TSRC_EXECUTOR set to 'asyncio'
+    * Check that the clones have been updated
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.add_repo("baz")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "foo.txt")
+    git_server.push_file("bar", "bar.txt")
+
+    monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+    tsrc_cli.run("sync", "-j", "2")
+
+    assert (workspace_path / "foo/foo.txt").exists()
+    assert (workspace_path / "bar/bar.txt").exists()
+
+
+def test_sync_with_net_jobs(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with three repos
+    * Initialize a workspace from this manifest, with more network
+      jobs than local jobs
+    * Push a new file to one of them
+    * Run `tsrc sync` with more network jobs than local jobs
+    * Check that the clone has been updated
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.add_repo("baz")
+    tsrc_cli.run("init", git_server.manifest_url, "-j", "1", "--net-jobs", "3")
+    git_server.push_file("foo", "foo.txt")
+
+    tsrc_cli.run("sync", "-j", "1", "--net-jobs", "3")
+
+    assert (workspace_path / "foo/foo.txt").exists()
+    assert (workspace_path / "baz").exists()
+
+
+def test_sync_skips_up_to_date_repos(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with three repos, one of them frozen at a tag
+    * Initialize a workspace from this manifest
+    * Push a new file to one of the other repos
+    * Run `tsrc sync`
+    * Check that the changed repo has been updated, and that the two
+      other ones have been skipped
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.add_repo("baz")
+    git_server.tag("baz", "v0.1")
+    git_server.manifest.set_repo_tag("baz", "v0.1")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "foo.txt")
+
+    message_recorder.reset()
+    tsrc_cli.run("sync")
+
+    assert (workspace_path / "foo/foo.txt").exists()
+    assert message_recorder.find(r"Skipped 2 repo\(s\) already up to date")
+
+
+def test_resume_interrupted_sync(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos
+    * Initialize a workspace from this manifest
+    * Push a new file to both repos
+    * Write a journal saying that `foo` was synced before an interruption
+    * Run `tsrc sync`
+    * Check that `foo` was skipped, that `bar` was synced, and that
+      the journal is removed
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "foo.txt")
+    git_server.push_file("bar", "bar.txt")
+
+    manifest_sha1 = get_sha1(workspace_path / ".tsrc/manifest")
+    journal = SyncJournal.for_workspace(workspace_path)
+    journal.start(manifest_sha1)
+    journal.for_task("sync").record("foo", DONE)
+
+    message_recorder.reset()
+    tsrc_cli.run("sync")
+
+    assert message_recorder.find(r"Skipped 1 repo\(s\) synced before interruption")
+    assert not (workspace_path / "foo/foo.txt").exists()
+    assert (workspace_path / "bar/bar.txt").exists()
+    assert not journal.path.exists()
+
+
+def test_sync_resume_after_manifest_change(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Initialize a workspace with one repo
+    * Write a journal for an older manifest commit
+    * Check that `tsrc sync` starts over, but that `tsrc sync --resume`
+      does not
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "foo.txt")
+
+    journal = SyncJournal.for_workspace(workspace_path)
+    journal.start("0" * 40)
+    journal.for_task("sync").record("foo", DONE)
+
+    tsrc_cli.run("sync", "--resume")
+    assert message_recorder.find("Resuming interrupted sync")
+    assert not (workspace_path / "foo/foo.txt").exists()
+
+    journal.start("0" * 40)
+    journal.for_task("sync").record("foo", DONE)
+    tsrc_cli.run("sync")
+    assert (workspace_path / "foo/foo.txt").exists()
+
+
+def test_sync_after_failure_does_not_resume(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Initialize a workspace with two repos
+    * Make foo diverge from its remote, so that syncing it fails
+    * Push a file to bar, and check that `tsrc sync` fails but syncs bar
+    * Push an other file to bar
+    * Check that the next `tsrc sync` does not skip bar
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    foo_path = workspace_path / "foo"
+    (foo_path / "local.txt").write_text("local")
+    run_git(foo_path, "add", "local.txt")
+    run_git(foo_path, "commit", "--message", "local change")
+    git_server.push_file("foo", "remote.txt")
+
+    git_server.push_file("bar", "bar1.txt")
+    tsrc_cli.run_and_fail("sync")
+    assert (workspace_path / "bar/bar1.txt").exists()
+
+    git_server.push_file("bar", "bar2.txt")
+    message_recorder.reset()
+    tsrc_cli.run_and_fail("sync")
+    assert not message_recorder.find("Resuming interrupted sync")
+    assert (workspace_path / "bar/bar2.txt").exists()
+
+
+def test_sync_skips_unchanged_repos(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with three repos frozen at a tag, and one on a branch
+    * Initialize a workspace from this manifest, and sync it
+    * Reset foo to an older commit by hand
+    * Change the tag of bar in the manifest, and push to baz
+    * Run `tsrc sync`
+    * Check that qux was left alone, while foo is back at its tag, and
+      bar and baz were updated
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "foo.txt")
+    git_server.tag("foo", "v0.1")
+    foo_sha1 = git_server.get_sha1("foo")
+    git_server.manifest.set_repo_tag("foo", "v0.1")
+    git_server.add_repo("bar")
+    git_server.tag("bar", "v0.1")
+    git_server.manifest.set_repo_tag("bar", "v0.1")
+    git_server.add_repo("baz")
+    git_server.add_repo("qux")
+    git_server.tag("qux", "v0.1")
+    git_server.manifest.set_repo_tag("qux", "v0.1")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path / "foo"
+    run_git(foo_path, "reset", "--hard", "HEAD~1")
+    git_server.push_file("bar", "bar.txt")
+    git_server.tag("bar", "v0.2")
+    git_server.manifest.set_repo_tag("bar", "v0.2")
+    git_server.push_file("baz", "baz.txt")
+
+    message_recorder.reset()
+    tsrc_cli.run("sync")
+
+    assert message_recorder.find(r"Skipped 1 repo\(s\) unchanged in the manifest")
+    assert get_sha1(foo_path) == foo_sha1
+    assert (workspace_path / "bar/bar.txt").exists()
+    assert (workspace_path / "baz/baz.txt").exists()
+
+
+def test_sync_reclones_deleted_pinned_repos(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a repo frozen at a tag
+    * Initialize a workspace from this manifest, and sync it
+    * Remove the repo from the workspace
+    * Check that `tsrc sync` clones it again
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "foo.txt")
+    git_server.tag("foo", "v0.1")
+    git_server.manifest.set_repo_tag("foo", "v0.1")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    shutil.rmtree(workspace_path / "foo")
+    tsrc_cli.run("sync")
+
+    assert (workspace_path / "foo/foo.txt").exists()
+
+
+def test_full_sync_after_failure(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with a repo frozen at a tag
+    * Initialize a workspace from this manifest, and sync it
+    * Make the repo dirty, and check that `tsrc sync --full` fails
+    * Clean the repo, and check that the next `tsrc sync` processes it
+      even if the manifest did not change
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "foo.txt")
+    git_server.tag("foo", "v0.1")
+    foo_sha1 = git_server.get_sha1("foo")
+    git_server.manifest.set_repo_tag("foo", "v0.1")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path / "foo"
+    run_git(foo_path, "reset", "--hard", "HEAD~1")
+    (foo_path / "dirty.txt").write_text("dirty")
+    run_git(foo_path, "add", "dirty.txt")
+    tsrc_cli.run_and_fail("sync", "--full")
+
+    run_git(foo_path, "reset", "--hard")
+    message_recorder.reset()
+    tsrc_cli.run("sync")
+    assert not message_recorder.find("unchanged in the manifest")
+    assert get_sha1(foo_path) == foo_sha1
+
+
+def test_sync_always_fetch(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with one repo
+    * Initialize a workspace from this manifest
+    * Push a new tag to the repo
+    * Run `tsrc sync --always-fetch`
+    * Check that the repo was not skipped, and that the tag was fetched
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.tag("foo", "v0.1")
+
+    message_recorder.reset()
+    tsrc_cli.run("sync", "--always-fetch")
+
+    assert not message_recorder.find("Skipped")
+    _, tags = run_git_captured(workspace_path / "foo", "tag", "--list")
+    assert tags == "v0.1"
+
+
+def test_sync_with_narrow_fetch(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo
+    * Initialize a workspace from this manifest, using narrow fetch
+    * Push a new file to foo's master branch, then a new branch and a new tag
+    * Run `tsrc sync`
+    * Check that foo has been updated, but that the other branch and
+      the tag have not been fetched
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", "--narrow-fetch", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt")
+    git_server.push_file("foo", "feature.txt", branch="feature")
+    git_server.tag("foo", "v0.1")
+
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path / "foo"
+    assert (foo_path / "new.txt").exists()
+    _, branches = run_git_captured(foo_path, "branch", "--remotes")
+    assert "origin/feature" not in branches
+    _, tags = run_git_captured(foo_path, "tag", "--list")
+    assert not tags
+
+
+def test_narrow_fetch_with_sha1(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo, using narrow fetch
+    * Initialize a workspace from this manifest
+    * Push a new file to foo, and freeze foo at this commit in the manifest
+    * Run `tsrc sync`
+    * Check that foo has been reset to the new commit
+    """
+    git_server.add_repo("foo")
+    git_server.manifest.configure_repo("foo", "narrow_fetch", True)
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt")
+    new_sha1 = git_server.get_sha1("foo")
+    git_server.manifest.set_repo_sha1("foo", new_sha1)
+
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path / "foo"
+    assert get_sha1(foo_path) == new_sha1
+
+
 def test_sync_with_errors(
     tsrc_cli: CLI,
     git_server: GitServer,
@@ -347,6 +704,25 @@ def test_copies_preserve_stat(
     assert os.access(top_exe, os.X_OK)
 
 
+def test_copies_as_hardlinks(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """
+    Scenario:
+    * Create a manifest with one repo, foo, with a copy from foo/foo.txt
+      to top.txt
+    * Run `tsrc init --copy-mode hardlink`
+    * Check that `top.txt` is a hard link to `foo/foo.txt`
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "foo.txt", contents="v1")
+    git_server.manifest.set_file_copy("foo", "foo.txt", "top.txt")
+
+    tsrc_cli.run("init", "--copy-mode", "hardlink", git_server.manifest_url)
+
+    assert os.path.samefile(workspace_path / "top.txt", workspace_path / "foo/foo.txt")
+
+
 def test_update_symlink(
     tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
 ) -> None:
@@ -8,6 +8,7 @@ import pytest
 from cli_ui.tests import MessageRecorder
 
 from tsrc.test.helpers.cli import tsrc_cli  # noqa: F401
+from tsrc.test.helpers.git_repo import repo_path  # noqa: F401
 from tsrc.test.helpers.git_server import git_server  # noqa: F401
 from tsrc.test.helpers.message_recorder_ext import MessageRecorderExt
 from tsrc.workspace import Workspace
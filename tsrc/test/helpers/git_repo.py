@@ -0,0 +1,39 @@
+""" Helpers to create a local git repository, and to run git in it.
+
+Used by the tests that read git data without running git (like
+tsrc/test/test_git_refs.py), to compare their results with git's.
+"""
+
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+def run_git(working_path: Path, *cmd: str) -> str:
+    process = subprocess.run(
+        ["git", *cmd],
+        check=True,
+        cwd=working_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return process.stdout.strip()
+
+
+def init_repo(path: Path) -> Path:
+    """Create a repository at `path`, with one commit on `master`"""
+    path.mkdir(parents=True)
+    # Make sure the initial branch is the same regardless of the user
+    # git configuration
+    run_git(path, "init", "--initial-branch", "master")
+    (path / "README").write_text("This is the README")
+    run_git(path, "add", ".")
+    run_git(path, "commit", "-m", "initial commit")
+    return path
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path) -> Path:
+    return init_repo(tmp_path / "repo")
@@ -0,0 +1,110 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from tsrc.bare_cache import BareCache
+from tsrc.errors import Error
+from tsrc.git import get_sha1, run_git
+from tsrc.test.helpers.git_server import GitServer
+
+
+def test_shared_by_url(git_server: GitServer, tmp_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    bar_url = git_server.add_repo("bar")
+    bare_cache = BareCache(tmp_path / "bare_cache")
+
+    foo_path = bare_cache.update(foo_url, "origin", branch="master")
+    assert bare_cache.update(foo_url, "upstream", branch="master") == foo_path
+    assert bare_cache.update(bar_url, "origin", branch="master") != foo_path
+
+
+def test_fetch_only_what_is_needed(git_server: GitServer, tmp_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    git_server.push_file("foo", "other.txt", branch="other")
+    sha1 = git_server.get_sha1("foo")
+    bare_cache = BareCache(tmp_path / "bare_cache")
+
+    repo_path = bare_cache.update(foo_url, "origin", branch="master", sha1=sha1)
+
+    assert get_sha1(repo_path, ref="refs/remotes/origin/master") == sha1
+    remote_refs = (repo_path / "refs" / "remotes" / "origin").iterdir()
+    assert [x.name for x in remote_refs] == ["master"]
+    assert not (repo_path / "refs" / "heads" / "other").exists()
+
+
+def test_ttl(git_server: GitServer, tmp_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    old_sha1 = git_server.get_sha1("foo")
+    bare_cache = BareCache(tmp_path / "bare_cache")
+    repo_path = bare_cache.update(foo_url, "origin", branch="master")
+
+    git_server.push_file("foo", "new.txt")
+    new_sha1 = git_server.get_sha1("foo")
+
+    # Fresh enough: nothing is fetched
+    bare_cache.update(foo_url, "origin", branch="master", ttl=3600)
+    assert get_sha1(repo_path, ref="refs/remotes/origin/master") == old_sha1
+
+    # Unless the pinned commit is missing
+    bare_cache.update(foo_url, "origin", branch="master", sha1=new_sha1, ttl=3600)
+    assert get_sha1(repo_path, ref="refs/remotes/origin/master") == new_sha1
+
+
+def test_refetch_when_workspace_repo_is_ahead(
+    git_server: GitServer, tmp_path: Path
+) -> None:
+    foo_url = git_server.add_repo("foo")
+    clone_path = tmp_path / "foo"
+    run_git(tmp_path, "clone", foo_url, str(clone_path))
+    bare_cache = BareCache(tmp_path / "bare_cache")
+    repo_path = bare_cache.update(
+        foo_url, "origin", branch="master", alternate=clone_path
+    )
+    git_server.push_file("foo", "new.txt")
+    new_sha1 = git_server.get_sha1("foo")
+    run_git(clone_path, "fetch")
+
+    bare_cache.update(
+        foo_url, "origin", branch="master", alternate=clone_path, ttl=3600
+    )
+    assert get_sha1(repo_path, ref="refs/remotes/origin/master") == new_sha1
+
+
+def test_independent_from_workspace_repo(git_server: GitServer, tmp_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    sha1 = git_server.get_sha1("foo")
+    clone_path = tmp_path / "foo"
+    run_git(tmp_path, "clone", foo_url, str(clone_path))
+    bare_cache = BareCache(tmp_path / "bare_cache")
+
+    repo_path = bare_cache.update(
+        foo_url, "origin", branch="master", alternate=clone_path
+    )
+    shutil.rmtree(clone_path)
+
+    assert not (repo_path / "objects" / "info" / "alternates").exists()
+    run_git(repo_path, "fsck", "--connectivity-only")
+    assert get_sha1(repo_path, ref="refs/remotes/origin/master") == sha1
+
+
+def test_kept_on_fetch_error(git_server: GitServer, tmp_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    bare_cache = BareCache(tmp_path / "bare_cache")
+    repo_path = bare_cache.update(foo_url, "origin", branch="master")
+    times_path = repo_path / "tsrc-fetched.json"
+
+    # Same as a network failure
+    server_path = git_server.bare_path / "foo"
+    server_path.rename(server_path.with_suffix(".bak"))
+    with pytest.raises(Error):
+        bare_cache.update(foo_url, "origin", branch="master", ttl=0)
+
+    assert times_path.exists()
+
+
+def test_missing_commit(git_server: GitServer, tmp_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    bare_cache = BareCache(tmp_path / "bare_cache")
+    with pytest.raises(Error):
+        bare_cache.update(foo_url, "origin", branch="master", sha1="0" * 40)
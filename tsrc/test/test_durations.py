@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from tsrc.durations import DurationStore
+
+
+def test_record_and_reload(tmp_path: Path) -> None:
+    store = DurationStore(tmp_path / "durations.json")
+    sync_durations = store.for_task("sync")
+    sync_durations.record("foo", 4.0)
+    sync_durations.record("foo", 2.0)
+    sync_durations.save()
+
+    reloaded = DurationStore(tmp_path / "durations.json").for_task("sync")
+
+    assert reloaded.expected("foo") == 3.0
+    assert reloaded.expected("bar") is None
+    assert reloaded.store.get("sync", "foo") == {
+        "expected": 3.0,
+        "last": 2.0,
+        "runs": 2,
+    }
+
+
+def test_sort_longest_first(tmp_path: Path) -> None:
+    durations = DurationStore(tmp_path / "durations.json").for_task("sync")
+    durations.record("small", 1.0)
+    durations.record("big", 10.0)
+    durations.record("medium", 4.0)
+
+    actual = durations.sort_longest_first(
+        ["small", "new", "medium", "big"], lambda x: x
+    )
+
+    # 'new' is expected to take the average time, 5s
+    assert actual == ["big", "new", "medium", "small"]
+
+
+def test_save_outside_workspace(tmp_path: Path) -> None:
+    store = DurationStore.for_workspace(tmp_path)
+    store.for_task("sync").record("foo", 1.0)
+    store.save()
+
+    assert not (tmp_path / ".tsrc").exists()
@@ -1,12 +1,22 @@
-from typing import List
+import asyncio
+import time
+from pathlib import Path
+from threading import Barrier, BrokenBarrierError, Lock
+from typing import Dict, List, Optional
 
 import cli_ui as ui
+import pytest
 
+from tsrc.durations import DurationStore
 from tsrc.errors import Error
 from tsrc.executor import (
     Outcome,
+    ResourceClass,
     Task,
+    UnknownExecutor,
+    interleave_by_host,
     process_items,
+    process_items_asyncio,
     process_items_parallel,
     process_items_sequence,
 )
@@ -84,3 +94,194 @@ def test_parallel_sad() -> None:
     actual = process_items(["foo", "bar", "failing", "baz", "quux"], task, num_jobs=2)
     errors = actual.errors
     assert errors["failing"].message == "Kaboom"
+
+
+def test_asyncio_nothing() -> None:
+    task = FakeTask()
+    items: List[str] = []
+    actual = process_items_asyncio(items, task, num_jobs=2)
+    assert not actual
+
+
+def test_asyncio_happy() -> None:
+    task = FakeTask()
+    actual = process_items_asyncio(["foo", "bar", "baz", "quux"], task, num_jobs=2)
+    assert list(actual.keys()) == ["foo", "bar", "baz", "quux"]
+    for outcome in actual.values():
+        assert outcome.success()
+
+
+def test_asyncio_sad(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+    task = FakeTask()
+    actual = process_items(["foo", "bar", "failing", "baz", "quux"], task, num_jobs=2)
+    errors = actual.errors
+    assert errors["failing"].message == "Kaboom"
+
+
+def test_unknown_executor(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("TSRC_EXECUTOR", "fibers")
+    with pytest.raises(UnknownExecutor):
+        process_items(["foo"], FakeTask(), num_jobs=2)
+
+
+class TwoStepsTask(FakeTask):
+    """Record how many steps of each resource class run at the same time"""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.running: Dict[ResourceClass, int] = dict.fromkeys(ResourceClass, 0)
+        self.max_running: Dict[ResourceClass, int] = dict.fromkeys(ResourceClass, 0)
+
+    def step(self, resource: ResourceClass) -> None:
+        with self.use_resource(resource):
+            with self.lock:
+                self.running[resource] += 1
+                self.max_running[resource] = max(
+                    self.max_running[resource], self.running[resource]
+                )
+            time.sleep(0.01)
+            with self.lock:
+                self.running[resource] -= 1
+
+    def process(self, index: int, count: int, item: str) -> Outcome:
+        self.step(ResourceClass.NETWORK)
+        self.step(ResourceClass.LOCAL)
+        return Outcome.empty()
+
+
+def test_resource_limits() -> None:
+    task = TwoStepsTask()
+    items = [f"item{i}" for i in range(20)]
+    actual = process_items(items, task, num_jobs=2, net_jobs=6)
+    assert not actual.errors
+    assert task.max_running[ResourceClass.LOCAL] <= 2
+    assert task.max_running[ResourceClass.NETWORK] <= 6
+    assert task.max_running[ResourceClass.NETWORK] > 2
+
+
+class MixedStepsTask(TwoStepsTask):
+    """Like the Syncer with the AsyncioExecutor: the first NETWORK step is
+    awaited from the event loop, the second one runs in a thread
+    """
+
+    async def async_step(self, resource: ResourceClass) -> None:
+        async with self.use_resource_async(resource):
+            with self.lock:
+                self.running[resource] += 1
+                self.max_running[resource] = max(
+                    self.max_running[resource], self.running[resource]
+                )
+            await asyncio.sleep(0.01)
+            with self.lock:
+                self.running[resource] -= 1
+
+    async def process_async(self, index: int, count: int, item: str) -> Outcome:
+        await self.async_step(ResourceClass.NETWORK)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.step, ResourceClass.NETWORK)
+        return Outcome.empty()
+
+
+def test_resource_limits_are_shared_by_threads_and_coroutines(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+    task = MixedStepsTask()
+    items = [f"item{i}" for i in range(20)]
+    actual = process_items(items, task, num_jobs=8, net_jobs=2)
+    assert not actual.errors
+    assert task.max_running[ResourceClass.NETWORK] == 2
+
+
+class BarrierTask(FakeTask):
+    """Each item waits for all the others in process()"""
+
+    def __init__(self, parties: int) -> None:
+        super().__init__()
+        self.barrier = Barrier(parties, timeout=5)
+
+    def process(self, index: int, count: int, item: str) -> Outcome:
+        try:
+            self.barrier.wait()
+        except BrokenBarrierError:
+            raise Kaboom()
+        return Outcome.empty()
+
+
+def test_asyncio_runs_num_jobs_threads(monkeypatch: pytest.MonkeyPatch) -> None:
+    # more than the default thread pool of asyncio, which has at most 32 workers
+    num_jobs = 40
+    monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+    task = BarrierTask(num_jobs)
+    items = [f"item{i}" for i in range(num_jobs)]
+    actual = process_items(items, task, num_jobs=num_jobs)
+    assert not actual.errors
+
+
+class PerHostTask(TwoStepsTask):
+    """Items are named <host>/<name>"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.running_per_host: Dict[str, int] = {}
+        self.max_running_per_host: Dict[str, int] = {}
+
+    def get_host(self, item: str) -> Optional[str]:
+        return item.split("/")[0]
+
+    def process(self, index: int, count: int, item: str) -> Outcome:
+        host = item.split("/")[0]
+        with self.use_resource(ResourceClass.NETWORK, host):
+            with self.lock:
+                running = self.running_per_host.get(host, 0) + 1
+                self.running_per_host[host] = running
+                self.max_running_per_host[host] = max(
+                    self.max_running_per_host.get(host, 0), running
+                )
+            time.sleep(0.01)
+            with self.lock:
+                self.running_per_host[host] -= 1
+        return Outcome.empty()
+
+
+def test_host_limits() -> None:
+    task = PerHostTask()
+    items = [f"a.com/{i}" for i in range(10)] + [f"b.com/{i}" for i in range(10)]
+    actual = process_items(items, task, num_jobs=6, host_jobs=2)
+    assert not actual.errors
+    assert task.max_running_per_host == {"a.com": 2, "b.com": 2}
+
+
+def test_interleave_by_host() -> None:
+    items = ["a/1", "a/2", "a/3", "b/1", "c/1", "c/2"]
+    actual = interleave_by_host(items, lambda x: x.split("/")[0])
+    assert actual == ["a/1", "b/1", "c/1", "a/2", "c/2", "a/3"]
+
+
+class RecordingTask(FakeTask):
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.started: List[str] = []
+
+    def process(self, index: int, count: int, item: str) -> Outcome:
+        with self.lock:
+            self.started.append(item)
+        return Outcome.empty()
+
+
+def test_longest_items_are_processed_first(tmp_path: Path) -> None:
+    durations = DurationStore(tmp_path / "durations.json").for_task("fake")
+    durations.record("foo", 1.0)
+    durations.record("bar", 3.0)
+    durations.record("baz", 2.0)
+    task = RecordingTask()
+
+    process_items(["foo", "bar", "baz"], task, num_jobs=1, durations=durations)
+    assert task.started == ["foo", "bar", "baz"], "order is kept when sequential"
+    assert durations.expected("foo") != 1.0, "durations should have been recorded"
+
+    durations.record("foo", 100)
+    task = RecordingTask()
+    process_items(["baz", "bar", "foo"], task, num_jobs=2, durations=durations)
+    assert task.started[0] == "foo"
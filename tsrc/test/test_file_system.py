@@ -4,7 +4,7 @@ from pathlib import Path
 import pytest
 
 from tsrc.errors import Error
-from tsrc.file_system import safe_link
+from tsrc.file_system import Copy, CopyMode, copy_file, is_up_to_date_copy, safe_link
 
 
 def test_can_create_symlink_when_source_does_not_exist(tmp_path: Path) -> None:
@@ -72,3 +72,62 @@ def test_do_nothing_if_symlink_has_the_correct_target(tmp_path: Path) -> None:
 
     assert source.exists()
     assert source.resolve() == target.resolve()
+
+
+@pytest.mark.parametrize("copy_mode", list(CopyMode))
+def test_copy_file(tmp_path: Path, copy_mode: CopyMode) -> None:
+    src_path = tmp_path / "src.txt"
+    src_path.write_text("contents")
+    src_path.chmod(0o755)
+    dest_path = tmp_path / "dest.txt"
+
+    copy_file(src_path, dest_path, copy_mode=copy_mode)
+
+    assert dest_path.read_text() == "contents"
+    assert os.access(dest_path, os.X_OK)
+    assert is_up_to_date_copy(src_path, dest_path, copy_mode=copy_mode)
+    assert not list(tmp_path.glob("*tsrc-tmp"))
+
+
+def test_hardlinks_are_replaced_by_copies(tmp_path: Path) -> None:
+    src_path = tmp_path / "src.txt"
+    src_path.write_text("contents")
+    dest_path = tmp_path / "dest.txt"
+    copy_file(src_path, dest_path, copy_mode=CopyMode.HARDLINK)
+    assert os.path.samefile(src_path, dest_path)
+
+    assert not is_up_to_date_copy(src_path, dest_path, copy_mode=CopyMode.COPY)
+    copy_file(src_path, dest_path, copy_mode=CopyMode.COPY)
+    dest_path.write_text("changed")
+
+    assert src_path.read_text() == "contents"
+
+
+def test_identical_copies_are_up_to_date(tmp_path: Path) -> None:
+    src_path = tmp_path / "src.txt"
+    src_path.write_text("v1")
+    dest_path = tmp_path / "dest.txt"
+    assert not is_up_to_date_copy(src_path, dest_path, copy_mode=CopyMode.COPY)
+
+    # same contents, different modification time
+    dest_path.write_text("v1")
+    os.utime(dest_path, ns=(0, 0))
+    assert is_up_to_date_copy(src_path, dest_path, copy_mode=CopyMode.COPY)
+    assert dest_path.stat().st_mtime_ns == src_path.stat().st_mtime_ns
+
+    # same size, different contents
+    dest_path.write_text("v2")
+    assert not is_up_to_date_copy(src_path, dest_path, copy_mode=CopyMode.COPY)
+
+
+def test_copy_skips_identical_files(tmp_path: Path) -> None:
+    (tmp_path / "foo").mkdir()
+    (tmp_path / "foo/foo.txt").write_text("foo")
+    copy = Copy("foo", "foo.txt", "top.txt")
+    assert copy.perform(tmp_path) is None
+    top_path = tmp_path / "top.txt"
+    inode = top_path.stat().st_ino
+
+    assert copy.perform(tmp_path) == "Leaving identical file"
+
+    assert top_path.stat().st_ino == inode
@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from tsrc.file_system import Copy, Link
+from tsrc.file_system_operator import get_operation_levels
+
+
+def test_independent_operations_share_a_level(tmp_path: Path) -> None:
+    operations = [
+        Copy("foo", "foo.txt", "foo.txt"),
+        Copy("bar", "bar.txt", "bar.txt"),
+        Link("bar", "bar.link", "bar/bar.txt"),
+    ]
+
+    assert get_operation_levels(operations, tmp_path) == [operations]
+
+
+def test_operations_with_the_same_destination(tmp_path: Path) -> None:
+    first = Copy("foo", "foo.txt", "top.txt")
+    second = Copy("bar", "bar.txt", "top.txt")
+    other = Copy("baz", "baz.txt", "baz.txt")
+
+    assert get_operation_levels([first, second, other], tmp_path) == [
+        [first, other],
+        [second],
+    ]
+
+
+def test_operations_depending_on_previous_ones(tmp_path: Path) -> None:
+    # a link to a directory, then a copy from a file in this directory,
+    # then a link to the copy
+    link = Link("foo", "build", "foo/build")
+    copy = Copy("foo", "../build/config.txt", "config.txt")
+    other_link = Link("foo", "config.link", "config.txt")
+
+    assert get_operation_levels([link, copy, other_link], tmp_path) == [
+        [link],
+        [copy],
+        [other_link],
+    ]
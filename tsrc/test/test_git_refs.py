@@ -0,0 +1,118 @@
+from pathlib import Path
+
+import pytest
+
+from tsrc.git import get_current_branch, get_sha1, is_git_repository
+from tsrc.git_refs import GitConfig, GitRefReader, UnsupportedGitLayout
+from tsrc.test.helpers.git_repo import run_git
+
+
+def test_head_on_loose_branch(repo_path: Path) -> None:
+    reader = GitRefReader(repo_path)
+    head_ref, sha1 = reader.get_head()
+    assert head_ref == "refs/heads/master"
+    assert sha1 == run_git(repo_path, "rev-parse", "HEAD")
+
+
+def test_head_on_packed_branch(repo_path: Path) -> None:
+    for i in range(50):
+        run_git(repo_path, "tag", f"v{i:02}")
+    run_git(repo_path, "pack-refs", "--all")
+    assert not (repo_path / ".git/refs/heads/master").exists()
+
+    reader = GitRefReader(repo_path)
+    head_ref, sha1 = reader.get_head()
+    assert head_ref == "refs/heads/master"
+    assert sha1 == run_git(repo_path, "rev-parse", "HEAD")
+    for i in range(50):
+        assert reader.ref_exists(f"refs/tags/v{i:02}")
+    assert not reader.ref_exists("refs/tags/v50")
+    assert not reader.ref_exists("refs/heads/aaa")
+    assert not reader.ref_exists("refs/tags/zzz")
+
+
+def test_annotated_tags_are_peeled(repo_path: Path) -> None:
+    run_git(repo_path, "tag", "-a", "v1.0", "-m", "v1.0")
+    run_git(repo_path, "pack-refs", "--all")
+
+    reader = GitRefReader(repo_path)
+    (sha1, name, peeled) = next(
+        x for x in reader.iter_packed_refs() if x[1] == "refs/tags/v1.0"
+    )
+    assert sha1 == run_git(repo_path, "rev-parse", "v1.0")
+    assert peeled == run_git(repo_path, "rev-parse", "HEAD")
+
+
+def test_detached_head(repo_path: Path) -> None:
+    sha1 = run_git(repo_path, "rev-parse", "HEAD")
+    run_git(repo_path, "checkout", sha1)
+
+    assert GitRefReader(repo_path).get_head() == (None, sha1)
+
+
+def test_unborn_branch(tmp_path: Path) -> None:
+    run_git(tmp_path, "init", "--initial-branch", "master")
+
+    assert GitRefReader(tmp_path).get_head() == ("refs/heads/master", None)
+
+
+def test_worktree(repo_path: Path, tmp_path: Path) -> None:
+    worktree_path = tmp_path / "worktree"
+    run_git(repo_path, "worktree", "add", "-b", "other", str(worktree_path))
+
+    assert get_current_branch(worktree_path) == "other"
+    assert get_sha1(worktree_path) == get_sha1(repo_path)
+
+
+def test_shorten_ref_like_git(repo_path: Path) -> None:
+    run_git(repo_path, "branch", "dev")
+    run_git(repo_path, "tag", "dev")
+
+    reader = GitRefReader(repo_path)
+    assert reader.shorten_ref("refs/heads/master") == "master"
+    assert reader.shorten_ref("refs/heads/dev") == "heads/dev"
+    assert reader.shorten_ref("refs/tags/dev") == "tags/dev"
+
+
+def test_is_git_repository(repo_path: Path, tmp_path: Path) -> None:
+    assert is_git_repository(repo_path)
+    assert not is_git_repository(tmp_path / "no-such-dir")
+
+
+def test_reftable_is_not_supported(repo_path: Path) -> None:
+    (repo_path / ".git/reftable").mkdir()
+    with pytest.raises(UnsupportedGitLayout):
+        GitRefReader(repo_path)
+
+
+def test_config_includes_are_not_supported(repo_path: Path) -> None:
+    run_git(repo_path, "config", "include.path", "other.config")
+    with pytest.raises(UnsupportedGitLayout):
+        GitRefReader(repo_path).config
+
+
+def test_parse_config() -> None:
+    text = "\n".join(
+        [
+            "# a comment",
+            "[core]",
+            "\tbare = false",
+            '[remote "Origin"]',
+            "\turl = git@example.com:foo.git ; trailing comment",
+            '\tfetch = "+refs/heads/*:refs/remotes/Origin/*"',
+            '[Branch "main"]',
+            "\tremote = Origin",
+            "\tMerge = refs/heads/main",
+            "[branch.dev]",
+            "\trebase",
+        ]
+    )
+
+    config = GitConfig.from_text(text)
+
+    assert config.get("core", "", "bare") == "false"
+    assert config.get("remote", "Origin", "url") == "git@example.com:foo.git"
+    assert config.get("remote", "origin", "url") is None
+    assert config.get("branch", "main", "merge") == "refs/heads/main"
+    assert config.get("branch", "dev", "rebase") == "true"
+    assert config.subsections("remote") == ["Origin"]
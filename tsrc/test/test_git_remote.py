@@ -0,0 +1,11 @@
+from tsrc.git_remote import get_url_host
+
+
+def test_get_url_host() -> None:
+    assert get_url_host("git@Example.com:foo/bar.git") == "example.com"
+    assert get_url_host("example.com:bar.git") == "example.com"
+    assert get_url_host("ssh://git@example.com:2222/bar.git") == "example.com"
+    assert get_url_host("https://github.com/your-tools/tsrc") == "github.com"
+    assert get_url_host("file:///srv/git/bar.git") is None
+    assert get_url_host("/srv/git/bar.git") is None
+    assert get_url_host("./foo:bar.git") is None
@@ -1,10 +1,10 @@
-import subprocess
 from pathlib import Path
 
 import cli_ui as ui
 import pytest
 
 from tsrc.git import DOWN, UP, GitStatus
+from tsrc.test.helpers.git_repo import run_git
 from tsrc.test.helpers.git_server import BareRepo
 
 
@@ -31,13 +31,7 @@ class GitProject:
         self.run_git("commit", "-m", message)
 
     def run_git(self, *cmd: str) -> None:
-        subprocess.run(
-            ["git", *cmd],
-            check=True,
-            cwd=self.path,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+        run_git(self.path, *cmd)
 
     def write_file(self, name: str, contents: str) -> None:
         (self.path / name).write_text(contents)
@@ -128,6 +122,71 @@ def test_on_tag(git_project: GitProject) -> None:
     assert actual.tag == "v0.1"
 
 
+def test_on_branch_with_same_name_as_tag(git_project: GitProject) -> None:
+    git_project.make_initial_commit()
+
+    git_project.run_git("tag", "master")
+
+    actual = git_project.get_status()
+    assert actual.branch == "heads/master"
+    assert actual.tag == "master"
+
+
+def test_worktree_counters(git_project: GitProject) -> None:
+    git_project.write_file("staged", "staged")
+    git_project.write_file("not_staged", "not staged")
+    git_project.make_initial_commit()
+
+    git_project.write_file("staged", "staged, modified")
+    git_project.run_git("add", "staged")
+    git_project.write_file("not_staged", "not staged, modified")
+    git_project.write_file("added", "added")
+    git_project.run_git("add", "added")
+    git_project.write_file("untracked", "untracked")
+
+    actual = git_project.get_status()
+    assert actual.dirty
+    assert actual.staged == 1
+    assert actual.not_staged == 1
+    assert actual.added == 1
+    assert actual.untracked == 1
+
+
+def test_staged_changes_are_dirty(git_project: GitProject) -> None:
+    git_project.make_initial_commit()
+
+    git_project.run_git("mv", "README", "README.txt")
+
+    actual = git_project.get_status()
+    assert actual.dirty
+    assert actual.staged == 1
+
+
+def test_parse_porcelain_v2() -> None:
+    status = GitStatus(Path("src"))
+    sha1 = "b6cfd80" + "0" * 33
+    records = [
+        f"# branch.oid {sha1}",
+        "# branch.head master",
+        "# branch.upstream origin/master",
+        "# branch.ab +2 -3",
+        f"2 R. N... 100644 100644 100644 {sha1} {sha1} R100 new name",
+        "old name",
+        "? untracked",
+    ]
+
+    status.parse_porcelain_v2(records)
+
+    assert status.sha1_full == sha1
+    assert status.sha1 == "b6cfd80"
+    assert status.branch == "master"
+    assert status.ahead == 2
+    assert status.behind == 3
+    assert status.staged == 1
+    assert status.untracked == 1
+    assert not status.empty
+
+
 class TestDescribe:
     dummy_path = Path("src")
 
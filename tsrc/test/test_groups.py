@@ -73,3 +73,28 @@ def test_unknown_group() -> None:
         group_list.get_elements(groups=["no-such-group"])
     assert e.value.parent_group is None
     assert e.value.group_name == "no-such-group"
+
+
+def test_resolved_groups_are_memoized() -> None:
+    group_list = GroupList(elements=["a", "b", "c"])
+    group_list.add("default", ["a", "b"])
+    group_list.add("other", ["c"], includes=["default"])
+    group_list.get_elements(groups=["other"])
+    group_list.get_elements(groups=["default"])
+
+    actual = group_list.get_elements(groups=["other"])
+    # callers may modify the result
+    actual.append("d")
+
+    assert group_list.get_elements(groups=["other"]) == ["a", "b", "c"]
+    assert group_list.get_groups_seen() == ["other", "default"]
+
+
+def test_adding_a_group_clears_memoized_results() -> None:
+    group_list = GroupList(elements=["a", "b", "c"])
+    group_list.add("default", ["a", "b"])
+    assert group_list.get_elements(groups=["default"]) == ["a", "b"]
+
+    group_list.add("default", ["c"])
+
+    assert group_list.get_elements(groups=["default"]) == ["c"]
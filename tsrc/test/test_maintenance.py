@@ -0,0 +1,77 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from tsrc.git import run_git_captured
+from tsrc.maintenance import MaintenanceQueue, needs_maintenance
+
+
+def init_repo(path: Path) -> None:
+    subprocess.run(["git", "init", "--quiet", str(path)], check=True)
+
+
+def write_loose_objects(path: Path, count: int) -> None:
+    objects_path = path / ".git" / "objects" / "17"
+    objects_path.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        (objects_path / f"{i:038x}").write_text("")
+
+
+def test_queue(tmp_path: Path) -> None:
+    queue = MaintenanceQueue(tmp_path / "maintenance_queue.json")
+    assert queue.load() == set()
+    queue.add(["foo", "bar"])
+    queue.add(["bar", "baz"])
+    assert queue.load() == {"foo", "bar", "baz"}
+    queue.remove(["foo", "spam"])
+    assert queue.load() == {"bar", "baz"}
+
+
+def test_needs_maintenance_loose_objects(tmp_path: Path) -> None:
+    repo_path = tmp_path / "foo"
+    init_repo(repo_path)
+    assert not needs_maintenance(repo_path)
+
+    # default threshold: ceil(6700 / 256) = 27 objects in objects/17
+    write_loose_objects(repo_path, 28)
+    assert needs_maintenance(repo_path)
+
+    subprocess.run(["git", "config", "gc.auto", "0"], cwd=repo_path, check=True)
+    assert not needs_maintenance(repo_path)
+
+
+def test_needs_maintenance_packs(tmp_path: Path) -> None:
+    repo_path = tmp_path / "foo"
+    init_repo(repo_path)
+    subprocess.run(
+        ["git", "config", "gc.autoPackLimit", "2"], cwd=repo_path, check=True
+    )
+    pack_path = repo_path / ".git" / "objects" / "pack"
+    for i in range(3):
+        (pack_path / f"pack-{i}.pack").write_text("")
+    assert needs_maintenance(repo_path)
+
+    (pack_path / "pack-0.keep").write_text("")
+    assert not needs_maintenance(repo_path)
+
+
+def test_needs_maintenance_not_a_repo(tmp_path: Path) -> None:
+    assert not needs_maintenance(tmp_path / "nope")
+
+
+def test_no_auto_gc(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_path = tmp_path / "foo"
+    init_repo(repo_path)
+    subprocess.run(["git", "config", "gc.auto", "1"], cwd=repo_path, check=True)
+    # configuration given through the environment by the user is kept
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "1")
+    monkeypatch.setenv("GIT_CONFIG_KEY_0", "user.name")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_0", "John Doe")
+
+    _, out = run_git_captured(repo_path, "config", "gc.auto", no_auto_gc=True)
+    assert out == "0"
+    _, out = run_git_captured(repo_path, "config", "user.name", no_auto_gc=True)
+    assert out == "John Doe"
+    _, out = run_git_captured(repo_path, "config", "gc.auto")
+    assert out == "1"
@@ -0,0 +1,183 @@
+import os
+import textwrap
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import tsrc.local_manifest
+import tsrc.manifest_cache
+from tsrc.config import Config
+from tsrc.errors import InvalidConfigError, LoadManifestSchemaError
+from tsrc.local_manifest import LocalManifest
+from tsrc.manifest import parse_manifest
+from tsrc.manifest_cache import ManifestCache
+from tsrc.manifest_common_data import ManifestsTypeOfData
+
+
+@pytest.fixture
+def parsed_paths(monkeypatch: pytest.MonkeyPatch) -> List[Path]:
+    """Record the manifests actually parsed, starting with an empty memo"""
+    res: List[Path] = []
+
+    def recording_parse(manifest_path: Path, remote_required: bool = True) -> Config:
+        res.append(manifest_path)
+        return parse_manifest(manifest_path, remote_required)
+
+    monkeypatch.setattr(tsrc.local_manifest, "parse_manifest", recording_parse)
+    monkeypatch.setattr(LocalManifest, "_parsed", {})
+    return res
+
+
+def write_manifest(clone_path: Path, dest: str) -> None:
+    clone_path.mkdir(parents=True, exist_ok=True)
+    contents = f"""
+    repos:
+      - dest: {dest}
+        url: git@example.com:{dest}.git
+    groups:
+      default:
+        repos: [{dest}]
+    """
+    (clone_path / "manifest.yml").write_text(textwrap.dedent(contents))
+
+
+def test_parsed_at_most_once_per_process(
+    tmp_path: Path, parsed_paths: List[Path]
+) -> None:
+    write_manifest(tmp_path / "manifest", "foo")
+    local_manifest = LocalManifest(tmp_path / "manifest")
+
+    for _ in range(3):
+        manifest = local_manifest.get_manifest()
+        assert [x.dest for x in manifest.get_repos()] == ["foo"]
+
+    assert len(parsed_paths) == 1
+
+
+def test_result_is_copied(tmp_path: Path, parsed_paths: List[Path]) -> None:
+    write_manifest(tmp_path / "manifest", "foo")
+    local_manifest = LocalManifest(tmp_path / "manifest")
+    clone_path = tmp_path / "manifest" / "manifest.yml"
+
+    local_manifest.parse_manifest(clone_path, True)["repos"].clear()
+
+    assert local_manifest.parse_manifest(clone_path, True)["repos"]
+
+
+def test_reused_across_processes(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, parsed_paths: List[Path]
+) -> None:
+    write_manifest(tmp_path / "manifest", "foo")
+    cache = ManifestCache(tmp_path / "manifest_cache")
+    LocalManifest(tmp_path / "manifest", cache=cache).get_manifest()
+    assert len(parsed_paths) == 1
+
+    # Same as starting a new process
+    monkeypatch.setattr(LocalManifest, "_parsed", {})
+    manifest = LocalManifest(tmp_path / "manifest", cache=cache).get_manifest()
+
+    assert [x.dest for x in manifest.get_repos()] == ["foo"]
+    assert len(parsed_paths) == 1
+
+
+def test_changed_contents(tmp_path: Path, parsed_paths: List[Path]) -> None:
+    cache = ManifestCache(tmp_path / "manifest_cache")
+    local_manifest = LocalManifest(tmp_path / "manifest", cache=cache)
+    write_manifest(tmp_path / "manifest", "foo")
+    local_manifest.get_manifest()
+
+    write_manifest(tmp_path / "manifest", "barbaz")
+    manifest = local_manifest.get_manifest()
+
+    assert [x.dest for x in manifest.get_repos()] == ["barbaz"]
+    assert len(parsed_paths) == 2
+
+
+def test_corrupted_entry(tmp_path: Path, parsed_paths: List[Path]) -> None:
+    cache = ManifestCache(tmp_path / "manifest_cache")
+    write_manifest(tmp_path / "manifest", "foo")
+    LocalManifest(tmp_path / "manifest", cache=cache).get_manifest()
+    for entry_path in cache.cache_path.iterdir():
+        entry_path.write_bytes(b"garbage")
+    LocalManifest._parsed.clear()
+
+    manifest = LocalManifest(tmp_path / "manifest", cache=cache).get_manifest()
+
+    assert [x.dest for x in manifest.get_repos()] == ["foo"]
+    assert len(parsed_paths) == 2
+
+
+def test_schema_is_part_of_the_key(tmp_path: Path, parsed_paths: List[Path]) -> None:
+    clone_path = tmp_path / "manifest"
+    clone_path.mkdir()
+    (clone_path / "manifest.yml").write_text("repos:\n  - dest: foo\n")
+    cache = ManifestCache(tmp_path / "manifest_cache")
+    local_manifest = LocalManifest(clone_path, cache=cache)
+
+    manifest = local_manifest.get_manifest_safe_mode(ManifestsTypeOfData.DEEP)
+    assert [x.dest for x in manifest.get_repos()] == ["foo"]
+
+    with pytest.raises(InvalidConfigError):
+        local_manifest.get_manifest()
+    with pytest.raises(LoadManifestSchemaError):
+        local_manifest.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
+
+
+def test_tsrc_version_is_part_of_the_key(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, parsed_paths: List[Path]
+) -> None:
+    write_manifest(tmp_path / "manifest", "foo")
+    cache = ManifestCache(tmp_path / "manifest_cache")
+    LocalManifest(tmp_path / "manifest", cache=cache).get_manifest()
+
+    # Same as upgrading tsrc, then starting a new process
+    monkeypatch.setattr(tsrc.manifest_cache, "__version__", "999.0.0")
+    monkeypatch.setattr(LocalManifest, "_parsed", {})
+    LocalManifest(tmp_path / "manifest", cache=cache).get_manifest()
+
+    assert len(parsed_paths) == 2
+
+
+def test_same_size_edits_are_noticed(tmp_path: Path, parsed_paths: List[Path]) -> None:
+    local_manifest = LocalManifest(tmp_path / "manifest")
+    manifest_path = tmp_path / "manifest" / "manifest.yml"
+    write_manifest(tmp_path / "manifest", "foo")
+    local_manifest.get_manifest()
+    stat = manifest_path.stat()
+
+    # Same size and same modification time, as if written during the
+    # same timestamp tick
+    write_manifest(tmp_path / "manifest", "bar")
+    os.utime(manifest_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    manifest = local_manifest.get_manifest()
+
+    assert [x.dest for x in manifest.get_repos()] == ["bar"]
+
+
+def test_least_recently_used_entries_are_evicted(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, parsed_paths: List[Path]
+) -> None:
+    cache = ManifestCache(tmp_path / "manifest_cache", max_entries=2)
+    local_manifest = LocalManifest(tmp_path / "manifest", cache=cache)
+    for dest in ["foo", "bar"]:
+        write_manifest(tmp_path / "manifest", dest)
+        local_manifest.get_manifest()
+    for i, entry_path in enumerate(cache.cache_path.iterdir()):
+        os.utime(entry_path, (i, i))
+
+    # Use 'foo' again, from a new process, then read a new manifest:
+    # 'bar' is now the least recently used entry
+    monkeypatch.setattr(LocalManifest, "_parsed", {})
+    write_manifest(tmp_path / "manifest", "foo")
+    local_manifest.get_manifest()
+    write_manifest(tmp_path / "manifest", "baz")
+    local_manifest.get_manifest()
+    assert len(list(cache.cache_path.iterdir())) == 2
+    assert len(parsed_paths) == 3
+
+    monkeypatch.setattr(LocalManifest, "_parsed", {})
+    for dest in ["foo", "baz", "bar"]:
+        write_manifest(tmp_path / "manifest", dest)
+        local_manifest.get_manifest()
+    assert len(parsed_paths) == 4
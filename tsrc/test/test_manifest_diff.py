@@ -0,0 +1,82 @@
+from pathlib import Path
+
+from tsrc.manifest_diff import LastSync, get_unchanged_repos
+from tsrc.test.test_manifest import parse_manifest
+
+OLD_MANIFEST = """
+repos:
+  - dest: on_branch
+    url: git@example.com:on_branch.git
+
+  - dest: same_tag
+    url: git@example.com:same_tag.git
+    tag: v0.1
+
+  - dest: new_tag
+    url: git@example.com:new_tag.git
+    tag: v0.1
+
+  - dest: new_url
+    url: git@example.com:new_url.git
+    sha1: ad2b68539c78e749a372414165acdf2a1bb68203
+
+  - dest: new_copy
+    url: git@example.com:new_copy.git
+    tag: v0.1
+
+  - dest: not_synced
+    url: git@example.com:not_synced.git
+    tag: v0.1
+"""
+
+NEW_MANIFEST = """
+repos:
+  - dest: on_branch
+    url: git@example.com:on_branch.git
+
+  - dest: same_tag
+    url: git@example.com:same_tag.git
+    tag: v0.1
+
+  - dest: new_tag
+    url: git@example.com:new_tag.git
+    tag: v0.2
+
+  - dest: new_url
+    url: git@example.com:other/new_url.git
+    sha1: ad2b68539c78e749a372414165acdf2a1bb68203
+
+  - dest: new_copy
+    url: git@example.com:new_copy.git
+    tag: v0.1
+    copy:
+      - file: top.cmake
+        dest: CMakeLists.txt
+
+  - dest: not_synced
+    url: git@example.com:not_synced.git
+    tag: v0.1
+
+  - dest: new_repo
+    url: git@example.com:new_repo.git
+    tag: v0.1
+"""
+
+
+def test_get_unchanged_repos() -> None:
+    old_manifest = parse_manifest(OLD_MANIFEST)
+    new_manifest = parse_manifest(NEW_MANIFEST)
+    synced = {"on_branch", "same_tag", "new_tag", "new_url", "new_copy"}
+
+    assert get_unchanged_repos(old_manifest, new_manifest, synced) == {"same_tag"}
+
+
+def test_last_sync(tmp_path: Path) -> None:
+    last_sync = LastSync(tmp_path / "last_sync.json")
+    assert last_sync.load() is None
+
+    last_sync.save("1234", ["foo", "bar"])
+    assert last_sync.load() == ("1234", {"foo", "bar"})
+
+    last_sync.clear()
+    assert last_sync.load() is None
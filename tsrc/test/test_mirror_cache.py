@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pytest
+
+from tsrc.git import get_sha1
+from tsrc.mirror_cache import MirrorCache
+from tsrc.test.helpers.git_server import GitServer
+
+
+def test_default_location(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.delenv("TSRC_MIRROR_CACHE", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert MirrorCache.default().root_path == tmp_path / "tsrc" / "mirrors"
+
+    monkeypatch.setenv("TSRC_MIRROR_CACHE", str(tmp_path / "mirrors"))
+    assert MirrorCache.default().root_path == tmp_path / "mirrors"
+
+
+def test_update_mirror(git_server: GitServer, tmp_path: Path) -> None:
+    foo_url = git_server.add_repo("foo")
+    mirror_cache = MirrorCache(tmp_path / "mirrors")
+
+    mirror_path = mirror_cache.update(foo_url)
+    assert mirror_path == mirror_cache.get_mirror_path(foo_url)
+    assert get_sha1(mirror_path, ref="master") == git_server.get_sha1("foo")
+
+    git_server.push_file("foo", "new.txt")
+    mirror_cache.update(foo_url)
+    assert get_sha1(mirror_path, ref="master") == git_server.get_sha1("foo")
+
+    (mirror_info,) = mirror_cache.get_mirrors()
+    assert mirror_info.url == foo_url
+    assert mirror_info.size > 0
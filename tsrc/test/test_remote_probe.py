@@ -0,0 +1,29 @@
+from tsrc.remote_probe import get_probed_refs, parse_ls_remote
+from tsrc.repo import Repo
+
+SHA1_A = "a" * 40
+SHA1_B = "b" * 40
+
+
+def test_parse_ls_remote() -> None:
+    out = f"{SHA1_A}\trefs/tags/v1\n{SHA1_B}\trefs/tags/v1^{{}}\n"
+    assert parse_ls_remote(out) == {
+        "refs/tags/v1": SHA1_A,
+        "refs/tags/v1^{}": SHA1_B,
+    }
+
+
+def test_parse_ls_remote_empty() -> None:
+    assert parse_ls_remote("") == {}
+
+
+def test_probed_refs() -> None:
+    assert get_probed_refs(Repo(dest="foo", branch="main", remotes=[])) == [
+        "refs/heads/main"
+    ]
+    assert get_probed_refs(Repo(dest="foo", tag="v1", remotes=[])) == [
+        "refs/tags/v1",
+        "refs/tags/v1^{}",
+    ]
+    # fixed sha1s never change
+    assert get_probed_refs(Repo(dest="foo", sha1=SHA1_A, remotes=[])) == []
@@ -0,0 +1,219 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from tsrc.git import GitStatus, get_git_status
+from tsrc.git_remote import get_git_remotes
+from tsrc.status_cache import StatusCache, read_index_entries
+from tsrc.test.helpers.git_repo import init_repo, run_git
+
+
+def age_worktree(repo_path: Path) -> None:
+    """Make the files of the worktree modified in the last few seconds look
+    older, as they are not trusted by the cache
+    """
+    past = time.time() - 10
+    for dir_path, dir_names, file_names in os.walk(repo_path):
+        if ".git" in dir_names:
+            dir_names.remove(".git")
+        for path in [Path(dir_path) / name for name in file_names] + [Path(dir_path)]:
+            if path.stat().st_mtime > past:
+                os.utime(path, (past, past))
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path) -> Path:
+    res = init_repo(tmp_path / "repo")
+    (res / "src").mkdir()
+    (res / "src/main.c").write_text("int main() {}")
+    run_git(res, "add", ".")
+    run_git(res, "commit", "-m", "add sources")
+    age_worktree(res)
+    return res
+
+
+def collect(cache: StatusCache, repo_path: Path) -> GitStatus:
+    fingerprint = cache.get_fingerprint(repo_path)
+    cached = cache.load("repo", repo_path, fingerprint, with_remote=True)
+    if cached:
+        return cached[0]
+    git_status = get_git_status(repo_path)
+    assert git_status.branch
+    git_remote = get_git_remotes(repo_path, git_status.branch)
+    cache.store("repo", fingerprint, git_status, git_remote)
+    return git_status
+
+
+def test_unchanged_repo_is_read_from_cache(repo_path: Path, tmp_path: Path) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    expected = collect(cache, repo_path)
+    actual = collect(cache, repo_path)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert vars(actual) == vars(expected)
+
+
+def test_worktree_changes_are_noticed(repo_path: Path, tmp_path: Path) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    collect(cache, repo_path)
+
+    (repo_path / "src/main.c").write_text("int main() { return 0; }")
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).not_staged == 1
+
+    (repo_path / "new.txt").write_text("new")
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).untracked == 1
+
+    (repo_path / "src/new.c").write_text("new")
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).untracked == 2
+
+    assert (cache.hits, cache.misses) == (0, 4)
+
+
+def test_repos_with_untracked_files_are_not_cached(
+    repo_path: Path, tmp_path: Path
+) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    (repo_path / "build").mkdir()
+    (repo_path / "build/a.o").write_text("a")
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).untracked == 1
+
+    # Note: only stat() of build/ changes
+    (repo_path / "build/b.o").write_text("b")
+    age_worktree(repo_path)
+    collect(cache, repo_path)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_new_files_in_empty_dirs_are_noticed(repo_path: Path, tmp_path: Path) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    (repo_path / "src/empty").mkdir()
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).untracked == 0
+
+    (repo_path / "src/empty/new.c").write_text("new")
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).untracked == 1
+
+
+def test_excludes_changes_are_noticed(
+    repo_path: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    exclude_path = repo_path / ".git/info/exclude"
+    exclude_path.write_text("*.log\n")
+    (repo_path / "debug.log").write_text("debug")
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).untracked == 0
+
+    exclude_path.write_text("")
+    assert collect(cache, repo_path).untracked == 1
+
+    ignore_path = tmp_path / "ignore"
+    ignore_path.write_text("*.log\n")
+    global_config_path = tmp_path / "gitconfig"
+    global_config_path.write_text(f"[core]\n\texcludesFile = {ignore_path}\n")
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(global_config_path))
+    assert collect(cache, repo_path).untracked == 0
+
+    ignore_path.write_text("")
+    assert collect(cache, repo_path).untracked == 1
+    assert cache.hits == 0
+
+
+def test_new_commits_are_noticed(repo_path: Path, tmp_path: Path) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    collect(cache, repo_path)
+
+    run_git(repo_path, "commit", "--allow-empty", "-m", "empty commit")
+    assert collect(cache, repo_path).sha1 == run_git(
+        repo_path, "rev-parse", "--short", "HEAD"
+    )
+
+    run_git(repo_path, "tag", "v1.0")
+    assert collect(cache, repo_path).tag == "v1.0"
+
+    assert cache.misses == 3
+
+
+def test_recently_modified_repos_are_not_cached(
+    repo_path: Path, tmp_path: Path
+) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    (repo_path / "README").write_text("Changed just now")
+
+    assert cache.get_fingerprint(repo_path) is None
+
+
+def test_read_index_entries(repo_path: Path) -> None:
+    (repo_path / "intent.txt").write_text("added with -N")
+    # Note: this uses extended flags in the index
+    run_git(repo_path, "add", "-N", "intent.txt")
+
+    entries = read_index_entries(repo_path / ".git/index")
+
+    assert entries
+    assert [(path, mode) for (path, mode, _) in entries] == [
+        (line.split("\t")[1], int(line.split()[0], 8))
+        for line in run_git(repo_path, "ls-files", "-s").splitlines()
+    ]
+
+
+def test_split_index_is_not_cached(repo_path: Path, tmp_path: Path) -> None:
+    run_git(repo_path, "update-index", "--split-index")
+    age_worktree(repo_path)
+    cache = StatusCache(tmp_path / "cache")
+
+    assert read_index_entries(repo_path / ".git/index") is None
+    assert cache.get_fingerprint(repo_path) is None
+
+    collect(cache, repo_path)
+    (repo_path / "README").write_text("Changed")
+    age_worktree(repo_path)
+    assert collect(cache, repo_path).not_staged == 1
+
+
+@pytest.mark.parametrize("size", [30, 100, 150])
+def test_corrupt_index_is_not_cached(
+    repo_path: Path, tmp_path: Path, size: int
+) -> None:
+    index_path = repo_path / ".git/index"
+    index_path.write_bytes(index_path.read_bytes()[:size])
+    cache = StatusCache(tmp_path / "cache")
+
+    assert cache.get_fingerprint(repo_path) is None
+
+
+def test_sha256_repos_are_not_cached(tmp_path: Path) -> None:
+    repo_path = tmp_path / "repo"
+    repo_path.mkdir()
+    run_git(repo_path, "init", "--object-format", "sha256")
+    (repo_path / "README").write_text("This is the README")
+    run_git(repo_path, "add", ".")
+    age_worktree(repo_path)
+    cache = StatusCache(tmp_path / "cache")
+
+    assert cache.get_fingerprint(repo_path) is None
+
+
+@pytest.mark.parametrize("contents", ["[]", '{"git": {}}', '{"git": null}'])
+def test_malformed_records_are_ignored(
+    repo_path: Path, tmp_path: Path, contents: str
+) -> None:
+    cache = StatusCache(tmp_path / "cache")
+    collect(cache, repo_path)
+    (record_path,) = (tmp_path / "cache").glob("*.json")
+    record = json.loads(record_path.read_text())
+    malformed = json.loads(contents)
+    if isinstance(malformed, dict):
+        malformed.update(dest=record["dest"], fingerprint=record["fingerprint"])
+    record_path.write_text(json.dumps(malformed))
+
+    fingerprint = cache.get_fingerprint(repo_path)
+    assert cache.load("repo", repo_path, fingerprint, with_remote=False) is None
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from tsrc.sync_journal import DONE, SyncJournal
+
+
+def test_resume_same_manifest(tmp_path: Path) -> None:
+    journal = SyncJournal(tmp_path / "sync_journal")
+    assert not journal.start("1234")
+    journal.for_task("sync").record("foo", DONE)
+
+    journal = SyncJournal(tmp_path / "sync_journal")
+    assert journal.start("1234")
+    assert journal.for_task("sync").is_done("foo")
+    assert not journal.for_task("sync").is_done("bar")
+    assert not journal.for_task("clone").is_done("foo")
+
+
+def test_restart_when_manifest_changed(tmp_path: Path) -> None:
+    journal = SyncJournal(tmp_path / "sync_journal")
+    journal.start("1234")
+    journal.for_task("sync").record("foo", DONE)
+
+    journal = SyncJournal(tmp_path / "sync_journal")
+    assert not journal.start("5678")
+    assert not journal.for_task("sync").is_done("foo")
+
+    journal = SyncJournal(tmp_path / "sync_journal")
+    journal.load()
+    assert journal.manifest_sha1 == "5678"
+
+
+def test_force_resume(tmp_path: Path) -> None:
+    journal = SyncJournal(tmp_path / "sync_journal")
+    journal.start("1234")
+    journal.for_task("sync").record("foo", DONE)
+
+    journal = SyncJournal(tmp_path / "sync_journal")
+    assert journal.start("5678", resume=True)
+    assert journal.for_task("sync").is_done("foo")
+
+
+def test_finish(tmp_path: Path) -> None:
+    journal_path = tmp_path / "sync_journal"
+    journal = SyncJournal(journal_path)
+    journal.start("1234")
+    journal.for_task("sync").record("foo", DONE)
+    journal.finish()
+
+    assert not journal_path.exists()
+    assert not SyncJournal(journal_path).start("1234")
+
+
+def test_end_with_errors(tmp_path: Path) -> None:
+    journal_path = tmp_path / "sync_journal"
+    journal = SyncJournal(journal_path)
+    journal.start("1234")
+    journal.for_task("sync").record("foo", DONE)
+    journal.end_with_errors()
+
+    # only resumed when asked to
+    assert not SyncJournal(journal_path).start("1234")
+    journal = SyncJournal(journal_path)
+    journal.start("1234")
+    journal.for_task("sync").record("foo", DONE)
+    journal.end_with_errors()
+    journal = SyncJournal(journal_path)
+    assert journal.start("1234", resume=True)
+    assert journal.for_task("sync").is_done("foo")
+
+    # the resumed sync can be interrupted, and resumed again
+    journal.for_task("sync").record("bar", DONE)
+    journal = SyncJournal(journal_path)
+    assert journal.start("1234")
+    assert journal.for_task("sync").is_done("bar")
+
+
+def test_ignore_incomplete_last_line(tmp_path: Path) -> None:
+    journal_path = tmp_path / "sync_journal"
+    journal_path.write_text(
+        '{"manifest": "1234"}\n'
+        '{"task": "sync", "dest": "foo", "stage": "done"}\n'
+        '{"task": "sync", "dest": "bar", "st'
+    )
+    journal = SyncJournal(journal_path)
+    assert journal.load()
+    assert journal.has("sync", "foo", DONE)
+    assert not journal.has("sync", "bar", DONE)
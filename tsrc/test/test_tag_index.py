@@ -0,0 +1,72 @@
+from pathlib import Path
+from typing import List
+
+from tsrc.git import get_current_tag, list_tags_with_git
+from tsrc.git_refs import GitRefReader
+from tsrc.tag_index import TagIndex, TagRecord
+from tsrc.test.helpers.git_repo import run_git
+
+
+def no_git_fallback() -> List[TagRecord]:
+    raise AssertionError("tags should have been read without git")
+
+
+def get_tags(repo_path: Path, cache_dir: Path) -> List[str]:
+    reader = GitRefReader(repo_path)
+    index = TagIndex.for_repo(reader, list_tags=no_git_fallback, cache_dir=cache_dir)
+    return index.get_tags(run_git(repo_path, "rev-parse", "HEAD"))
+
+
+def test_loose_and_packed_tags(repo_path: Path, tmp_path: Path) -> None:
+    run_git(repo_path, "tag", "v1.0")
+    run_git(repo_path, "tag", "-a", "v0.9", "-m", "v0.9")
+    run_git(repo_path, "pack-refs", "--all")
+    run_git(repo_path, "tag", "-a", "v1.1", "-m", "v1.1")
+    run_git(repo_path, "tag", "v1.2")
+
+    assert get_tags(repo_path, tmp_path / "cache") == ["v0.9", "v1.0", "v1.1", "v1.2"]
+
+
+def test_index_is_only_rebuilt_when_tags_change(
+    repo_path: Path, tmp_path: Path
+) -> None:
+    cache_dir = tmp_path / "cache"
+    run_git(repo_path, "tag", "v1.0")
+    assert get_tags(repo_path, cache_dir) == ["v1.0"]
+
+    cached_path = next(cache_dir.iterdir())
+    cached = TagIndex.load(cached_path)
+    assert cached
+    cached.tags = {}
+    cached.save(cached_path)
+    assert get_tags(repo_path, cache_dir) == [], "cached index should be used"
+
+    run_git(repo_path, "tag", "v1.1")
+    assert get_tags(repo_path, cache_dir) == ["v1.0", "v1.1"]
+
+    run_git(repo_path, "tag", "-d", "v1.0")
+    assert get_tags(repo_path, cache_dir) == ["v1.1"]
+
+
+def test_fall_back_to_git_for_packed_objects(repo_path: Path, tmp_path: Path) -> None:
+    run_git(repo_path, "tag", "-a", "v1.0", "-m", "v1.0")
+    run_git(repo_path, "gc")
+    run_git(repo_path, "tag", "v1.1")
+
+    reader = GitRefReader(repo_path)
+    index = TagIndex.for_repo(
+        reader,
+        list_tags=lambda: list_tags_with_git(repo_path),
+        cache_dir=tmp_path / "cache",
+    )
+
+    assert index.get_tags(run_git(repo_path, "rev-parse", "HEAD")) == ["v1.0", "v1.1"]
+
+
+def test_get_current_tag(repo_path: Path) -> None:
+    run_git(repo_path, "tag", "-a", "v1.0", "-m", "v1.0")
+    run_git(repo_path, "tag", "v1.1")
+
+    assert get_current_tag(repo_path) == run_git(
+        repo_path, "tag", "--points-at", "HEAD"
+    )
@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tsrc.tmp_caches import TmpCaches
+
+
+def make_entry(path: Path, size: int) -> Path:
+    path.mkdir(parents=True)
+    (path / "data").write_bytes(b"x" * size)
+    return path
+
+
+def test_lru_eviction(tmp_path: Path) -> None:
+    tsrc_path = tmp_path / ".tsrc"
+    old = make_entry(tsrc_path / "bare_cache" / "old.git", 100)
+    new = make_entry(tsrc_path / "bare_cache" / "new.git", 100)
+    newest = make_entry(tsrc_path / "bare_cache" / "newest.git", 100)
+    tmp_caches = TmpCaches(tsrc_path, max_size=250)
+    tmp_caches.record_use([old])
+    tmp_caches.record_use([new, newest])
+
+    (removed,) = tmp_caches.evict()
+
+    assert removed.path == old
+    assert not old.exists()
+    assert new.exists()
+    assert newest.exists()
+    assert [x.name for x in tmp_caches.get_entries()] == [
+        "bare_cache/new.git",
+        "bare_cache/newest.git",
+    ]
+
+
+def test_keep_entries_in_use(tmp_path: Path) -> None:
+    tsrc_path = tmp_path / ".tsrc"
+    old = make_entry(tsrc_path / "bare_cache" / "old.git", 100)
+    new = make_entry(tsrc_path / "bare_cache" / "new.git", 100)
+    tmp_caches = TmpCaches(tsrc_path)
+    tmp_caches.record_use([old])
+    tmp_caches.record_use([new])
+
+    removed = tmp_caches.evict(max_size=0, keep=[old])
+
+    assert [x.path for x in removed] == [new]
+    assert old.exists()
+
+
+def test_no_limit(tmp_path: Path) -> None:
+    tsrc_path = tmp_path / ".tsrc"
+    make_entry(tsrc_path / "bare_cache" / "foo.git", 100)
+    assert TmpCaches(tsrc_path).evict() == []
+
+
+def test_unrecorded_entries_use_mtime(tmp_path: Path) -> None:
+    tsrc_path = tmp_path / ".tsrc"
+    foo = make_entry(tsrc_path / "bare_cache" / "foo.git", 100)
+    bar = make_entry(tsrc_path / "bare_cache" / "bar.git", 10)
+    os.utime(foo, (1000, 1000))
+    os.utime(bar, (2000, 2000))
+
+    entries = TmpCaches(tsrc_path).get_entries()
+
+    assert [(x.path, x.size, x.last_used) for x in entries] == [
+        (foo, 100, 1000),
+        (bar, 10, 2000),
+    ]
+
+
+def test_always_remove_legacy_repos(tmp_path: Path) -> None:
+    tsrc_path = tmp_path / ".tsrc"
+    legacy = make_entry(tsrc_path / ".tmp_dm_repos" / "1234567890abc_foo", 100)
+    future_manifest = make_entry(tsrc_path / "future_manifest", 100)
+    current = make_entry(tsrc_path / "bare_cache" / "foo.git", 100)
+    tmp_caches = TmpCaches(tsrc_path)
+
+    removed = tmp_caches.evict()
+
+    assert {x.path for x in removed} == {legacy, future_manifest}
+    assert all(x.is_legacy for x in removed)
+    assert not (tsrc_path / ".tmp_dm_repos").exists()
+    assert not future_manifest.exists()
+    assert current.exists()
+
+
+def test_concurrent_uses_are_all_recorded(tmp_path: Path) -> None:
+    tsrc_path = tmp_path / ".tsrc"
+    paths = [make_entry(tsrc_path / "bare_cache" / f"{i}.git", 10) for i in range(8)]
+
+    # Note: each thread uses its own TmpCaches, like separate tsrc processes
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        for path in paths:
+            executor.submit(TmpCaches(tsrc_path).record_use, [path])
+
+    usage = TmpCaches(tsrc_path).load_usage()
+    assert sorted(usage) == sorted(f"bare_cache/{i}.git" for i in range(8))
+    assert not list(tsrc_path.glob("*.tmp"))
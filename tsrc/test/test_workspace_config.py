@@ -1,6 +1,8 @@
 from pathlib import Path
 
-from tsrc.workspace_config import WorkspaceConfig
+import pytest
+
+from tsrc.workspace_config import WorkspaceConfig, get_host_jobs
 
 
 def test_save(tmp_path: Path) -> None:
@@ -23,3 +25,17 @@ def test_save(tmp_path: Path) -> None:
     config.save_to_file(persistent_path)
     actual = WorkspaceConfig.from_file(persistent_path)
     assert actual == config
+
+
+def test_host_jobs_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    config = WorkspaceConfig(
+        manifest_url="https://gitlab.example",
+        manifest_branch="stable",
+        manifest_branch_0="stable",
+        repo_groups=[],
+        host_jobs=4,
+    )
+    assert get_host_jobs(config) == 4
+
+    monkeypatch.setenv("TSRC_HOST_JOBS", "2")
+    assert get_host_jobs(config) == 2
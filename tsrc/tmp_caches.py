@@ -0,0 +1,202 @@
+"""
+Temporary Caches
+
+Repositories tsrc keeps under `<workspace>/.tsrc` only to speed up
+`tsrc status` and `tsrc manifest`, and that can be removed at any time,
+since they are created again when needed:
+
+* the bare repositories of tsrc.bare_cache (`.tsrc/bare_cache/*.git`),
+* the repositories of older tsrc versions, which are no longer used at
+  all: `.tsrc/.tmp_dm_repos/*`, `.tsrc/.tmp_fm_repos/*` and the clone of
+  the Future Manifest, `.tsrc/future_manifest` (it is now fetched in
+  `.tsrc/manifest`, see tsrc.local_future_manifest).
+
+Each use of a cached repository is recorded, along with its size, in
+`.tsrc/cache_usage.json`. Once the total size goes over the budget
+(`tmp_cache_max_size` in the workspace configuration), the least recently
+used repositories are removed, either at the end of `tsrc status` and
+`tsrc manifest`, or with `tsrc cache gc`.
+"""
+
+import json
+import shutil
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cli_ui as ui
+
+from tsrc.file_lock import file_lock
+from tsrc.mirror_cache import get_dir_size
+from tsrc.utils import atomic_write
+from tsrc.workspace import Workspace
+
+BARE_CACHE = "bare_cache"
+FUTURE_MANIFEST = "future_manifest"
+LEGACY_DIRS = [".tmp_dm_repos", ".tmp_fm_repos"]
+
+MIB = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    # relative to `.tsrc`
+    name: str
+    path: Path
+    size: int
+    # time of the last use, in seconds since the epoch
+    last_used: float
+    is_legacy: bool = False
+
+
+class TmpCaches:
+    def __init__(self, tsrc_path: Path, *, max_size: Optional[int] = None) -> None:
+        self.tsrc_path = tsrc_path
+        # in bytes, None meaning: no limit
+        self.max_size = max_size
+
+    @classmethod
+    def for_workspace(
+        cls, root_path: Path, *, max_size_mib: Optional[int] = None
+    ) -> "TmpCaches":
+        max_size = max_size_mib * MIB if max_size_mib is not None else None
+        return cls(root_path / ".tsrc", max_size=max_size)
+
+    @property
+    def usage_path(self) -> Path:
+        return self.tsrc_path / "cache_usage.json"
+
+    def load_usage(self) -> Dict[str, Dict[str, float]]:
+        try:
+            res: Dict[str, Dict[str, float]] = json.loads(self.usage_path.read_text())
+            return res
+        except (OSError, ValueError):
+            return {}
+
+    def save_usage(self, usage: Dict[str, Dict[str, float]]) -> None:
+        atomic_write(self.usage_path, json.dumps(usage, indent=2, sort_keys=True))
+
+    @contextmanager
+    def _update_usage(self) -> Iterator[Dict[str, Dict[str, float]]]:
+        # Note: several tsrc processes may use the caches at the same time
+        # (like a `tsrc prefetch` run by cron, and `tsrc status`), so that
+        # the usage is read, updated and written while holding a lock
+        with file_lock(self.tsrc_path / "cache_usage.lock"):
+            usage = self.load_usage()
+            yield usage
+            self.save_usage(usage)
+
+    def record_use(self, paths: Iterable[Path]) -> None:
+        """Record that the given cached repositories were just used,
+        along with their current size
+        """
+        now = time.time()
+        recorded = {
+            path.relative_to(self.tsrc_path).as_posix(): {
+                "used": now,
+                "size": get_dir_size(path),
+            }
+            for path in paths
+            if path.exists()
+        }
+        with self._update_usage() as usage:
+            usage.update(recorded)
+
+    def get_entries(self) -> List[CacheEntry]:
+        """Return the cached repositories, least recently used first"""
+        usage = self.load_usage()
+        res = []
+        for path, is_legacy in self._find_paths():
+            name = path.relative_to(self.tsrc_path).as_posix()
+            recorded = usage.get(name)
+            if recorded:
+                size = int(recorded["size"])
+                last_used = recorded["used"]
+            else:
+                size = get_dir_size(path)
+                last_used = path.stat().st_mtime
+            entry = CacheEntry(name, path, size, last_used, is_legacy=is_legacy)
+            res.append(entry)
+        res.sort(key=lambda x: (not x.is_legacy, x.last_used))
+        return res
+
+    def _find_paths(self) -> List[Tuple[Path, bool]]:
+        res = [(x, True) for x in self._find_legacy_paths()]
+        bare_cache_path = self.tsrc_path / BARE_CACHE
+        if bare_cache_path.is_dir():
+            res += [(x, False) for x in sorted(bare_cache_path.glob("*.git"))]
+        return res
+
+    def _find_legacy_paths(self) -> List[Path]:
+        res: List[Path] = []
+        for dir_name in LEGACY_DIRS:
+            legacy_path = self.tsrc_path / dir_name
+            if legacy_path.is_dir():
+                res += sorted(x for x in legacy_path.iterdir() if x.is_dir())
+        future_manifest_path = self.tsrc_path / FUTURE_MANIFEST
+        if future_manifest_path.is_dir():
+            res.append(future_manifest_path)
+        return res
+
+    def evict(
+        self, *, max_size: Optional[int] = None, keep: Iterable[Path] = ()
+    ) -> List[CacheEntry]:
+        """Remove the repositories of older tsrc versions, then the least
+        recently used ones until the total size fits in `max_size` bytes
+        (or in `self.max_size`), except the ones in `keep`.
+
+        Return the removed entries.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        kept = set(keep)
+        entries = self.get_entries()
+        total = sum(x.size for x in entries)
+        removed = []
+        for entry in entries:
+            over_budget = max_size is not None and total > max_size
+            if not entry.is_legacy and (not over_budget or entry.path in kept):
+                continue
+            self._remove(entry)
+            total -= entry.size
+            removed.append(entry)
+        if removed:
+            with self._update_usage() as usage:
+                for entry in removed:
+                    usage.pop(entry.name, None)
+            self._remove_empty_legacy_dirs()
+        return removed
+
+    def _remove(self, entry: CacheEntry) -> None:
+        if entry.path.parent.name == BARE_CACHE:
+            # Note: the lock is the one used by tsrc.bare_cache
+            with file_lock(entry.path.with_suffix(".lock")):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _remove_empty_legacy_dirs(self) -> None:
+        for dir_name in LEGACY_DIRS:
+            legacy_path = self.tsrc_path / dir_name
+            if legacy_path.is_dir() and not any(legacy_path.iterdir()):
+                legacy_path.rmdir()
+
+
+def get_tmp_caches(workspace: Workspace) -> TmpCaches:
+    return TmpCaches.for_workspace(
+        workspace.root_path, max_size_mib=workspace.config.tmp_cache_max_size
+    )
+
+
+def evict_tmp_caches(workspace: Workspace, *, keep: Iterable[Path] = ()) -> None:
+    """Called at the end of the commands using the caches, which
+    pass the repositories they used as `keep`
+    """
+    removed = get_tmp_caches(workspace).evict(keep=keep)
+    if removed:
+        size = sum(x.size for x in removed) / MIB
+        ui.info_2(
+            f"Removed {len(removed)} repo(s) from temporary caches ({size:.1f} MiB)"
+        )
@@ -1,5 +1,9 @@
+import os
 import shutil
-from typing import List
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Union
 
 import cli_ui as ui
 
@@ -27,3 +31,43 @@ def align_left(l_just: int, l_str: str) -> List[ui.Token]:
     if l_just > 1:
         str_ = " ".ljust(l_just)
     return [str_ + l_str]
+
+
+def describe_size(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def describe_age(timestamp: float) -> str:
+    seconds = max(time.time() - timestamp, 0)
+    for unit, length in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= length:
+            count = int(seconds // length)
+            plural = "s" if count > 1 else ""
+            return f"{count} {unit}{plural} ago"
+    return "just now"
+
+
+def atomic_write(path: Path, data: Union[str, bytes]) -> None:
+    """Write `data` to `path`, so that other threads and other tsrc
+    processes see either the previous contents or the new ones.
+
+    The data is written to a temporary file with a unique name in the
+    same directory, which is then renamed.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    fd, tmp_name = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
@@ -2,24 +2,34 @@
 """
 
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import List, Optional, Set, Union
 
 import cli_ui as ui
 import ruamel.yaml
 
 from tsrc.cleaner import Cleaner
-from tsrc.cloner import Cloner
+from tsrc.cloner import CLONED, Cloner
+from tsrc.durations import DurationStore, TaskDurations
 from tsrc.errors import Error
 from tsrc.executor import process_items
-from tsrc.file_system_operator import FileSystemOperator
-from tsrc.git import is_git_repository
+from tsrc.file_system import get_copy_mode
+from tsrc.file_system_operator import FileSystemOperator, get_operation_levels
+from tsrc.git import get_sha1, is_git_repository
 from tsrc.local_manifest import LocalManifest
+from tsrc.maintenance import Maintainer, MaintenanceQueue, needs_maintenance
 from tsrc.manifest import Manifest
+from tsrc.manifest_cache import ManifestCache
 from tsrc.manifest_common_data import ManifestsTypeOfData
+from tsrc.manifest_diff import LastSync, get_unchanged_repos
+from tsrc.manifest_lock import LOCK_FILE_NAME, Locker, lock_repos, save_lock
+from tsrc.mirror_cache import MirrorCache
+from tsrc.prefetcher import Prefetcher
+from tsrc.remote_probe import PinnedRefCheck, RemoteProbe
 from tsrc.remote_setter import RemoteSetter
 from tsrc.repo import Repo
+from tsrc.sync_journal import DONE, SyncJournal, TaskJournal
 from tsrc.syncer import Syncer
-from tsrc.workspace_config import WorkspaceConfig
+from tsrc.workspace_config import WorkspaceConfig, get_host_jobs
 
 
 def copy_cfg_path_if_needed(root_path: Path) -> None:
@@ -45,7 +55,9 @@ class Workspace:
         local_manifest_path = root_path / ".tsrc" / "manifest"
         self.cfg_path = root_path / ".tsrc" / "config.yml"
         self.root_path = root_path
-        self.local_manifest = LocalManifest(local_manifest_path)
+        self.local_manifest = LocalManifest(
+            local_manifest_path, cache=ManifestCache.for_workspace(root_path)
+        )
         copy_cfg_path_if_needed(root_path)
         if not self.cfg_path.exists():
             raise WorkspaceNotConfigured(root_path)
@@ -65,6 +77,117 @@ class Workspace:
         # a disjoint `front-end` group on the command line.
         self.repos: List[Repo] = []
 
+        self._duration_store: Optional[DurationStore] = None
+
+        # Set by start_journal(), see tsrc.sync_journal
+        self.journal: Optional[SyncJournal] = None
+
+        # Set by find_unchanged_repos(), see tsrc.manifest_diff
+        self.unchanged_repos: Set[str] = set()
+
+        # Set by use_lock(), see tsrc.manifest_lock
+        self.locked = False
+
+    def get_durations(self, task_name: str) -> TaskDurations:
+        """Return the durations recorded for the given task, see tsrc.durations"""
+        if self._duration_store is None:
+            self._duration_store = DurationStore.for_workspace(self.root_path)
+        return self._duration_store.for_task(task_name)
+
+    def start_journal(self, *, resume: bool = False) -> None:
+        """Record the progress of clone_missing() and sync(), so that
+        they can be resumed if interrupted, see tsrc.sync_journal
+        """
+        manifest_sha1 = get_sha1(self.local_manifest.clone_path)
+        # Until this sync succeeds, the next one must be a full one
+        LastSync.for_workspace(self.root_path).clear()
+        self.journal = SyncJournal.for_workspace(self.root_path)
+        if self.journal.start(manifest_sha1, resume=resume):
+            ui.info_2("Resuming interrupted sync")
+        elif resume:
+            ui.info_2("No interrupted sync found")
+
+    def finish_journal(self) -> None:
+        """Called when the sync succeeded"""
+        if not self.journal:
+            return
+        if self.journal.manifest_sha1:
+            last_sync = LastSync.for_workspace(self.root_path)
+            last_sync.save(self.journal.manifest_sha1, [x.dest for x in self.repos])
+        self.journal.finish()
+        self.journal = None
+
+    def end_journal_with_errors(self) -> None:
+        """Called when the sync ran to completion, but some repos failed"""
+        if not self.journal:
+            return
+        self.journal.end_with_errors()
+        self.journal = None
+
+    def get_lock_path(self) -> Path:
+        return self.local_manifest.clone_path / LOCK_FILE_NAME
+
+    def use_lock(self) -> None:
+        """Freeze the repos at the commits of the lock file,
+        see tsrc.manifest_lock
+        """
+        self.repos = lock_repos(self.repos, self.get_lock_path())
+        self.locked = True
+
+    def lock(
+        self,
+        *,
+        singular_remote: str = "",
+        num_jobs: int = 1,
+        net_jobs: Optional[int] = None,
+    ) -> Path:
+        """Write the commit of every repo of the manifest in the lock file,
+        and return its path
+        """
+        remote_name = singular_remote or self.config.singular_remote
+        locker = Locker(self.root_path, remote_name=remote_name)
+        repos = self.get_manifest().get_repos(all_=True)
+        collection = process_items(
+            repos,
+            locker,
+            num_jobs=num_jobs,
+            net_jobs=net_jobs,
+            host_jobs=get_host_jobs(self.config),
+        )
+        if collection.errors:
+            ui.error("Failed to lock the following repos:")
+            collection.print_errors()
+            raise LockError
+        lock_path = self.get_lock_path()
+        save_lock(lock_path, locker.sha1s)
+        return lock_path
+
+    def find_unchanged_repos(self, *, num_jobs: int = 1) -> None:
+        """Find the repos frozen at a tag or sha1 that did not change
+        in the manifest since the last successful sync, and are still
+        at their tag or sha1 with a clean worktree, so that sync()
+        skips them, see tsrc.manifest_diff
+        """
+        last_sync = LastSync.for_workspace(self.root_path).load()
+        if not last_sync:
+            return
+        manifest_sha1, synced = last_sync
+        old_manifest = self.local_manifest.get_manifest_at(manifest_sha1)
+        if not old_manifest:
+            return
+        unchanged = get_unchanged_repos(old_manifest, self.get_manifest(), synced)
+        candidates = [x for x in self.repos if x.dest in unchanged]
+        if not candidates:
+            return
+        check = PinnedRefCheck(self.root_path)
+        process_items(candidates, check, num_jobs=num_jobs)
+        self.unchanged_repos = check.at_pinned_ref
+
+    def get_task_journal(self, task_name: str) -> Optional[TaskJournal]:
+        if not self.journal:
+            return None
+        return self.journal.for_task(task_name)
+
     def get_manifest(self) -> Manifest:
         return self.local_manifest.get_manifest()
 
@@ -181,19 +304,38 @@ class Workspace:
 
                 self.config.save_to_file(self.cfg_path)
 
-    def clone_missing(self, *, num_jobs: int = 1) -> None:
+    def clone_missing(
+        self, *, num_jobs: int = 1, net_jobs: Optional[int] = None
+    ) -> None:
+        journal = self.get_task_journal("clone")
         to_clone = []
         for repo in self.repos:
             repo_path = self.root_path / repo.dest
             if not is_git_repository(repo_path):
                 to_clone.append(repo)
+            elif journal and journal.has(repo.dest, CLONED):
+                if not journal.is_done(repo.dest):
+                    # interrupted after `git clone`
+                    to_clone.append(repo)
         cloner = Cloner(
             self.root_path,
             shallow=self.config.shallow_clones,
+            clone_filter=self.config.clone_filter,
             remote_name=self.config.singular_remote,
+            mirror_cache=(
+                MirrorCache.default() if self.config.use_mirror_cache else None
+            ),
+            journal=journal,
         )
         ui.info_2("Cloning missing repos")
-        collection = process_items(to_clone, cloner, num_jobs=num_jobs)
+        collection = process_items(
+            to_clone,
+            cloner,
+            num_jobs=num_jobs,
+            net_jobs=net_jobs,
+            host_jobs=get_host_jobs(self.config),
+            durations=self.get_durations("clone"),
+        )
         if collection.summary:
             ui.info_2("Cloned repos:")
             for summary in collection.summary:
@@ -219,6 +361,7 @@ class Workspace:
         self,
         manifest: Optional[Manifest] = None,
         ignore_group_item: bool = False,
+        num_jobs: int = 1,
     ) -> None:
         repos = self.repos
         if not manifest:
@@ -226,19 +369,28 @@ class Workspace:
                 manifest = self.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
             else:
                 manifest = self.get_manifest()
-        operator = FileSystemOperator(self.root_path, repos)
+        operator = FileSystemOperator(
+            self.root_path, repos, copy_mode=get_copy_mode(self.config.copy_mode)
+        )
         operations = manifest.file_system_operations
-        known_repos = [x.dest for x in repos]
+        known_repos = {x.dest for x in repos}
         operations = [x for x in operations if x.get_repo() in known_repos]
-        if operations:
-            ui.info_2("Performing filesystem operations")
-            # Not sure it's a good idea to have FileSystemOperations running in parallel
-            collection = process_items(operations, operator, num_jobs=1)
+        if not operations:
+            return
+        ui.info_2("Performing filesystem operations")
+        # Note: operations are run in parallel, except when they
+        # may depend on each other
+        failed = []
+        for level in get_operation_levels(operations, self.root_path):
+            collection = process_items(level, operator, num_jobs=num_jobs)
             collection.print_summary()
             if collection.errors:
-                ui.error("Failed to perform the following file system operations")
+                failed.append(collection)
+        if failed:
+            ui.error("Failed to perform the following file system operations")
+            for collection in failed:
                 collection.print_errors()
-                raise FileSystemOperatorError
+            raise FileSystemOperatorError
 
     def sync(
         self,
@@ -247,6 +399,8 @@ class Workspace:
         correct_branch: bool = False,
         force: bool = False,
         num_jobs: int = 1,
+        net_jobs: Optional[int] = None,
+        skip_up_to_date: bool = True,
     ) -> None:
         remote_name = ""
         if singular_remote:
@@ -258,21 +412,158 @@ class Workspace:
             force=force,
             remote_name=remote_name,
             correct_branch=correct_branch,
+            narrow_fetch=self.config.narrow_fetch,
+            clone_filter=self.config.clone_filter,
+            journal=self.get_task_journal("sync"),
+            locked=self.locked,
         )
 
-        repos = self.repos
+        repos = self.get_repos_to_sync(syncer.journal)
+        up_to_date: Set[str] = set()
+        if skip_up_to_date:
+            up_to_date = self.find_up_to_date_repos(
+                repos,
+                remote_name=remote_name,
+                num_jobs=num_jobs,
+                net_jobs=net_jobs,
+                journal=syncer.journal,
+            )
+            repos = [x for x in repos if x.dest not in up_to_date]
         ui.info_2("Synchronizing repos")
-        collection = process_items(repos, syncer, num_jobs=num_jobs)
+        collection = process_items(
+            repos,
+            syncer,
+            num_jobs=num_jobs,
+            net_jobs=net_jobs,
+            host_jobs=get_host_jobs(self.config),
+            durations=self.get_durations("sync"),
+        )
+        self.queue_maintenance(repos)
         if collection.summary:
             ui.info_2("Updated repos:")
             for summary in collection.summary:
                 if summary:
                     ui.info(summary)
+        if up_to_date:
+            ui.info_2("Skipped", len(up_to_date), "repo(s) already up to date")
         if collection.errors:
             ui.error("Failed to synchronize the following repos:")
             collection.print_errors()
             raise SyncError
 
+    def queue_maintenance(self, repos: List[Repo]) -> None:
+        """Add the repos that would have run `git gc --auto` to the
+        maintenance queue, see tsrc.maintenance
+        """
+        to_queue = [x.dest for x in repos if needs_maintenance(self.root_path / x.dest)]
+        if not to_queue:
+            return
+        MaintenanceQueue.for_workspace(self.root_path).add(to_queue)
+        ui.info_2(
+            len(to_queue),
+            "repo(s) need maintenance, use `tsrc maintenance` to run it",
+        )
+
+    def maintenance(self, *, all_repos: bool = False, num_jobs: int = 1) -> None:
+        """Run `git maintenance` in the queued repos (or in all of them),
+        see tsrc.maintenance
+        """
+        queue = MaintenanceQueue.for_workspace(self.root_path)
+        repos = self.repos
+        if not all_repos:
+            queued = queue.load()
+            repos = [x for x in repos if x.dest in queued]
+        repos = [x for x in repos if is_git_repository(self.root_path / x.dest)]
+        if not repos:
+            ui.info_2("No repo needs maintenance")
+            return
+        maintainer = Maintainer(self.root_path)
+        collection = process_items(
+            repos,
+            maintainer,
+            num_jobs=num_jobs,
+            durations=self.get_durations("maintenance"),
+        )
+        queue.remove(maintainer.done)
+        if collection.errors:
+            ui.error("Failed to run maintenance in the following repos:")
+            collection.print_errors()
+            raise MaintenanceError
+
+    def prefetch(
+        self,
+        *,
+        singular_remote: str = "",
+        num_jobs: int = 1,
+        net_jobs: Optional[int] = None,
+    ) -> None:
+        """Fetch the objects of the cloned repos in the background,
+        without changing anything else, see tsrc.prefetcher
+        """
+        remote_name = singular_remote or self.config.singular_remote
+        prefetcher = Prefetcher(
+            self.root_path,
+            remote_name=remote_name,
+            clone_filter=self.config.clone_filter,
+        )
+        repos = [x for x in self.repos if is_git_repository(self.root_path / x.dest)]
+        collection = process_items(
+            repos,
+            prefetcher,
+            num_jobs=num_jobs,
+            net_jobs=net_jobs,
+            host_jobs=get_host_jobs(self.config),
+            durations=self.get_durations("prefetch"),
+        )
+        if collection.errors:
+            ui.error("Failed to prefetch the following repos:")
+            collection.print_errors()
+            raise PrefetchError
+
+    def get_repos_to_sync(self, journal: Optional[TaskJournal]) -> List[Repo]:
+        """Leave out the repos synced before the previous sync was
+        interrupted, and the ones that did not change in the manifest
+        """
+        repos = self.repos
+        if journal:
+            done = {x.dest for x in repos if journal.is_done(x.dest)}
+            if done:
+                ui.info_2("Skipped", len(done), "repo(s) synced before interruption")
+                repos = [x for x in repos if x.dest not in done]
+        unchanged = {x.dest for x in repos if x.dest in self.unchanged_repos}
+        if unchanged:
+            ui.info_2("Skipped", len(unchanged), "repo(s) unchanged in the manifest")
+            repos = [x for x in repos if x.dest not in unchanged]
+        return repos
+
+    def find_up_to_date_repos(
+        self,
+        repos: List[Repo],
+        *,
+        remote_name: Optional[str] = None,
+        num_jobs: int = 1,
+        net_jobs: Optional[int] = None,
+        journal: Optional[TaskJournal] = None,
+    ) -> Set[str]:
+        """Return the destinations of the repos that have nothing new
+        to fetch, using `git ls-remote` (see tsrc.remote_probe).
+
+        They are also recorded as done in the journal, if any.
+        """
+        ui.info_2("Looking for new commits")
+        probe = RemoteProbe(self.root_path, remote_name=remote_name)
+        process_items(
+            repos,
+            probe,
+            num_jobs=num_jobs,
+            net_jobs=net_jobs,
+            host_jobs=get_host_jobs(self.config),
+        )
+        if journal:
+            for dest in probe.up_to_date:
+                journal.record(dest, DONE)
+        return probe.up_to_date
+
     def clean(
         self, *, do_clean: bool = False, do_hard_clean: bool = False, num_jobs: int = 1
     ) -> None:
@@ -308,6 +599,18 @@ class SyncError(Error):
     pass
 
 
+class PrefetchError(Error):
+    pass
+
+
+class LockError(Error):
+    pass
+
+
+class MaintenanceError(Error):
+    pass
+
+
 class ClonerError(Error):
     pass
 
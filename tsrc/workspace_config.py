@@ -1,3 +1,4 @@
+import os
 from collections import OrderedDict
 from dataclasses import asdict, dataclass, fields
 from pathlib import Path
@@ -5,6 +6,8 @@ from typing import Any, List, Optional
 
 import ruamel.yaml
 
+from tsrc.errors import Error
+
 
 @dataclass
 class WorkspaceConfig:
@@ -21,10 +24,23 @@ class WorkspaceConfig:
     repo_groups: List[str]
 
     shallow_clones: bool = False
+    clone_filter: Optional[str] = None
+    narrow_fetch: bool = False
+    use_mirror_cache: bool = False
     clone_all_repos: bool = False
+    copy_mode: str = "copy"
 
     singular_remote: Optional[str] = None
 
+    host_jobs: Optional[int] = None
+
+    # in seconds, see tsrc.bare_cache
+    bare_cache_ttl: int = 300
+    # in seconds, see tsrc.local_future_manifest
+    future_manifest_ttl: int = 0
+    # in MiB, see tsrc.tmp_caches
+    tmp_cache_max_size: Optional[int] = 1024
+
     def __init__(self, **kwargs: Any) -> None:
         # only set those that are present
         names = {f.name for f in fields(self)}
@@ -51,3 +67,19 @@ class WorkspaceConfig:
         as_dict = asdict(self)
         with cfg_path.open("w") as fp:
             yaml.dump(as_dict, fp)
+
+
+def get_host_jobs(config: WorkspaceConfig) -> Optional[int]:
+    """Return the maximum number of network operations connecting
+    to the same host at the same time, if any.
+
+    The TSRC_HOST_JOBS environment variable takes precedence over
+    the workspace configuration.
+    """
+    from_env = os.environ.get("TSRC_HOST_JOBS")
+    if not from_env:
+        return config.host_jobs
+    try:
+        return int(from_env)
+    except ValueError:
+        raise Error(f"Invalid value for TSRC_HOST_JOBS: {from_env}")
@@ -574,7 +574,7 @@ class WorkspaceReposSummary:
     ) -> Tuple[Union[List[Repo], None], Union[Manifest, None]]:
         if self.dm_pcsr:
             path = self.workspace.root_path / self.dm_pcsr.dest
-            ldm = LocalManifest(path)
+            ldm = LocalManifest(path, cache=self.workspace.local_manifest.cache)
             try:
                 ldmm = ldm.get_manifest_safe_mode(ManifestsTypeOfData.DEEP)
             except LoadManifestSchemaError as lmse: